@@ -0,0 +1,76 @@
+"""
+Single entry point dispatching to the taggers, the tagging server and the formatter:
+
+    python -m datatagger <command> [--options of that command]
+
+Each command module is imported only when selected, so `--help` and light
+missions never pay for vllm/transformers/lingua imports.
+"""
+
+import argparse
+import importlib
+import sys
+from typing import List, Optional
+
+# command -> (module exposing main(), help)
+COMMANDS = {
+    "vllm": (
+        "datatagger.tagger.unified_tagger_vllm",
+        "Tag a dataset with a local vLLM model",
+    ),
+    "api": (
+        "datatagger.tagger.unified_tagger_api",
+        "Tag a dataset through an OpenAI-compatible API",
+    ),
+    "serve": (
+        "datatagger.tagger.tagger_server",
+        "Serve tag missions over HTTP with dynamic micro-batching",
+    ),
+    "format": (
+        "datatagger.formatter.data_formatter",
+        "Format, clean and standardize a dataset",
+    ),
+    "faiss-report": (
+        "datatagger.tools.faiss_report",
+        "Compare recall and latency of a Faiss index type against a flat baseline",
+    ),
+    "cache-compact": (
+        "datatagger.tools.cache_compact",
+        "Remove duplicate or unused entries from an embedding cache",
+    ),
+    "join": (
+        "datatagger.tools.sidecar_join",
+        "Merge tag sidecar files back into the full dataset",
+    ),
+    "json-bench": (
+        "datatagger.tools.json_bench",
+        "Measure the per-row JSON encode/decode cost of each installed backend",
+    ),
+}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="datatagger",
+        description="Multi-task batch data labeling tool.",
+        epilog="Run `datatagger <command> --help` for the options of a command.",
+    )
+    subparsers = parser.add_subparsers(dest="command", metavar="<command>")
+    for name, (_, help_text) in COMMANDS.items():
+        # Options are parsed by the settings class of the command itself
+        subparsers.add_parser(name, help=help_text, add_help=False)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    parser = build_parser()
+    if not argv or argv[0] not in COMMANDS:
+        parser.parse_args(argv[:1])
+        parser.print_help()
+        sys.exit(0 if not argv else 2)
+    command, command_args = argv[0], argv[1:]
+    module_name, _ = COMMANDS[command]
+    # pydantic-settings parses sys.argv[1:] when cli_parse_args=True
+    sys.argv = [f"datatagger {command}", *command_args]
+    importlib.import_module(module_name).main()
@@ -2,10 +2,37 @@ import json
 import os
 import sys
 import uuid
-from collections import OrderedDict
-from typing import Any, Dict, Generator, List, Optional
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import islice
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
 
 from datatagger.settings.base_formatter_setting import BaseFormatterSettings
+from datatagger.tagger.tag_missions import TagMissionProcessor
+from datatagger.utils.file_utils import (
+    DATASET_EXTENSIONS,
+    JSON_BACKEND,
+    JsonlWriter,
+    dataset_ext,
+    iter_json_array,
+    iter_parquet_rows,
+    json_loads,
+    open_binary_read,
+    open_dataset_writer,
+    parquet_num_rows,
+    split_compression,
+)
 from tqdm import tqdm
 
 ALLOWED_TASK_CATEGORIES = [
@@ -42,6 +69,26 @@ ALLOWED_SAFETY_LABELS = [
     "Safe",
 ]
 
+# Tag fields carried over by process_entry
+FORMATTED_TAG_FIELDS = [
+    "intent",
+    "knowledge",
+    "difficulty",
+    "input_quality",
+    "response_quality",
+    "input_quality_explanation",
+    "response_quality_explanation",
+    "task_category",
+    "other_task_category",
+    "language",
+    "safety",
+    "instruct_reward",
+    "task_category_generator",
+    "min_neighbor_distance",
+    "repeat_count",
+    "min_similar_instruction",
+]
+
 
 class UnifiedDataFormatter:
     """
@@ -54,51 +101,95 @@ class UnifiedDataFormatter:
     def __init__(self, settings: BaseFormatterSettings):
         self.settings = settings
         self._total_processed = 0
+        # Warnings of the entries being processed, and totals of the run
+        self.warnings: Counter = Counter()
+        self._warning_totals: Counter = Counter()
 
     def run(self):
         """
-        Main formatting workflow: count -> iterate/process -> batch save -> finish.
+        Main formatting workflow: a single streaming pass (read chunks -> process -> save in
+        input order -> finish). With --workers N, chunks are formatted by a process pool.
+        Progress is measured in input bytes, so the input is never read twice.
         """
+        workers = max(1, self.settings.workers)
         print("🚀 Starting data formatting...")
         print(f"  - Input: {self.settings.input_file}")
         print(f"  - Output: {self.settings.output_file}")
         print(f"  - Internal batch size: {self.DEFAULT_BATCH_SIZE}")
+        print(f"  - Workers: {workers}")
+        print(f"  - JSON backend: {JSON_BACKEND}")
+        output_compression = split_compression(self.settings.output_file)[1]
+        if output_compression:
+            print(f"  - Output compression: {output_compression}")
 
-        is_json_format = self.settings.output_file.lower().endswith(".json")
         output_path = self.settings.output_file
-        temp_path = f"{output_path}.tmp" if is_json_format else output_path
+        output_ext = dataset_ext(output_path)
+        if output_ext not in DATASET_EXTENSIONS:
+            output_ext = ".jsonl"
+        # .json arrays and Parquet files are only complete once closed
+        needs_finalize = output_ext in (".json", ".parquet")
+        temp_path = f"{output_path}.tmp" if needs_finalize else output_path
 
         self._prepare_output_files(output_path, temp_path)
 
-        print("  - Counting total entries...")
-        total_entries = self._count_entries()
-        print(f"  - Found {total_entries} entries to process.")
-
-        batch = []
-        data_iterator = self._iter_data()
-
-        with tqdm(total=total_entries, desc="Formatting entries") as pbar:
-            for entry_data in data_iterator:
-                processed_entry = self.process_entry(entry_data)
-                if processed_entry:
-                    batch.append(processed_entry)
-
-                if len(batch) >= self.DEFAULT_BATCH_SIZE:
-                    self._write_batch(batch, temp_path)
-                    pbar.update(len(batch))
-                    batch = []
-                else:
-                    pbar.update(1)
-
-        if batch:
-            self._write_batch(batch, temp_path)
-            pbar.update(len(batch))
-
-        if is_json_format:
-            print("  - Finalizing JSON file...")
-            self._convert_jsonl_to_json(temp_path, output_path)
-            os.remove(temp_path)
-
+        reading_stdin = self.settings.input_file == "/dev/stdin"
+        # Parquet is read by row groups, progress is counted in entries there
+        count_entries = reading_stdin or self._is_parquet_input()
+        if reading_stdin:
+            print("  - Reading from stdin, progress bar will not show total.")
+            total = None
+        elif count_entries:
+            total = parquet_num_rows(self.settings.input_file)
+        else:
+            total = os.path.getsize(self.settings.input_file)
+
+        with (
+            open_dataset_writer(
+                temp_path,
+                output_ext,
+                compact=self.settings.compact,
+                indent=4,
+                field_types=self._output_field_types(),
+                # The temp path hides the suffix, so compression is passed explicitly
+                compression=output_compression,
+            ) as writer,
+            self._open_input() as f,
+            tqdm(
+                total=total,
+                desc="Formatting entries",
+                unit="entries" if count_entries else "B",
+                unit_scale=not count_entries,
+                unit_divisor=1024,
+            ) as pbar,
+            (
+                ProcessPoolExecutor(
+                    max_workers=workers,
+                    initializer=_init_worker,
+                    initargs=(self.settings, writer.encoder),
+                )
+                if workers > 1
+                else nullcontext()
+            ) as executor,
+        ):
+            chunks = self._iter_chunks(f)
+            if executor is not None:
+                results = self._ordered_results(executor, chunks, 2 * workers)
+            else:
+                results = (self.format_chunk(chunk, writer.encoder) for chunk in chunks)
+            try:
+                for texts, warnings in results:
+                    self._write_batch(texts, writer)
+                    self._warning_totals.update(warnings)
+                    self._update_progress(pbar, f, count_entries)
+            except json.JSONDecodeError as e:
+                print(f"Error reading data file: {e}", file=sys.stderr)
+                sys.exit(1)
+
+        if needs_finalize:
+            # The file is only complete on success, publish it under the final name
+            os.replace(temp_path, output_path)
+
+        self._print_warnings()
         print(
             f"\n✅ Successfully converted {self._total_processed} entries to '{output_path}'."
         )
@@ -112,80 +203,127 @@ class UnifiedDataFormatter:
                 print(f"  - Removing existing file: {path}")
                 os.remove(path)
 
-    def _count_entries(self) -> int:
+    def _open_input(self) -> BinaryIO:
         """
-        Quickly scan the file to count total lines/entries.
+        Open the input as a binary stream (stdin is left open on exit); .gz/.zst inputs
+        are decompressed in a background thread while the chunks are parsed.
         """
         try:
-            # Handle reading from stdin
             if self.settings.input_file == "/dev/stdin":
-                print(
-                    "  - Reading from stdin, cannot pre-count. Progress bar will not show total."
-                )
-                return 0  # Cannot determine total for a stream
-
-            with open(self.settings.input_file, "r", encoding="utf-8") as f:
-                if self.settings.input_file.endswith(".jsonl"):
-                    return sum(1 for line in f if line.strip())
-                else:
-                    return len(json.load(f))
-        except (IOError, json.JSONDecodeError) as e:
-            print(f"Error counting entries in file: {e}", file=sys.stderr)
+                return nullcontext(sys.stdin.buffer)
+            return open_binary_read(self.settings.input_file)
+        except IOError as e:
+            print(f"Error reading data file: {e}", file=sys.stderr)
             sys.exit(1)
 
-    def _iter_data(self) -> Generator[Dict[str, Any], None, None]:
+    def _update_progress(self, pbar: tqdm, f: BinaryIO, count_entries: bool):
         """
-        Create a data generator to read the file line by line/entry by entry to save memory.
+        Advance the progress bar to the input byte offset (or the entry count for stdin and Parquet).
         """
-        try:
-            # Handle reading from stdin
-            if self.settings.input_file == "/dev/stdin":
-                f = sys.stdin
-            else:
-                f = open(self.settings.input_file, "r", encoding="utf-8")
+        if count_entries:
+            pbar.update(self._total_processed - pbar.n)
+        else:
+            pbar.update(f.tell() - pbar.n)
+        pbar.set_postfix(entries=self._total_processed, refresh=False)
 
-            if not self.settings.input_file.endswith(".jsonl"):
-                data = json.load(f)
-                for entry in data:
-                    yield entry
-            else:
-                for line in f:
-                    if line.strip():
-                        yield json.loads(line)
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            print(f"Error reading data file: {e}", file=sys.stderr)
-            sys.exit(1)
-        finally:
-            if "f" in locals() and f is not sys.stdin:
-                f.close()
+    def _iter_chunks(self, f: BinaryIO) -> Generator[List[Any], None, None]:
+        """
+        Read the input in chunks of DEFAULT_BATCH_SIZE entries: raw lines for .jsonl (parsed
+        by whoever formats the chunk), parsed items for .json arrays (parsed incrementally)
+        and Parquet (read by batches of rows), so memory does not grow with the file.
+        """
+        if self._is_parquet_input():
+            entries = iter_parquet_rows(f, batch_size=self.DEFAULT_BATCH_SIZE)
+        elif dataset_ext(self.settings.input_file) != ".jsonl":
+            entries = iter_json_array(f)
+        else:
+            entries = (line for line in f if line.strip())
+        while True:
+            chunk = list(islice(entries, self.DEFAULT_BATCH_SIZE))
+            if not chunk:
+                return
+            yield chunk
+
+    def _is_parquet_input(self) -> bool:
+        return dataset_ext(self.settings.input_file) == ".parquet"
+
+    def _output_field_types(self) -> Dict[str, str]:
+        """
+        Column types of the formatted fields for Parquet output, tag fields typed like the
+        tagger outputs. `conversations` is inferred.
+        """
+        prompt_field, output_field = (
+            self.settings.prompt_field,
+            self.settings.output_field,
+        )
+        field_types = {
+            "id": "string",
+            "system": "string",
+            prompt_field: "string",
+            output_field: "string",
+            f"{prompt_field}_length": "int",
+            f"{output_field}_length": "int",
+        }
+        for name in FORMATTED_TAG_FIELDS:
+            field_types[name] = TagMissionProcessor.OUTPUT_FIELD_TYPES.get(
+                name, "string"
+            )
+        return field_types
 
-    def _write_batch(self, batch: List[OrderedDict], path: str):
+    @staticmethod
+    def _ordered_results(
+        executor: ProcessPoolExecutor, chunks: Iterable[List[Any]], max_pending: int
+    ) -> Generator[Tuple[List[bytes], Counter], None, None]:
+        """
+        Fan chunks out to the pool and yield their results in input order. The queue of
+        pending futures is the reorder buffer: a chunk finished early waits for the ones
+        before it, and at most max_pending chunks are in flight.
+        """
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(_format_chunk_in_worker, chunk))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def format_chunk(
+        self, chunk: List[Any], encoder: Callable[[Any], bytes]
+    ) -> Tuple[List[bytes], Counter]:
         """
-        Append a batch of data to the file (always JSONL format).
+        Parse (for raw lines), format and encode a chunk of entries.
+        Returns the encoded output entries and the warning counts of the chunk.
+        """
+        self.warnings = Counter()
+        texts = []
+        for raw in chunk:
+            entry = json_loads(raw) if isinstance(raw, bytes) else raw
+            processed_entry = self.process_entry(entry)
+            if processed_entry:
+                texts.append(encoder(processed_entry))
+        return texts, self.warnings
+
+    def _write_batch(self, batch: List[bytes], writer: JsonlWriter):
+        """
+        Append a batch of encoded entries to the open output writer (.jsonl lines or .json array items).
         """
         try:
-            with open(path, "a", encoding="utf-8") as f:
-                for item in batch:
-                    f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            for text in batch:
+                writer.write_encoded(text)
             self._total_processed += len(batch)
         except IOError as e:
             print(f"Error writing batch to file: {e}", file=sys.stderr)
             sys.exit(1)
 
-    def _convert_jsonl_to_json(self, jsonl_path: str, json_path: str):
+    def _print_warnings(self):
         """
-        Convert a temporary JSONL file to a valid JSON array file and format the output.
+        Print the warning counts aggregated over the run.
         """
-        try:
-            with (
-                open(jsonl_path, "r", encoding="utf-8") as f_in,
-                open(json_path, "w", encoding="utf-8") as f_out,
-            ):
-                items = [json.loads(line) for line in f_in if line.strip()]
-                json.dump(items, f_out, ensure_ascii=False, indent=4)
-        except (IOError, FileNotFoundError) as e:
-            print(f"Error converting JSONL to JSON: {e}", file=sys.stderr)
-            sys.exit(1)
+        if not self._warning_totals:
+            return
+        print("\n⚠️  Warnings:")
+        for reason, count in self._warning_totals.most_common():
+            print(f"  - {reason}: {count}")
 
     def process_entry(self, entry: Dict[str, Any]) -> Optional[OrderedDict]:
         """
@@ -194,7 +332,7 @@ class UnifiedDataFormatter:
         cleaned_entry = self._clean_entry(entry)
 
         if not self._can_build_conversation(cleaned_entry):
-            tqdm.write("Warning: Skipping an entry due to missing conversation fields.")
+            self.warnings["Skipped entries with missing conversation fields"] += 1
             return None
 
         od = OrderedDict()
@@ -214,9 +352,9 @@ class UnifiedDataFormatter:
         if od["conversations"]:
             first_conv = od["conversations"][0]
             if first_conv.get("from") != "human":
-                print(
-                    f"[Warning] Entry id={od['id']} prompt_field is not correctly filled, first conversation is not human, prompt field will be set to None."
-                )
+                self.warnings[
+                    "prompt_field set to None, first conversation is not human"
+                ] += 1
                 prompt_value = None
         od[self.settings.prompt_field] = prompt_value
         # output field validation logic
@@ -228,9 +366,9 @@ class UnifiedDataFormatter:
         if od["conversations"]:
             last_conv = od["conversations"][-1]
             if last_conv.get("from") != "gpt":
-                print(
-                    f"[Warning] Entry id={od['id']} output_field is not correctly filled, last conversation is not gpt, output field will be set to None."
-                )
+                self.warnings[
+                    "output_field set to None, last conversation is not gpt"
+                ] += 1
                 output_value = None
         od[self.settings.output_field] = output_value
         od[f"{self.settings.prompt_field}_length"] = len(od[self.settings.prompt_field])
@@ -344,7 +482,20 @@ class UnifiedDataFormatter:
             return None
 
 
-if __name__ == "__main__":
+# Formatter of a pool worker process, set up once by _init_worker
+_worker_state: Dict[str, Any] = {}
+
+
+def _init_worker(settings: BaseFormatterSettings, encoder: Callable[[Any], bytes]):
+    _worker_state["formatter"] = UnifiedDataFormatter(settings)
+    _worker_state["encoder"] = encoder
+
+
+def _format_chunk_in_worker(chunk: List[Any]) -> Tuple[List[bytes], Counter]:
+    return _worker_state["formatter"].format_chunk(chunk, _worker_state["encoder"])
+
+
+def main():
     try:
         settings = BaseFormatterSettings()
         formatter = UnifiedDataFormatter(settings)
@@ -352,3 +503,7 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"\n❌ An unexpected error occurred: {e}", file=sys.stderr)
         sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
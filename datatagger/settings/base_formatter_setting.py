@@ -6,10 +6,14 @@ class BaseFormatterSettings(
     BaseSettings, cli_parse_args=True, cli_enforce_required=True
 ):
     input_file: str = Field(
-        ..., description="Input data file path (supports .json/.jsonl)", required=True
+        ...,
+        description="Input data file path (supports .json/.jsonl/.parquet, JSON optionally .gz/.zst compressed)",
+        required=True,
     )
     output_file: str = Field(
-        ..., description="Output data file path (supports .json/.jsonl)", required=True
+        ...,
+        description="Output data file path (supports .json/.jsonl/.parquet, JSON optionally .gz/.zst compressed)",
+        required=True,
     )
     batch_size: int = Field(default=1000, description="Batch size")
     log_level: str = Field(default="INFO", description="Log level")
@@ -19,3 +23,10 @@ class BaseFormatterSettings(
     output_field: str = Field(
         default="output", description="Field name in input file to use as output"
     )
+    compact: bool = Field(
+        default=False, description="Write .json output without indentation"
+    )
+    workers: int = Field(
+        default=1,
+        description="Formatting processes; chunks of entries are formatted in parallel and written in input order",
+    )
@@ -1,5 +1,5 @@
 from enum import Enum, auto
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import Field
 from pydantic_settings import BaseSettings
@@ -27,7 +27,34 @@ class BaseTaggerSettings(BaseSettings, cli_parse_args=True, cli_enforce_required
     )
     output_file: Optional[str] = Field(
         default=None,
-        description="Output file path. If not provided, will use {input_file_base}_{tag_mission}.jsonl",
+        description="Output file path (.json, .jsonl or .parquet; JSON may end in .gz/.zst). If not provided, will use {input_file_base}_{tag_mission}.jsonl plus the input's compression suffix",
+    )
+    compact_json: bool = Field(
+        default=False, description="Write .json output without indentation"
+    )
+    sidecar_output: bool = Field(
+        default=False,
+        description="Load only prompt_field/output_field (and row_key_field) of the input and write only the mission's output fields, keyed by row, to a sidecar output ({input_file_base}_{tag_mission}_tags.jsonl by default); `datatagger join` merges sidecars back into the dataset",
+    )
+    columnar_dataset: bool = Field(
+        default=False,
+        description="Hold the dataset in columns while tagging: text as packed read-only buffers, tag fields as typed arrays (scores as floats, categories dictionary-encoded; values that do not convert become null)",
+    )
+    incremental: bool = Field(
+        default=False,
+        description="Only tag rows whose mission output fields are not all filled yet, e.g. after merging new rows into a tagged dataset",
+    )
+    incremental_prompt_hash: bool = Field(
+        default=False,
+        description="With incremental, also store a hash of prompt_field/output_field ({tag_mission}_prompt_hash) and re-tag rows whose text changed since",
+    )
+    retry_failed: bool = Field(
+        default=False,
+        description="Re-process only the rows listed in the failure ledger ({output_file_base}_failures.json) and patch them into the existing output file",
+    )
+    row_key_field: Optional[str] = Field(
+        default=None,
+        description="Input field identifying a row in sidecar outputs, defaults to the row index (_row)",
     )
     prompt_field: str = Field(
         default="instruction", description="Field name in input file to use as prompt"
@@ -44,6 +71,20 @@ class BaseTaggerSettings(BaseSettings, cli_parse_args=True, cli_enforce_required
     repetition_penalty: float = Field(default=1.0, description="Repetition penalty")
     dimension: int = Field(default=2560, description="Embedding dimension")
 
+    # language detector (lingua) related configuration
+    language_detector_languages: Optional[List[str]] = Field(
+        default=None,
+        description="ISO 639-1 codes of candidate languages for LANGUAGE mission, e.g. zh en ja. Defaults to all 75 languages",
+    )
+    language_detector_low_accuracy: bool = Field(
+        default=False,
+        description="Use lingua low accuracy mode (faster, far less memory, weaker on short texts)",
+    )
+    language_detector_preload: bool = Field(
+        default=False,
+        description="Load language models eagerly when building the detector",
+    )
+
     milvus_store_embeddings: bool = Field(
         default=False, description="Whether to store embeddings in Milvus"
     )
@@ -52,6 +93,25 @@ class BaseTaggerSettings(BaseSettings, cli_parse_args=True, cli_enforce_required
     milvus_collection: str = Field(
         default="embeddings", description="Milvus collection name"
     )
+    milvus_uri: Optional[str] = Field(
+        default=None,
+        description="Milvus URI, overrides host/port. A local file path (e.g. data/milvus.db) uses milvus-lite",
+    )
+    milvus_index_type: Optional[str] = Field(
+        default=None,
+        description="Milvus vector index built before searching: HNSW, IVF_FLAT, IVF_SQ8, FLAT or AUTOINDEX "
+        "(milvus-lite supports FLAT, IVF_FLAT and AUTOINDEX). Defaults to HNSW, AUTOINDEX when milvus_uri is a local file",
+    )
+    milvus_ef_search: int = Field(
+        default=64, description="HNSW ef used by Milvus searches"
+    )
+    milvus_nprobe: int = Field(
+        default=16, description="IVF nprobe used by Milvus searches"
+    )
+    milvus_insert_batch_size: int = Field(
+        default=10000,
+        description="Rows buffered before an insert request; segments are flushed at checkpoints and on close",
+    )
 
     # faiss related configuration
     faiss_store_embeddings: bool = Field(
@@ -61,5 +121,118 @@ class BaseTaggerSettings(BaseSettings, cli_parse_args=True, cli_enforce_required
         default="data/faiss.index", description="Faiss index file path"
     )
     faiss_meta_file: str = Field(
-        default="data/faiss_meta.pkl", description="Faiss meta info file path"
+        default="data/faiss_meta",
+        description="Faiss meta store path prefix (.strings/.records files). A legacy pickle at <prefix>.pkl is migrated on first use",
+    )
+    faiss_index_factory: str = Field(
+        default="Flat",
+        description="Faiss index factory string for new indexes, e.g. Flat, HNSW32, IVF4096,PQ64, IVF1024,SQ8",
+    )
+    faiss_train_size: int = Field(
+        default=100000,
+        description="Number of first embeddings buffered and sampled to train IVF/PQ/SQ indexes",
+    )
+    faiss_nprobe: int = Field(
+        default=16, description="Number of IVF lists visited per search"
+    )
+    faiss_ef_search: int = Field(
+        default=64, description="HNSW efSearch (search-time candidate list size)"
+    )
+    faiss_snapshot_every: int = Field(
+        default=100,
+        description="Insert batches between full Faiss index snapshots, inserts in between go to an append-only log. 0 snapshots only at the end of the run",
+    )
+    faiss_storage: str = Field(
+        default="float32",
+        description="Faiss vector storage: float32, float16 (SQfp16, half the memory) or sq8 (SQ8, a quarter). "
+        "Applied to the Flat/HNSW part of faiss_index_factory; float16/sq8 also halve the insert log",
+    )
+    faiss_reduce: Optional[str] = Field(
+        default=None,
+        description="Dimensionality reduction applied before vectors enter a new Faiss index: PCA<d>, PCAR<d> (PCA + rotation), "
+        "OPQ<m>_<d> (trained on the first faiss_train_size vectors) or MRL<d> (Matryoshka truncation + re-normalization)",
+    )
+    faiss_mmap: bool = Field(
+        default=False,
+        description="Search the Faiss snapshot memory-mapped and read-only during the similarity postprocess",
+    )
+
+    # similarity postprocess of the EMBEDDING mission
+    similarity_top_k: int = Field(
+        default=5, description="Number of neighbors inspected per row"
+    )
+    similarity_distance_threshold: float = Field(
+        default=0.1, description="Neighbors closer than this count towards repeat_count"
+    )
+    similarity_batch_size: int = Field(
+        default=4096, description="Number of query vectors per batched index search"
+    )
+
+    # embedding cache of the EMBEDDING mission
+    embedding_cache_dir: Optional[str] = Field(
+        default=None,
+        description="Directory of a persistent embedding cache keyed by model and prompt hash. "
+        "Cached prompts are not sent to the model again",
+    )
+    embedding_cache_dtype: str = Field(
+        default="float32",
+        description="Storage type of a new embedding cache: float32 or float16",
+    )
+
+    # query-only comparison of the EMBEDDING mission against an existing index
+    reference_index_file: Optional[str] = Field(
+        default=None,
+        description="Existing Faiss index to compare the new rows against (opened read-only). "
+        "Neighbor fields are computed against it per batch; new vectors are only inserted if a store is enabled, after the comparison",
+    )
+    reference_meta_file: Optional[str] = Field(
+        default=None, description="Meta store path prefix of the reference index"
+    )
+    reference_mmap: bool = Field(
+        default=True, description="Memory-map the reference index instead of loading it"
+    )
+
+    # near-duplicate clustering of the EMBEDDING mission
+    dedup_enabled: bool = Field(
+        default=False,
+        description="Cluster near-duplicate rows and add dedup_cluster_id, cluster_size and keep",
+    )
+    dedup_distance_threshold: float = Field(
+        default=0.1,
+        description="Rows whose embeddings are closer than this (squared L2) are near duplicates",
+    )
+    dedup_max_neighbors: int = Field(
+        default=100,
+        description="Neighbors searched per row when the index has no range search",
+    )
+    dedup_keep_policy: str = Field(
+        default="first",
+        description="Row kept per cluster: first, shortest, longest or input_quality (highest, from a QUALITY run)",
+    )
+
+    # lexical MinHash/LSH pre-filter of the EMBEDDING mission
+    minhash_enabled: bool = Field(
+        default=False,
+        description="Cluster lexical near-duplicate prompts with MinHash/LSH before embedding and add lexical_cluster_id",
+    )
+    minhash_threshold: float = Field(
+        default=0.8,
+        description="Estimated Jaccard similarity of character shingles above which prompts are lexical duplicates",
+    )
+    minhash_num_perm: int = Field(
+        default=128, description="Number of MinHash permutations"
+    )
+    minhash_bands: int = Field(
+        default=16, description="Number of LSH bands, must divide minhash_num_perm"
+    )
+    minhash_ngram: int = Field(
+        default=5, description="Character shingle length of the normalized prompts"
+    )
+    minhash_workers: Optional[int] = Field(
+        default=None,
+        description="Processes computing signatures, defaults to the CPU count",
+    )
+    minhash_skip_duplicates: bool = Field(
+        default=False,
+        description="Do not embed rows whose lexical_cluster_id is another row",
     )
@@ -0,0 +1,32 @@
+from typing import List, Optional
+
+from pydantic import Field, model_validator
+from pydantic_settings import BaseSettings
+
+
+class CacheCompactSettings(
+    BaseSettings, cli_parse_args=True, cli_enforce_required=True
+):
+    embedding_cache_dir: str = Field(..., description="Embedding cache directory")
+    keep_files: Optional[List[str]] = Field(
+        default=None,
+        description="Datasets (.json/.jsonl) whose prompts are kept, all other entries are dropped. "
+        "Defaults to keeping every entry and only removing duplicates",
+    )
+    prompt_field: str = Field(
+        default="instruction", description="Prompt field of the keep_files rows"
+    )
+    model: str = Field(
+        default="",
+        description="Model the kept entries were embedded with (vllm_model_path or api_model_name of the tagging run), required with keep_files",
+    )
+    dtype: Optional[str] = Field(
+        default=None, description="Convert the stored vectors to float32 or float16"
+    )
+
+    @model_validator(mode="after")
+    def check_model(self) -> "CacheCompactSettings":
+        # Cache keys include the model, without it no kept prompt would match
+        if self.keep_files and not self.model:
+            raise ValueError("--model is required with --keep_files")
+        return self
@@ -0,0 +1,39 @@
+from typing import List, Optional
+
+from pydantic import Field
+from pydantic_settings import BaseSettings
+
+
+class FaissReportSettings(BaseSettings, cli_parse_args=True, cli_enforce_required=True):
+    index_factory: Optional[str] = Field(
+        default=None,
+        description="Faiss factory string to evaluate, e.g. IVF4096,PQ64 or HNSW32",
+    )
+    reduce_values: Optional[List[str]] = Field(
+        default=None,
+        description="Dimensionality reductions to compare against the full vectors, e.g. PCA256,OPQ32_256,MRL512",
+    )
+    faiss_index_file: Optional[str] = Field(
+        default="data/faiss.index",
+        description="Existing Faiss index to sample vectors from",
+    )
+    faiss_meta_file: str = Field(
+        default="data/faiss_meta",
+        description="Faiss meta store path prefix (.strings/.records files). A legacy pickle at <prefix>.pkl is migrated on first use",
+    )
+    vectors_file: Optional[str] = Field(
+        default=None,
+        description="Optional .npy file of vectors to sample from instead of the index",
+    )
+    dimension: int = Field(default=2560, description="Embedding dimension")
+    sample_size: int = Field(
+        default=100000, description="Number of vectors the report is computed on"
+    )
+    num_queries: int = Field(default=1000, description="Number of query vectors")
+    top_k: int = Field(default=10, description="Recall is measured at top_k")
+    nprobe_values: List[int] = Field(
+        default=[1, 4, 16, 64], description="nprobe values to evaluate (IVF)"
+    )
+    ef_search_values: List[int] = Field(
+        default=[16, 32, 64, 128], description="efSearch values to evaluate (HNSW)"
+    )
@@ -0,0 +1,19 @@
+from typing import List, Optional
+
+from pydantic import Field
+from pydantic_settings import BaseSettings
+
+
+class JsonBenchSettings(BaseSettings, cli_parse_args=True, cli_enforce_required=True):
+    input_file: Optional[str] = Field(
+        default=None,
+        description="Dataset (.json/.jsonl) whose rows are benchmarked instead of the built-in row shapes",
+    )
+    rows: int = Field(default=10000, description="Rows encoded and decoded per round")
+    repeat: int = Field(
+        default=5, description="Rounds per measurement, the fastest one is reported"
+    )
+    backends: Optional[List[str]] = Field(
+        default=None,
+        description="JSON backends to compare (orjson, msgspec, json), defaults to all installed ones",
+    )
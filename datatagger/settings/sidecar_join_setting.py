@@ -0,0 +1,26 @@
+from typing import List, Optional
+
+from pydantic import Field
+from pydantic_settings import BaseSettings
+
+
+class SidecarJoinSettings(BaseSettings, cli_parse_args=True, cli_enforce_required=True):
+    input_file: str = Field(
+        ...,
+        description="Full dataset the sidecars were tagged from (.json/.jsonl/.parquet, JSON optionally .gz/.zst)",
+    )
+    sidecar_files: List[str] = Field(
+        ...,
+        description="Sidecar outputs of sidecar_output tagging runs, merged in the given order",
+    )
+    output_file: str = Field(
+        ...,
+        description="Joined dataset path (.json/.jsonl/.parquet, JSON optionally .gz/.zst)",
+    )
+    row_key_field: Optional[str] = Field(
+        default=None,
+        description="Row key field the sidecars were written with, defaults to the row index (_row)",
+    )
+    compact: bool = Field(
+        default=False, description="Write .json output without indentation"
+    )
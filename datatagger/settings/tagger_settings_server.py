@@ -0,0 +1,28 @@
+from typing import List, Optional
+
+from datatagger.settings.tagger_settings_vllm import TaggerSettingsVLLM
+from pydantic import Field
+
+
+class TaggerServerSettings(TaggerSettingsVLLM):
+    host: str = Field(default="0.0.0.0", description="Host the tagging server binds to")
+    port: int = Field(default=8000, description="Port the tagging server listens on")
+    serve_missions: Optional[List[str]] = Field(
+        default=None,
+        description="Missions exposed as /tag/<mission> endpoints. Defaults to tag_mission. "
+        "Missions sharing one model (e.g. QUALITY, DIFFICULTY, CLASSIFICATION) plus LANGUAGE can be combined",
+    )
+    max_batch_size: int = Field(
+        default=32, description="Maximum number of items coalesced into one micro-batch"
+    )
+    max_wait_ms: float = Field(
+        default=10.0,
+        description="Maximum time (ms) the first queued item waits for a micro-batch to fill",
+    )
+    request_timeout: float = Field(
+        default=300.0, description="Seconds a request waits for its results"
+    )
+    metrics_window: int = Field(
+        default=10000,
+        description="Number of recent requests kept for latency percentiles",
+    )
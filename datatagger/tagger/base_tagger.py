@@ -1,13 +1,24 @@
 import datetime
 import json
 import os
-from typing import Any, Dict, List, Optional, Tuple
-
-from lingua import LanguageDetectorBuilder
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
 
 from datatagger.settings.base_tagger_setting import BaseTaggerSettings, TagMission
 from datatagger.tagger.tag_missions import TagMissionProcessor
-from datatagger.utils.file_utils import CheckpointManager, save_dataset
+from datatagger.utils.columnar_dataset import ColumnarDataset
+from datatagger.utils.file_utils import (
+    JSON_BACKEND,
+    ROW_INDEX_FIELD,
+    CheckpointManager,
+    FailureLedger,
+    compression_suffix,
+    dataset_ext,
+    iter_dataset_rows,
+    load_dataset_from_file,
+    save_dataset,
+    split_compression,
+)
+from datatagger.utils.language_utils import detect_languages, get_language_detector
 from datatagger.utils.logger import setup_logger
 
 
@@ -34,28 +45,85 @@ class BaseUnifiedTagger:
         self.logger = setup_logger(
             project_name=self.tag_mission, console_log_level=self.settings.log_level
         )
+        self.logger.info(f"JSON backend: {JSON_BACKEND}")
+        self.milvus_client = None
+        self.faiss_client = None
         if self.milvus_store_embeddings:
-            from datatagger.utils.milvus_utils import MilvusClient
+            try:
+                from datatagger.utils.milvus_utils import MilvusClient
+            except ImportError:
+                self.logger.error(
+                    "Milvus related dependencies are not installed, please install them or disable milvus_store_embeddings."
+                )
+                raise
 
             self.logger.info(
-                f"Initializing Milvus client with host: {settings.milvus_host}, port: {settings.milvus_port}, collection: {settings.milvus_collection}, dim: {self.dimension}"
+                f"Initializing Milvus client with {f'uri: {settings.milvus_uri}' if settings.milvus_uri else f'host: {settings.milvus_host}, port: {settings.milvus_port}'}, collection: {settings.milvus_collection}, dim: {self.dimension}, index: {settings.milvus_index_type or 'default'}"
             )
             self.milvus_client = MilvusClient(
                 host=settings.milvus_host,
                 port=settings.milvus_port,
                 collection_name=settings.milvus_collection,
                 dim=self.dimension,
+                uri=settings.milvus_uri,
+                index_type=settings.milvus_index_type,
+                ef_search=settings.milvus_ef_search,
+                nprobe=settings.milvus_nprobe,
+                insert_batch_size=settings.milvus_insert_batch_size,
             )
         if self.faiss_store_embeddings:
+            self.logger.info(
+                f"Initializing Faiss client with index_file: {self.faiss_index_file}, meta_file: {self.faiss_meta_file}, dim: {self.dimension}, index: {settings.faiss_index_factory}, storage: {settings.faiss_storage}, reduce: {settings.faiss_reduce}"
+            )
+            self.faiss_client = self.open_faiss_client()
+        self.reference_client = None
+        if self.mission == TagMission.EMBEDDING and settings.reference_index_file:
             from datatagger.utils.faiss_utils import FaissClient
 
+            if not settings.reference_meta_file:
+                raise ValueError(
+                    "reference_meta_file is required with reference_index_file"
+                )
             self.logger.info(
-                f"Initializing Faiss client with index_file: {self.faiss_index_file}, meta_file: {self.faiss_meta_file}, dim: {self.dimension}"
+                f"Query-only mode: comparing against reference index {settings.reference_index_file} (mmap: {settings.reference_mmap})"
             )
-            self.faiss_client = FaissClient(
-                index_file=self.faiss_index_file,
-                meta_file=self.faiss_meta_file,
+            self.reference_client = FaissClient(
+                index_file=settings.reference_index_file,
+                meta_file=settings.reference_meta_file,
+                dim=self.dimension,
+                nprobe=settings.faiss_nprobe,
+                ef_search=settings.faiss_ef_search,
+                read_only=True,
+                mmap=settings.reference_mmap,
+            )
+        self.minhash_skipped = 0
+        self.incremental = settings.incremental
+        if self.incremental and self.mission == TagMission.EMBEDDING:
+            # Neighbor fields depend on the whole index, repeated embeddings are
+            # avoided by embedding_cache_dir instead
+            self.logger.warning(
+                "Incremental mode does not apply to the EMBEDDING mission, all rows are processed"
+            )
+            self.incremental = False
+        if settings.retry_failed and self.mission == TagMission.EMBEDDING:
+            raise ValueError(
+                "retry_failed is not supported for the EMBEDDING mission, failed rows have no ledger"
+            )
+        # Failed rows of the running loop, see record_row_error
+        self.failure_ledger: Optional[FailureLedger] = None
+        self.row_errors: Dict[int, str] = {}
+        self.embedding_cache = None
+        if self.mission == TagMission.EMBEDDING and settings.embedding_cache_dir:
+            from datatagger.utils.embedding_cache import EmbeddingCache
+
+            self.embedding_cache = EmbeddingCache(
+                cache_dir=settings.embedding_cache_dir,
                 dim=self.dimension,
+                model=self.embedding_model_name,
+                dtype=settings.embedding_cache_dtype,
+            )
+            self.logger.info(
+                f"Using embedding cache {settings.embedding_cache_dir} with {len(self.embedding_cache)} entries"
             )
         if settings.input_file:
             _, self.checkpoint_data_file, self.checkpoint_state_file = (
@@ -69,9 +137,12 @@ class BaseUnifiedTagger:
             self.checkpoint_data_file = None
             self.checkpoint_state_file = None
         if self.mission == TagMission.LANGUAGE:
-            self.logger.info("Building language detector from all languages")
-            self.detector = LanguageDetectorBuilder.from_all_languages().build()
-            self.logger.info("Language detector built successfully")
+            self.detector = get_language_detector(
+                languages=settings.language_detector_languages,
+                low_accuracy=settings.language_detector_low_accuracy,
+                preload=settings.language_detector_preload,
+                logger=self.logger,
+            )
 
     @staticmethod
     def get_output_files(
@@ -80,21 +151,173 @@ class BaseUnifiedTagger:
         """
         Automatically determine output and checkpoint file suffixes based on settings.output_file (if provided),
         ensuring checkpoint_data_file matches output_file's suffix, and checkpoint_state_file is always .json.
+        A .gz/.zst suffix is kept for the checkpoint data, the default output keeps the input's one.
         """
         import os
 
         if settings.output_file:
             output_file = settings.output_file
-            ext = os.path.splitext(output_file)[1]
+            output_root, compression = split_compression(output_file)
+            ext = os.path.splitext(output_root)[1]
+            if ext == ".parquet" and compression:
+                raise ValueError(
+                    f"{output_file}: Parquet files are compressed internally, drop the .gz/.zst suffix"
+                )
         else:
-            base_name = input_file[: input_file.rfind(".")]
+            input_root, compression = split_compression(input_file)
+            base_name = os.path.splitext(input_root)[0]
             ext = ".jsonl"
-            output_file = f"{base_name}_{tag_mission}{ext}"
-        base_ckpt = os.path.splitext(output_file)[0]
-        checkpoint_data_file = f"{base_ckpt}_checkpoint{ext}"
+            suffix = "_tags" if settings.sidecar_output else ""
+            output_root = f"{base_name}_{tag_mission}{suffix}{ext}"
+            output_file = output_root + compression_suffix(compression)
+        base_ckpt = os.path.splitext(output_root)[0]
+        # Checkpoints are JSON arrays, also when the output is Parquet
+        checkpoint_ext = ".json" if ext == ".parquet" else ext
+        checkpoint_data_file = (
+            f"{base_ckpt}_checkpoint{checkpoint_ext}{compression_suffix(compression)}"
+        )
         checkpoint_state_file = f"{base_ckpt}_checkpoint_state.json"
         return output_file, checkpoint_data_file, checkpoint_state_file
 
+    def load_input_dataset(self) -> Union[List[Dict[str, Any]], ColumnarDataset]:
+        """
+        Load settings.input_file; in sidecar mode only the fields the mission reads
+        (and the row key) are kept, so wide rows are never held in memory. With
+        columnar_dataset the rows are streamed into a ColumnarDataset.
+        """
+        columns = None
+        if self.settings.sidecar_output:
+            columns = self.mission_processor.get_input_fields()
+            if self.settings.row_key_field:
+                columns.append(self.settings.row_key_field)
+            if self.incremental:
+                # Existing tags decide which rows are skipped
+                columns += self.mission_processor.get_fields()
+            self.logger.info(f"Sidecar output: loading only fields {columns}")
+        if self.settings.columnar_dataset:
+            dataset = ColumnarDataset.from_rows(
+                iter_dataset_rows(self.settings.input_file, columns=columns),
+                field_types=self.mission_processor.get_output_field_types(),
+            )
+            self.logger.info(
+                f"Loaded {len(dataset)} rows into columns {list(dataset.columns)}"
+            )
+        elif columns is None:
+            dataset = load_dataset_from_file(self.settings.input_file)
+        else:
+            dataset = list(iter_dataset_rows(self.settings.input_file, columns=columns))
+        if self.settings.retry_failed:
+            self.merge_existing_output(dataset)
+        return dataset
+
+    def merge_existing_output(self, dataset: List[Dict[str, Any]]) -> None:
+        """Merge the rows of the existing output file into the dataset, for --retry_failed."""
+        output_file = self.get_output_files(
+            settings=self.settings,
+            tag_mission=self.tag_mission,
+            input_file=self.settings.input_file,
+        )[0]
+        if not os.path.exists(output_file):
+            raise FileNotFoundError(
+                f"retry_failed patches an existing output, {output_file} does not exist"
+            )
+        key_field = self.settings.row_key_field or ROW_INDEX_FIELD
+        for item, row in zip(dataset, iter_dataset_rows(output_file)):
+            if self.settings.sidecar_output:
+                row.pop(key_field, None)
+            item.update(row)
+        self.logger.info(f"Retrying failed rows of {output_file}")
+
+    def sidecar_rows(self, dataset: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Output fields of every row, keyed by row_key_field or the row index."""
+        key_field = self.settings.row_key_field
+        fields = self.mission_processor.get_fields()
+        return [
+            {
+                key_field or ROW_INDEX_FIELD: item.get(key_field) if key_field else idx,
+                **{field: item.get(field) for field in fields},
+            }
+            for idx, item in enumerate(dataset)
+        ]
+
+    def rows_to_tag(self, dataset: List[Dict[str, Any]], start: int) -> Sequence[int]:
+        """
+        Indices of the rows from start on that need tagging: all of them, in incremental
+        mode those the mission has not tagged yet (see TagMissionProcessor.is_tagged),
+        with retry_failed those of the failure ledger.
+        """
+        if self.settings.retry_failed:
+            return [
+                row for row in self.failure_ledger.rows() if start <= row < len(dataset)
+            ]
+        if not self.incremental:
+            return range(start, len(dataset))
+        is_tagged = self.mission_processor.is_tagged
+        return [
+            idx for idx in range(start, len(dataset)) if not is_tagged(dataset[idx])
+        ]
+
+    @staticmethod
+    def get_failure_ledger_file(output_file: str) -> str:
+        """Failure ledger of an output file: {output_base}_failures.json."""
+        base = os.path.splitext(split_compression(output_file)[0])[0]
+        return f"{base}_failures.json"
+
+    def record_row_error(self, idx: int, error: str) -> None:
+        """Note why a row failed, for the failure ledger of the running loop."""
+        if self.failure_ledger is not None:
+            self.row_errors[idx] = error
+
+    def update_failure_ledger(
+        self, batch_indices: List[int], dataset: List[Dict[str, Any]]
+    ) -> None:
+        """
+        Record the rows of a batch that failed (an error noted by record_row_error, e.g.
+        a model answer without the required fields) and clear the others. Rows that
+        correctly have no output (an empty prompt, text of no detectable language, a
+        row the model was not asked about) are not failures.
+        """
+        if self.failure_ledger is None:
+            return
+        for idx in batch_indices:
+            error = self.row_errors.pop(idx, None)
+            if error is not None and not self.mission_processor.has_output(
+                dataset[idx]
+            ):
+                self.failure_ledger.record(idx, error)
+            else:
+                self.failure_ledger.resolve(idx)
+        self.row_errors.clear()
+
+    def save_failure_ledger(self) -> None:
+        if self.failure_ledger is not None:
+            self.failure_ledger.save()
+
+    def log_failure_summary(self, logger) -> None:
+        ledger = self.failure_ledger
+        if ledger is None:
+            return
+        if not len(ledger):
+            logger.info("No failed rows.")
+            return
+        reasons = ", ".join(
+            f"{error}: {count}" for error, count in ledger.reasons().most_common()
+        )
+        logger.warning(
+            f"{len(ledger)} rows failed ({reasons}), listed in {ledger.file_path}; "
+            "rerun with --retry_failed True to re-process only them."
+        )
+
+    def store_prompt_hashes(
+        self, batch_indices: List[int], dataset: List[Dict[str, Any]]
+    ) -> None:
+        """Record the prompt hash of freshly tagged rows for later incremental runs."""
+        if not (self.incremental and self.settings.incremental_prompt_hash):
+            return
+        field = self.mission_processor.get_prompt_hash_field()
+        for idx in batch_indices:
+            dataset[idx][field] = self.mission_processor.get_prompt_hash(dataset[idx])
+
     @staticmethod
     def load_checkpoint_state(checkpoint_state_file: str) -> Optional[Dict[str, Any]]:
         if os.path.exists(checkpoint_state_file):
@@ -130,32 +353,31 @@ class BaseUnifiedTagger:
         batch_indices: List[int],
         dataset: List[Dict[str, Any]],
         prompt_field: str,
+        languages: Optional[List[str]] = None,
     ) -> None:
+        """
+        Detect the language of a whole batch at once: unambiguous scripts are settled
+        without the model, the rest goes through lingua's multi-threaded batch API.
+        languages are the candidate ISO 639-1 codes the detector was built with.
+        """
+        if not batch_indices:
+            return
         logger.info(
-            f"Processing batch with language detection for indices: {batch_indices}"
+            f"Processing batch with language detection for indices: {batch_indices[0]}-{batch_indices[-1]}"
+        )
+        texts = [dataset[idx].get(prompt_field) for idx in batch_indices]
+        try:
+            detected, by_script = detect_languages(detector, texts, languages)
+        except Exception as e:
+            logger.error(
+                f"Failed to detect language for batch {batch_indices[0]}-{batch_indices[-1]}: {str(e)}"
+            )
+            detected, by_script = [None] * len(batch_indices), 0
+        for idx, language in zip(batch_indices, detected):
+            dataset[idx]["language"] = language
+        logger.debug(
+            f"Language detected for {len(batch_indices)} items, {by_script} settled by script"
         )
-        for idx in batch_indices:
-            item = dataset[idx]
-            if item[prompt_field] != "":
-                try:
-                    logger.debug(
-                        f"Detecting language for index {idx}: {item[prompt_field][:100]}..."
-                    )
-                    detected_language = detector.detect_language_of(
-                        item[prompt_field]
-                    ).iso_code_639_1.name
-                    item["language"] = detected_language
-                    logger.debug(
-                        f"Successfully detected language for index {idx}: {detected_language}"
-                    )
-                except Exception as e:
-                    logger.error(f"Failed to detect language for index {idx}: {str(e)}")
-                    item["language"] = None
-            else:
-                logger.debug(
-                    f"Empty prompt field for index {idx}, setting language to None"
-                )
-                item["language"] = None
 
     def generate_and_update_with_checkpoint(
         self,
@@ -172,7 +394,8 @@ class BaseUnifiedTagger:
         """
         General checkpoint-resume main loop, for subclass use.
         process_batch_fn(batch_indices, dataset) is the batch processing function.
-        postprocess_fn(dataset) is optional, for post-processing before final save.
+        postprocess_fn(dataset, checkpoint_manager) is optional, for post-processing before
+        final save; it may checkpoint its own progress through checkpoint_manager.extra_state.
         """
         if not batch_size:
             batch_size = self.batch_size
@@ -180,41 +403,108 @@ class BaseUnifiedTagger:
             checkpoint_every = self.checkpoint_every
         if not logger:
             logger = self.logger
+        sidecar = self.settings.sidecar_output
+        # Sidecar checkpoints hold the tags only, they are merged into the loaded rows
         checkpoint_manager = CheckpointManager(
-            checkpoint_data_file, checkpoint_state_file
+            checkpoint_data_file,
+            checkpoint_state_file,
+            fields=self.mission_processor.get_fields() if sidecar else None,
         )
         loaded = checkpoint_manager.load()
         if loaded:
             processed_data, last_checkpoint_idx = loaded
             logger.info(f"Checkpoint found. Resuming from index {last_checkpoint_idx}.")
-            dataset[:last_checkpoint_idx] = processed_data
+            if sidecar:
+                for item, tags in zip(dataset, processed_data):
+                    item.update(tags)
+            else:
+                dataset[:last_checkpoint_idx] = processed_data
         else:
             last_checkpoint_idx = 0
-        num_batches = (
-            len(dataset) - last_checkpoint_idx + batch_size - 1
-        ) // batch_size
+        if self.mission == TagMission.EMBEDDING:
+            self.reconcile_embedding_stores(
+                dataset, last_checkpoint_idx, checkpoint_manager, logger
+            )
+        if self.mission == TagMission.EMBEDDING and self.settings.minhash_enabled:
+            self.update_lexical_clusters(dataset)
+        if self.mission != TagMission.EMBEDDING:
+            self.failure_ledger = FailureLedger(
+                self.get_failure_ledger_file(output_file)
+            ).load()
+        pending = self.rows_to_tag(dataset, last_checkpoint_idx)
+        if self.settings.retry_failed:
+            logger.info(f"Retrying {len(pending)} failed rows.")
+        skipped = len(dataset) - last_checkpoint_idx - len(pending)
+        if self.incremental:
+            logger.info(
+                f"Incremental mode: {len(pending)} rows to tag, {skipped} already tagged rows skipped."
+            )
+        num_batches = (len(pending) + batch_size - 1) // batch_size
+        end_idx = last_checkpoint_idx
+        # Batch being processed, its rows are not in the failure ledger yet
+        open_batch: List[int] = []
         try:
             for i in range(num_batches):
-                start_idx = i * batch_size + last_checkpoint_idx
-                end_idx = min((i + 1) * batch_size + last_checkpoint_idx, len(dataset))
-                batch_indices = list(range(start_idx, end_idx))
+                batch_indices = list(pending[i * batch_size : (i + 1) * batch_size])
+                open_batch = batch_indices
+                # Rows up to the batch end are done, skipped ones included
+                end_idx = batch_indices[-1] + 1
                 process_batch_fn(batch_indices, dataset)
+                self.store_prompt_hashes(batch_indices, dataset)
+                self.update_failure_ledger(batch_indices, dataset)
+                open_batch = []
                 if (i + 1) % checkpoint_every == 0:
+                    self.flush_embedding_stores()
                     checkpoint_manager.save(dataset, end_idx)
+                    self.save_failure_ledger()
                     logger.info(f"Checkpoint saved at index {end_idx}.")
+            end_idx = len(dataset)
 
             # Save final result before completion
             if postprocess_fn is not None:
-                postprocess_fn(dataset)
+                postprocess_fn(dataset, checkpoint_manager)
 
-            ext = os.path.splitext(output_file)[1].lower()
-            save_dataset(data=dataset, file_path=output_file, ext=ext)
+            ext = dataset_ext(output_file)
+            field_types = self.mission_processor.get_output_field_types()
+            if sidecar:
+                if not self.settings.row_key_field:
+                    field_types[ROW_INDEX_FIELD] = "int"
+                output_data = self.sidecar_rows(dataset)
+            else:
+                output_data = dataset
+            save_dataset(
+                data=output_data,
+                file_path=output_file,
+                ext=ext,
+                compact=self.settings.compact_json,
+                field_types=field_types,
+            )
+            self.close_embedding_stores()
 
             checkpoint_manager.cleanup()
+            self.save_failure_ledger()
+            self.log_failure_summary(logger)
+            if self.incremental:
+                logger.info(
+                    f"Tagged {len(pending)} rows, skipped {skipped} already tagged rows."
+                )
             logger.info("Processing completed. Checkpoint cleaned up.")
         except Exception as e:
             logger.error(f"Error during processing: {str(e)}")
+            try:
+                self.flush_embedding_stores()
+            except Exception as flush_error:
+                logger.error(f"Error flushing embedding stores: {str(flush_error)}")
+            if open_batch:
+                if self.failure_ledger is not None:
+                    # The checkpoint moves past the failed batch, its rows are retried from the ledger
+                    for idx in open_batch:
+                        self.row_errors.setdefault(idx, type(e).__name__)
+                    self.update_failure_ledger(open_batch, dataset)
+                else:
+                    end_idx = open_batch[0]
             checkpoint_manager.save(dataset, end_idx)
+            self.save_failure_ledger()
             raise
 
     def get_neighbor_info(
@@ -272,38 +562,458 @@ class BaseUnifiedTagger:
             min_similar_instruction,
         )
 
-    def update_similarity_fields(self, dataset, backend=None, field=None):
-        # backend: 'milvus' 或 'faiss'，自动判断
-        # field: 'prompt' 或 'output'，默认只处理 prompt
-        if backend is None:
-            backend = (
-                "milvus" if getattr(self, "milvus_store_embeddings", False) else "faiss"
-            )
-        if field is None:
-            field = getattr(self, "prompt_field", "prompt")
-        for item in dataset:
-            meta = str(item.get(field, ""))
-            if backend == "milvus" and hasattr(self, "milvus_client"):
-                results = self.milvus_client.search_by_meta(meta, top_k=1)
-                if (
-                    results
-                    and hasattr(results[0], "outputs")
-                    and hasattr(results[0].outputs, "embedding")
-                ):
-                    embedding = results[0].outputs.embedding
-                else:
-                    continue
-            elif backend == "faiss" and hasattr(self, "faiss_client"):
-                embedding = self.faiss_client.get_embedding_by_meta(meta)
-                if embedding is None:
-                    continue
-            else:
+    def store_embeddings(
+        self,
+        batch_indices: List[int],
+        dataset: List[Dict[str, Any]],
+        embeddings: List[Optional[List[float]]],
+    ) -> None:
+        """
+        Insert the embeddings of a batch into Milvus and/or Faiss and record the vector id
+        of each row as embedding_id, so the similarity postprocess never looks rows up by meta.
+        With a reference index the batch is first compared against it, so the new vectors
+        are only inserted (when a store is enabled) after the comparison.
+        Rows whose embedding is None are skipped.
+        """
+        valid = [
+            (idx, emb) for idx, emb in zip(batch_indices, embeddings) if emb is not None
+        ]
+        if not valid:
+            return
+        row_indices = [idx for idx, _ in valid]
+        vectors = [emb for _, emb in valid]
+        if self.reference_client is not None:
+            self.compare_with_reference(row_indices, dataset, vectors)
+        metas = [str(dataset[idx].get(self.prompt_field, "")) for idx in row_indices]
+        vector_ids = {}
+        if self.milvus_store_embeddings and getattr(self, "milvus_client", None):
+            self.logger.info(f"Inserting {len(vectors)} prompt embeddings to Milvus...")
+            vector_ids["milvus"] = self.milvus_client.insert_embeddings(
+                vectors, metas, row_indices
+            )
+        if self.faiss_store_embeddings and getattr(self, "faiss_client", None):
+            self.logger.info(f"Inserting {len(vectors)} prompt embeddings to Faiss...")
+            vector_ids["faiss"] = self.faiss_client.insert_embeddings(
+                vectors, metas, row_indices
+            )
+        ids = vector_ids.get(self.similarity_backend)
+        if ids is not None:
+            for idx, vector_id in zip(row_indices, ids):
+                dataset[idx]["embedding_id"] = int(vector_id)
+
+    def embed_and_store(
+        self,
+        batch_indices: List[int],
+        dataset: List[Dict[str, Any]],
+        embed_fn: Callable[[List[str]], List[Optional[List[float]]]],
+    ) -> None:
+        """
+        Embed the prompts of a batch and store them.
+        embed_fn(texts) returns one embedding (or None on failure) per text. With an
+        embedding cache, cached prompts skip the model and duplicate prompts are embedded
+        once; new embeddings are added to the cache. With minhash_skip_duplicates, rows
+        that are lexical duplicates of an earlier row are not embedded at all.
+        """
+        if self.settings.minhash_enabled and self.settings.minhash_skip_duplicates:
+            representatives = [
+                idx
+                for idx in batch_indices
+                if dataset[idx].get("lexical_cluster_id", idx) == idx
+            ]
+            self.minhash_skipped += len(batch_indices) - len(representatives)
+            batch_indices = representatives
+            if not batch_indices:
+                return
+        texts = [dataset[idx][self.prompt_field] for idx in batch_indices]
+        if self.embedding_cache is None:
+            self.store_embeddings(batch_indices, dataset, embed_fn(texts))
+            return
+        embeddings = self.embedding_cache.get_many(texts)
+        missing = list(dict.fromkeys(t for t, e in zip(texts, embeddings) if e is None))
+        if missing:
+            computed = dict(zip(missing, embed_fn(missing)))
+            self.embedding_cache.put_many(missing, [computed[t] for t in missing])
+            embeddings = [
+                e if e is not None else computed[t] for t, e in zip(texts, embeddings)
+            ]
+        self.logger.info(
+            f"Embedding cache: {len(texts) - len(missing)} of {len(texts)} prompts reused, {len(missing)} embedded"
+        )
+        self.store_embeddings(batch_indices, dataset, embeddings)
+
+    def embedding_stores(self) -> Dict[str, Any]:
+        """Writable embedding stores of the run with sequential vector ids, by backend name."""
+        stores = {}
+        milvus_client = getattr(self, "milvus_client", None)
+        # Collections created with auto_id have no sequential ids to truncate to
+        if milvus_client is not None and not milvus_client.auto_id:
+            stores["milvus"] = milvus_client
+        if getattr(self, "faiss_client", None) is not None:
+            stores["faiss"] = self.faiss_client
+        return stores
+
+    def reconcile_embedding_stores(
+        self, dataset, checkpoint_idx: int, checkpoint_manager, logger
+    ) -> None:
+        """
+        Align the embedding stores with the dataset checkpoint. A killed run may have
+        stored vectors of rows after its last checkpoint; those rows are embedded again
+        on resume, so the stale copies are dropped instead of being found as neighbors
+        of their own row. The first vector id of the run is kept in the checkpoint
+        state (embedding_start_ids); every id above the highest embedding_id of the
+        checkpointed rows is removed.
+        """
+        stores = self.embedding_stores()
+        if not stores:
+            return
+        start_ids = checkpoint_manager.extra_state.get("embedding_start_ids")
+        if start_ids is None:
+            if checkpoint_idx:
+                logger.warning(
+                    "Checkpoint has no embedding_start_ids, vectors stored after it are kept"
+                )
+                return
+            # Persist the start ids before the first insert, a run killed before its
+            # first checkpoint is reconciled as well
+            start_ids = {name: store.next_id for name, store in stores.items()}
+            checkpoint_manager.save(dataset, 0, embedding_start_ids=start_ids)
+            return
+        backend_start = start_ids.get(self.similarity_backend, 0)
+        inserted = 0
+        for idx in range(checkpoint_idx):
+            vector_id = dataset[idx].get("embedding_id")
+            if vector_id is not None and vector_id >= backend_start:
+                inserted = max(inserted, vector_id + 1 - backend_start)
+        for name, store in stores.items():
+            if name not in start_ids:
                 continue
-            min_dist, repeat_count, min_similar_instruction = self.get_neighbor_info(
-                embedding=embedding, backend=backend, meta=meta
+            dropped = store.truncate(start_ids[name] + inserted)
+            if dropped:
+                logger.warning(
+                    f"Dropped {dropped} {name} vectors stored after the checkpoint at row {checkpoint_idx}."
+                )
+
+    def flush_embedding_stores(self) -> None:
+        """Persist buffered inserts before a checkpoint references their embedding_id."""
+        if getattr(self, "milvus_client", None) is not None:
+            self.milvus_client.flush()
+
+    def close_embedding_stores(self) -> None:
+        """Persist pending embedding inserts (e.g. the final Faiss snapshot)."""
+        if getattr(self, "milvus_client", None) is not None:
+            self.milvus_client.close()
+        if getattr(self, "faiss_client", None) is not None:
+            self.faiss_client.close()
+        if getattr(self, "embedding_cache", None) is not None:
+            self.embedding_cache.close()
+        if getattr(self, "reference_client", None) is not None:
+            self.reference_client.close()
+
+    @property
+    def embedding_model_name(self) -> str:
+        """Model identity the embedding cache is keyed by."""
+        return str(
+            getattr(self.settings, "vllm_model_path", None)
+            or getattr(self.settings, "api_model_name", "")
+        )
+
+    @property
+    def similarity_backend(self) -> str:
+        return "milvus" if self.milvus_store_embeddings else "faiss"
+
+    def open_faiss_client(self, read_only=False, mmap=False):
+        """Open the Faiss store described by the settings."""
+        from datatagger.utils.faiss_utils import FaissClient
+
+        settings = self.settings
+        return FaissClient(
+            index_file=self.faiss_index_file,
+            meta_file=self.faiss_meta_file,
+            dim=self.dimension,
+            snapshot_every=settings.faiss_snapshot_every,
+            index_factory=settings.faiss_index_factory,
+            train_size=settings.faiss_train_size,
+            nprobe=settings.faiss_nprobe,
+            ef_search=settings.faiss_ef_search,
+            storage=settings.faiss_storage,
+            reduce=settings.faiss_reduce,
+            read_only=read_only,
+            mmap=mmap,
+        )
+
+    @staticmethod
+    def get_embedding_ids(dataset):
+        """embedding_id of every row as an int64 array, -1 for rows without embedding."""
+        import numpy as np
+
+        return np.fromiter(
+            (
+                item.get("embedding_id") if item.get("embedding_id") is not None else -1
+                for item in dataset
+            ),
+            dtype="int64",
+            count=len(dataset),
+        )
+
+    def update_similarity_fields(
+        self, dataset, backend=None, field=None, checkpoint_manager=None
+    ):
+        """
+        Fill min_neighbor_distance, repeat_count and min_similar_instruction for every row
+        that has an embedding_id. Vectors are reconstructed in bulk and searched in blocks of
+        similarity_batch_size queries; progress is checkpointed as similarity_index, so an
+        interrupted postprocess resumes where it stopped.
+        field is kept for backward compatibility, rows are matched by embedding_id.
+        """
+        import numpy as np
+
+        if backend is None:
+            backend = self.similarity_backend
+        client = getattr(self, f"{backend}_client", None)
+        if client is None or not hasattr(client, "search_batch"):
+            self.logger.warning(
+                f"Backend {backend} does not support batched similarity search, skipping similarity fields"
+            )
+            return
+        if hasattr(client, "prepare_search"):
+            client.prepare_search()
+        if backend == "faiss" and self.settings.faiss_mmap:
+            # Snapshot the writer, then search the snapshot memory-mapped so the index
+            # pages come from the page cache instead of a private in-memory copy
+            client.close()
+            client = self.faiss_client = self.open_faiss_client(
+                read_only=True, mmap=True
             )
-            item["min_neighbor_distance"] = (
-                round(min_dist, 4) if min_dist is not None else None
+            self.logger.info(
+                f"Searching memory-mapped Faiss index {self.faiss_index_file}"
+            )
+        top_k = self.settings.similarity_top_k
+        threshold = self.settings.similarity_distance_threshold
+        block_size = self.settings.similarity_batch_size
+        vector_ids = self.get_embedding_ids(dataset)
+        rows = np.nonzero(vector_ids >= 0)[0]
+        resume_index = 0
+        if checkpoint_manager is not None:
+            resume_index = checkpoint_manager.extra_state.get("similarity_index", 0)
+        start = int(np.searchsorted(rows, resume_index))
+        if start:
+            self.logger.info(
+                f"Resuming similarity computation from row {resume_index}."
             )
-            item["repeat_count"] = repeat_count
-            item["min_similar_instruction"] = min_similar_instruction
+        # Checkpoint at about the same row granularity as the main loop
+        blocks_per_checkpoint = max(
+            1, self.checkpoint_every * self.batch_size // block_size
+        )
+        for block_num, block_start in enumerate(range(start, len(rows), block_size), 1):
+            block_rows = rows[block_start : block_start + block_size]
+            block_ids = vector_ids[block_rows]
+            queries = client.reconstruct_batch(block_ids)
+            distances, neighbors = client.search_batch(queries, top_k + 1)
+            self.write_neighbor_fields(
+                dataset,
+                block_rows,
+                client,
+                distances,
+                neighbors,
+                threshold,
+                exclude_ids=block_ids,
+                exclude_same_row=True,
+            )
+            done_index = int(block_rows[-1]) + 1
+            if (
+                checkpoint_manager is not None
+                and block_num % blocks_per_checkpoint == 0
+            ):
+                checkpoint_manager.save(
+                    dataset, len(dataset), similarity_index=done_index
+                )
+                self.logger.info(f"Similarity checkpoint saved at row {done_index}.")
+
+    @staticmethod
+    def write_neighbor_fields(
+        dataset,
+        rows,
+        client,
+        distances,
+        neighbors,
+        threshold,
+        exclude_ids=None,
+        exclude_same_row=False,
+    ):
+        """
+        Fill min_neighbor_distance, repeat_count and min_similar_instruction of rows from
+        a batched search result; exclude_ids[i] (the query itself) is skipped in row i.
+        With exclude_same_row, other stored copies of the query row (same row_key, e.g.
+        left by an interrupted run) are skipped as well.
+        """
+        import numpy as np
+
+        # Exclude each query itself and the padding of short result lists
+        valid = neighbors >= 0
+        if exclude_ids is not None:
+            valid &= neighbors != np.asarray(exclude_ids)[:, None]
+        if exclude_same_row and hasattr(client, "get_row_keys"):
+            row_keys = client.get_row_keys(np.where(valid, neighbors, 0).ravel())
+            valid &= row_keys.reshape(neighbors.shape) != np.asarray(rows)[:, None]
+        masked = np.where(valid, distances, np.inf)
+        nearest = masked.argmin(axis=1)
+        min_distances = masked[np.arange(len(rows)), nearest]
+        repeat_counts = (masked < threshold).sum(axis=1)
+        has_neighbor = np.isfinite(min_distances)
+        nearest_ids = neighbors[np.arange(len(rows)), nearest]
+        nearest_metas = client.get_metas([int(i) for i in nearest_ids[has_neighbor]])
+        metas_iter = iter(nearest_metas)
+        for row, min_dist, count, found in zip(
+            rows, min_distances, repeat_counts, has_neighbor
+        ):
+            item = dataset[row]
+            item["min_neighbor_distance"] = round(float(min_dist), 4) if found else None
+            item["repeat_count"] = int(count)
+            item["min_similar_instruction"] = next(metas_iter) if found else None
+
+    def compare_with_reference(
+        self,
+        row_indices: List[int],
+        dataset: List[Dict[str, Any]],
+        vectors: List[List[float]],
+    ) -> None:
+        """Search a batch against the read-only reference index and write neighbor fields."""
+        import numpy as np
+
+        distances, neighbors = self.reference_client.search_batch(
+            np.asarray(vectors, dtype="float32"), self.settings.similarity_top_k
+        )
+        self.write_neighbor_fields(
+            dataset,
+            row_indices,
+            self.reference_client,
+            distances,
+            neighbors,
+            self.settings.similarity_distance_threshold,
+        )
+
+    def update_lexical_clusters(self, dataset) -> None:
+        """
+        MinHash/LSH pre-filter run before embedding: fill lexical_cluster_id (the first
+        row of the cluster of lexical near-duplicates) for every row. It is recomputed
+        on resume, the clustering is deterministic.
+        """
+        from datatagger.utils.minhash_utils import lexical_clusters
+
+        settings = self.settings
+        labels, stats = lexical_clusters(
+            [item.get(self.prompt_field) for item in dataset],
+            threshold=settings.minhash_threshold,
+            num_perm=settings.minhash_num_perm,
+            bands=settings.minhash_bands,
+            ngram=settings.minhash_ngram,
+            workers=settings.minhash_workers,
+        )
+        for item, label in zip(dataset, labels.tolist()):
+            item["lexical_cluster_id"] = label
+        self.logger.info(
+            f"MinHash pre-filter: {stats['rows']} rows, {stats['clusters']} lexical clusters, "
+            f"{stats['duplicates']} near-duplicates ({stats['candidate_pairs']} LSH candidate pairs checked, {stats['linked_pairs']} similar)"
+            + (
+                f", {stats['duplicates'] / max(stats['rows'], 1):.1%} of embedding work avoidable"
+                if settings.minhash_skip_duplicates
+                else ""
+            )
+        )
+
+    def postprocess_embeddings(self, dataset, checkpoint_manager=None):
+        """
+        Postprocess of the EMBEDDING mission: neighbor fields within the run (already
+        written per batch against the reference index in query-only mode), then dedup.
+        """
+        if self.reference_client is None:
+            self.update_similarity_fields(
+                dataset=dataset,
+                field=self.prompt_field,
+                checkpoint_manager=checkpoint_manager,
+            )
+        if self.settings.dedup_enabled:
+            self.update_dedup_fields(dataset=dataset)
+        if self.settings.minhash_enabled and self.settings.minhash_skip_duplicates:
+            self.logger.info(
+                f"MinHash pre-filter skipped embedding {self.minhash_skipped} of {len(dataset)} rows "
+                f"({self.minhash_skipped / max(len(dataset), 1):.1%} of model work) in this run"
+            )
+
+    def update_dedup_fields(self, dataset, backend=None):
+        """
+        Cluster near-duplicate rows and fill dedup_cluster_id, cluster_size and keep.
+        Rows closer than dedup_distance_threshold are linked (range search, or a kNN of
+        dedup_max_neighbors where the index has none) block by block, and clusters are
+        the connected components of these links (union-find). dedup_cluster_id is the
+        first row of the cluster, keep marks the row chosen by dedup_keep_policy.
+        Neighbors stored by other datasets are ignored; rows without embedding_id get None.
+        """
+        import numpy as np
+
+        from datatagger.utils.dedup_utils import (
+            UnionFind,
+            keep_scores,
+            near_duplicate_pairs,
+            select_representatives,
+        )
+
+        if backend is None:
+            backend = self.similarity_backend
+        client = getattr(self, f"{backend}_client", None)
+        if client is None or not hasattr(client, "search_batch"):
+            self.logger.warning(
+                f"Backend {backend} does not support batched search, skipping deduplication"
+            )
+            return
+        if hasattr(client, "prepare_search"):
+            client.prepare_search()
+        settings = self.settings
+        # Score first so an unsupported policy fails before the expensive search
+        vector_ids = self.get_embedding_ids(dataset)
+        rows = np.nonzero(vector_ids >= 0)[0]
+        scores = keep_scores(
+            [dataset[row] for row in rows],
+            settings.dedup_keep_policy,
+            self.prompt_field,
+        )
+        ids = vector_ids[rows]
+        id_order = np.argsort(ids)
+        sorted_ids = ids[id_order]
+        union_find = UnionFind(len(rows))
+        block_size = settings.similarity_batch_size
+        num_links = 0
+        for block_start in range(0, len(rows), block_size):
+            block_ids = ids[block_start : block_start + block_size]
+            positions, neighbors = near_duplicate_pairs(
+                client,
+                client.reconstruct_batch(block_ids),
+                settings.dedup_distance_threshold,
+                settings.dedup_max_neighbors,
+            )
+            # Vector ids -> positions in rows, dropping vectors of other datasets
+            found = np.searchsorted(sorted_ids, neighbors)
+            found[found == len(sorted_ids)] = 0
+            in_dataset = sorted_ids[found] == neighbors
+            queries = block_start + positions[in_dataset]
+            matches = id_order[found[in_dataset]]
+            distinct = queries != matches
+            union_find.union_many(queries[distinct], matches[distinct])
+            num_links += int(distinct.sum())
+            self.logger.debug(
+                f"Deduplication searched rows {block_start}-{block_start + len(block_ids) - 1}"
+            )
+        labels = union_find.labels()
+        sizes = np.bincount(labels, minlength=len(rows))
+        keep = select_representatives(labels, scores)
+        for row, label, k in zip(rows.tolist(), labels.tolist(), keep.tolist()):
+            item = dataset[row]
+            item["dedup_cluster_id"] = int(rows[label])
+            item["cluster_size"] = int(sizes[label])
+            item["keep"] = k
+        num_clusters = int((sizes > 0).sum())
+        self.logger.info(
+            f"Deduplication: {len(rows)} rows, {num_links} near-duplicate links, "
+            f"{num_clusters} clusters, {len(rows) - num_clusters} rows marked keep=False "
+            f"(policy: {settings.dedup_keep_policy})."
+        )
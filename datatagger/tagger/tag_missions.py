@@ -1,8 +1,10 @@
-from typing import Any, Dict, List
+import hashlib
+from typing import Any, Dict, List, Optional
 
 import json_repair
 
 from datatagger.settings.base_tagger_setting import BaseTaggerSettings, TagMission
+from datatagger.utils.file_utils import json_loads
 from datatagger.utils.prompt_utils import (
     combined_quality_rating,
     input_classification,
@@ -11,6 +13,14 @@ from datatagger.utils.prompt_utils import (
 )
 
 
+class NoResponseError(Exception):
+    """The model gave no response for a row, e.g. all API retries failed."""
+
+
+class InvalidResponseError(ValueError):
+    """The model response is not a JSON object, even after repair."""
+
+
 class TagMissionProcessor:
     SAFETY_LABEL_MAPPING = {
         "S1": "Violent Crimes",
@@ -29,6 +39,29 @@ class TagMissionProcessor:
         "S14": "Code Interpreter Abuse",
         "safe": "Safe",
     }
+    # Column types of the output fields in typed outputs (Parquet), see file_utils.FIELD_TYPES
+    OUTPUT_FIELD_TYPES = {
+        "input_quality": "float",
+        "response_quality": "float",
+        "input_quality_explanation": "string",
+        "response_quality_explanation": "string",
+        "intent": "string",
+        "knowledge": "string",
+        "difficulty": "float",
+        "task_category": "category",
+        "other_task_category": "list<string>",
+        "safety": "category",
+        "instruct_reward": "float",
+        "language": "category",
+        "embedding_id": "int",
+        "min_neighbor_distance": "float",
+        "repeat_count": "int",
+        "min_similar_instruction": "string",
+        "dedup_cluster_id": "int",
+        "cluster_size": "int",
+        "keep": "bool",
+        "lexical_cluster_id": "int",
+    }
 
     def __init__(self, mission: TagMission, settings: BaseTaggerSettings):
         self.mission = mission
@@ -50,20 +83,34 @@ class TagMissionProcessor:
         else:
             raise ValueError(f"Unsupported mission: {self.mission}")
 
-    def process_response(self, response_text: str, item: Dict[str, Any]) -> None:
-        """Process the response and update the item."""
+    def process_response(
+        self, response_text: Optional[str], item: Dict[str, Any]
+    ) -> Optional[str]:
+        """
+        Process the response and update the item. Returns the error class name when the
+        response could not be used (the fields are then set to None), MissingFields when
+        it lacks required output fields (see has_output), else None.
+        """
         try:
+            if response_text is None:
+                raise NoResponseError("No response received")
             if self.mission == TagMission.SAFETY:
                 item["safety"] = self.SAFETY_LABEL_MAPPING.get(
                     response_text.strip(), None
                 )
-                return
+                return None if self.has_output(item) else "MissingFields"
             elif self.mission == TagMission.EMBEDDING:
                 # For embedding mission, we don't need to process response
                 # as embeddings are already added in process_batch
-                return
+                return None
 
-            response_json = json_repair.loads(response_text)
+            try:
+                response_json = json_loads(response_text)
+            except ValueError:
+                # Model output is often almost-JSON (fences, trailing commas)
+                response_json = json_repair.loads(response_text)
+            if not isinstance(response_json, dict):
+                raise InvalidResponseError(f"Not a JSON object: {response_text[:100]}")
 
             if self.mission == TagMission.QUALITY:
                 item["input_quality"] = response_json.get("input_quality", None)
@@ -87,6 +134,8 @@ class TagMissionProcessor:
                 item["language"] = response_json.get("language", None)
         except Exception as e:
             self._handle_error(item, e)
+            return type(e).__name__
+        return None if self.has_output(item) else "MissingFields"
 
     def _handle_error(self, item: Dict[str, Any], error: Exception) -> None:
         """Handle errors by setting default values."""
@@ -113,6 +162,17 @@ class TagMissionProcessor:
             # item[f"{self.output_field}_embedding"] = None
             pass
 
+    def get_input_fields(self) -> List[str]:
+        """Get the input fields the mission reads from a row."""
+        fields = [self.settings.prompt_field, self.settings.output_field]
+        if (
+            self.mission == TagMission.EMBEDDING
+            and self.settings.dedup_enabled
+            and self.settings.dedup_keep_policy == "input_quality"
+        ):
+            fields.append("input_quality")
+        return fields
+
     def get_output_fields(self) -> List[str]:
         """Get the output fields for the mission."""
         if self.mission == TagMission.QUALITY:
@@ -133,11 +193,67 @@ class TagMissionProcessor:
         elif self.mission == TagMission.LANGUAGE:
             return ["language"]
         elif self.mission == TagMission.EMBEDDING:
-            # return [f"{self.prompt_field}_embedding", f"{self.output_field}_embedding"]
-            pass
+            fields = [
+                "embedding_id",
+                "min_neighbor_distance",
+                "repeat_count",
+                "min_similar_instruction",
+            ]
+            if self.settings.dedup_enabled:
+                fields += ["dedup_cluster_id", "cluster_size", "keep"]
+            if self.settings.minhash_enabled:
+                fields.append("lexical_cluster_id")
+            return fields
         else:
             raise ValueError(f"Unsupported mission: {self.mission}")
 
+    def get_fields(self) -> List[str]:
+        """Get all fields the mission writes: its output fields plus the prompt hash if stored."""
+        fields = self.get_output_fields()
+        if self.settings.incremental and self.settings.incremental_prompt_hash:
+            fields.append(self.get_prompt_hash_field())
+        return fields
+
+    def get_prompt_hash_field(self) -> str:
+        """Get the field storing the prompt hash of incremental runs."""
+        return f"{self.get_name()}_prompt_hash"
+
+    def get_prompt_hash(self, item: Dict[str, Any]) -> str:
+        """Hash of the row's prompt and output text, to notice rows edited since tagging."""
+        text = f"{item.get(self.settings.prompt_field)}\0{item.get(self.settings.output_field)}"
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+    def get_required_fields(self, item: Dict[str, Any]) -> List[str]:
+        """Get the output fields a successfully tagged row has non-null values for."""
+        fields = self.get_output_fields()
+        if self.mission == TagMission.QUALITY and not item.get(
+            self.settings.output_field
+        ):
+            # Prompts without a response are only rated as inputs
+            fields = [field for field in fields if not field.startswith("response_")]
+        return fields
+
+    def has_output(self, item: Dict[str, Any]) -> bool:
+        """Whether the row has non-null values for all required output fields."""
+        return all(
+            item.get(field) is not None for field in self.get_required_fields(item)
+        )
+
+    def is_tagged(self, item: Dict[str, Any]) -> bool:
+        """Whether the row already has non-null values for its required output fields (and a matching prompt hash)."""
+        if not self.has_output(item):
+            return False
+        if self.settings.incremental_prompt_hash:
+            return item.get(self.get_prompt_hash_field()) == self.get_prompt_hash(item)
+        return True
+
+    def get_output_field_types(self) -> Dict[str, str]:
+        """Column type of every field the mission writes (prompt hashes are strings)."""
+        return {
+            field: self.OUTPUT_FIELD_TYPES.get(field, "string")
+            for field in self.get_fields()
+        }
+
     def get_name(self) -> str:
         """Get the name of the mission."""
         return self.mission.name.lower()
@@ -0,0 +1,425 @@
+import json
+import queue
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+from datatagger.settings.base_tagger_setting import TagMission
+from datatagger.settings.tagger_settings_server import TaggerServerSettings
+from datatagger.utils.file_utils import json_dumps, json_loads
+from datatagger.utils.logger import setup_logger
+
+ProcessBatchFn = Callable[[List[int], List[Dict[str, Any]]], None]
+
+
+class BatcherMetrics:
+    """
+    Thread-safe counters and latency samples of one micro-batcher.
+    Latencies are kept in a bounded window so percentiles reflect recent traffic.
+    """
+
+    def __init__(self, window: int = 10000):
+        self._lock = threading.Lock()
+        self.requests_total = 0
+        self.items_total = 0
+        self.batches_total = 0
+        self.errors_total = 0
+        self.max_batch_size_seen = 0
+        self._queue_wait_ms = deque(maxlen=window)
+        self._batch_ms = deque(maxlen=window)
+        self._latency_ms = deque(maxlen=window)
+
+    def record_batch(
+        self, batch_size: int, queue_waits_ms: List[float], batch_ms: float
+    ):
+        with self._lock:
+            self.batches_total += 1
+            self.items_total += batch_size
+            self.max_batch_size_seen = max(self.max_batch_size_seen, batch_size)
+            self._queue_wait_ms.extend(queue_waits_ms)
+            self._batch_ms.append(batch_ms)
+
+    def record_request(self, latency_ms: float, failed: bool = False):
+        with self._lock:
+            self.requests_total += 1
+            if failed:
+                self.errors_total += 1
+            self._latency_ms.append(latency_ms)
+
+    @staticmethod
+    def _percentiles(samples) -> Dict[str, Optional[float]]:
+        if not samples:
+            return {"p50": None, "p95": None, "p99": None, "max": None}
+        ordered = sorted(samples)
+        last = len(ordered) - 1
+        return {
+            "p50": round(ordered[int(last * 0.50)], 3),
+            "p95": round(ordered[int(last * 0.95)], 3),
+            "p99": round(ordered[int(last * 0.99)], 3),
+            "max": round(ordered[last], 3),
+        }
+
+    def snapshot(self, queue_depth: int) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "queue_depth": queue_depth,
+                "requests_total": self.requests_total,
+                "items_total": self.items_total,
+                "batches_total": self.batches_total,
+                "errors_total": self.errors_total,
+                "avg_batch_size": round(self.items_total / self.batches_total, 3)
+                if self.batches_total
+                else None,
+                "max_batch_size_seen": self.max_batch_size_seen,
+                "queue_wait_ms": self._percentiles(self._queue_wait_ms),
+                "batch_ms": self._percentiles(self._batch_ms),
+                "request_latency_ms": self._percentiles(self._latency_ms),
+            }
+
+
+class _PendingItem:
+    __slots__ = ("item", "enqueued_at", "done", "error")
+
+    def __init__(self, item: Dict[str, Any]):
+        self.item = item
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.error: Optional[Exception] = None
+
+
+class MicroBatcher:
+    """
+    Coalesce items submitted by concurrent requests into micro-batches.
+    A batch is dispatched once it holds max_batch_size items or the oldest item has
+    waited max_wait_ms, whichever comes first. Batches run through
+    process_batch_fn(batch_indices, dataset), the same contract as the offline loop.
+    """
+
+    def __init__(
+        self,
+        process_batch_fn: ProcessBatchFn,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 10.0,
+        engine_lock: Optional[threading.Lock] = None,
+        metrics_window: int = 10000,
+        logger=None,
+    ):
+        self.process_batch_fn = process_batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        # Missions served from one model share the lock, the engine is not thread-safe
+        self.engine_lock = engine_lock or threading.Lock()
+        self.metrics = BatcherMetrics(window=metrics_window)
+        self.logger = logger
+        self._queue: "queue.Queue[_PendingItem]" = queue.Queue()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> "MicroBatcher":
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stopped.set()
+        self._thread.join(timeout)
+
+    def submit(
+        self, items: List[Dict[str, Any]], timeout: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """Queue the items of one request and block until all of them are tagged."""
+        start = time.perf_counter()
+        pending = [_PendingItem(item) for item in items]
+        for p in pending:
+            self._queue.put(p)
+        deadline = None if timeout is None else start + timeout
+        error = None
+        for p in pending:
+            remaining = (
+                None if deadline is None else max(0.0, deadline - time.perf_counter())
+            )
+            if not p.done.wait(remaining):
+                error = TimeoutError(f"Request not served within {timeout} seconds")
+                break
+            if p.error is not None:
+                error = p.error
+                break
+        self.metrics.record_request(
+            (time.perf_counter() - start) * 1000, failed=error is not None
+        )
+        if error is not None:
+            raise error
+        return [p.item for p in pending]
+
+    def _collect_batch(self) -> List[_PendingItem]:
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    # Deadline passed: only take what is already queued
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            batch = self._collect_batch()
+            if not batch:
+                continue
+            started = time.perf_counter()
+            dataset = [p.item for p in batch]
+            try:
+                with self.engine_lock:
+                    self.process_batch_fn(list(range(len(dataset))), dataset)
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"Micro-batch of {len(batch)} items failed: {e}")
+                for p in batch:
+                    p.error = e
+            finished = time.perf_counter()
+            self.metrics.record_batch(
+                len(batch),
+                [(started - p.enqueued_at) * 1000 for p in batch],
+                (finished - started) * 1000,
+            )
+            for p in batch:
+                p.done.set()
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+
+class _TaggerHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Bursts of concurrent clients are the point of micro-batching, keep the backlog deep
+    request_queue_size = 1024
+
+
+class TaggerServer:
+    """
+    HTTP front-end exposing one micro-batched endpoint per mission:
+      POST /tag/<mission>   body: {"items": [{...}, ...]} or a single item object
+      GET  /metrics         latency and queue metrics per mission
+      GET  /health
+    process_batch_fns maps mission names to process_batch_fn callables, so any
+    engine (vLLM, or a fake one on CPU) can be served.
+    """
+
+    def __init__(
+        self,
+        process_batch_fns: Dict[str, ProcessBatchFn],
+        host: str = "0.0.0.0",
+        port: int = 8000,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 10.0,
+        request_timeout: float = 300.0,
+        metrics_window: int = 10000,
+        logger=None,
+    ):
+        self.logger = logger
+        self.request_timeout = request_timeout
+        engine_lock = threading.Lock()
+        self.batchers = {
+            name: MicroBatcher(
+                process_batch_fn=fn,
+                max_batch_size=max_batch_size,
+                max_wait_ms=max_wait_ms,
+                engine_lock=engine_lock,
+                metrics_window=metrics_window,
+                logger=logger,
+            )
+            for name, fn in process_batch_fns.items()
+        }
+        self.httpd = _TaggerHTTPServer((host, port), self._make_handler())
+
+    @property
+    def address(self):
+        return self.httpd.server_address
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            name: batcher.metrics.snapshot(batcher.queue_depth())
+            for name, batcher in self.batchers.items()
+        }
+
+    def start(self) -> "TaggerServer":
+        """Start batchers and serve HTTP in a background thread."""
+        for batcher in self.batchers.values():
+            batcher.start()
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def serve_forever(self) -> None:
+        for batcher in self.batchers.values():
+            batcher.start()
+        if self.logger:
+            host, port = self.address[:2]
+            self.logger.info(
+                f"Tagging server listening on http://{host}:{port}, missions: {list(self.batchers)}"
+            )
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.shutdown()
+
+    def shutdown(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        for batcher in self.batchers.values():
+            batcher.stop(timeout=1.0)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+                body = json_dumps(payload)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                path = urlsplit(self.path).path
+                if path == "/health":
+                    self._send_json(
+                        200, {"status": "ok", "missions": list(server.batchers)}
+                    )
+                elif path == "/metrics":
+                    self._send_json(200, server.metrics())
+                else:
+                    self._send_json(404, {"error": f"Unknown path: {path}"})
+
+            def do_POST(self):
+                # Route on the path alone, a query string does not change the endpoint
+                path = urlsplit(self.path).path
+                prefix = "/tag/"
+                mission = path[len(prefix) :].strip("/").lower()
+                if not path.startswith(prefix) or mission not in server.batchers:
+                    self._send_json(
+                        404,
+                        {
+                            "error": f"Unknown endpoint: {path}, served missions: {list(server.batchers)}"
+                        },
+                    )
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    payload = json_loads(self.rfile.read(length) or b"{}")
+                except (ValueError, json.JSONDecodeError) as e:
+                    self._send_json(400, {"error": f"Invalid JSON body: {e}"})
+                    return
+                single = isinstance(payload, dict) and "items" not in payload
+                items = [payload] if single else payload.get("items", [])
+                if not isinstance(items, list) or not all(
+                    isinstance(i, dict) for i in items
+                ):
+                    self._send_json(400, {"error": "'items' must be a list of objects"})
+                    return
+                try:
+                    results = server.batchers[mission].submit(
+                        items, timeout=server.request_timeout
+                    )
+                except TimeoutError as e:
+                    self._send_json(504, {"error": str(e)})
+                    return
+                except Exception as e:
+                    self._send_json(500, {"error": str(e)})
+                    return
+                if single:
+                    self._send_json(200, {"mission": mission, "item": results[0]})
+                else:
+                    self._send_json(200, {"mission": mission, "items": results})
+
+            def log_message(self, format, *args):
+                if server.logger:
+                    server.logger.debug(format % args)
+
+        return Handler
+
+
+def _model_kind(mission: TagMission) -> Optional[str]:
+    """Missions with the same kind can be served from one loaded model."""
+    if mission == TagMission.LANGUAGE:
+        return None
+    if mission in (TagMission.REWARD, TagMission.SAFETY, TagMission.EMBEDDING):
+        return mission.name.lower()
+    return "generate"
+
+
+def resolve_serve_missions(settings: TaggerServerSettings) -> List[TagMission]:
+    """The missions to serve: serve_missions by name, else tag_mission."""
+    if not settings.serve_missions:
+        return [settings.tag_mission]
+    unknown = [
+        name
+        for name in settings.serve_missions
+        if name.upper() not in TagMission.__members__
+    ]
+    if unknown:
+        raise ValueError(
+            f"Unknown serve_missions {unknown}, choose from {list(TagMission.__members__)}"
+        )
+    return [TagMission[name.upper()] for name in settings.serve_missions]
+
+
+def build_process_batch_fns(
+    settings: TaggerServerSettings,
+) -> Dict[str, ProcessBatchFn]:
+    """Load the model once via get_llm and bind it to every served mission."""
+    missions = resolve_serve_missions(settings)
+
+    from datatagger.tagger.unified_tagger_vllm import UnifiedTaggerVLLM
+
+    kinds = {_model_kind(m) for m in missions} - {None}
+    if len(kinds) > 1:
+        raise ValueError(
+            f"Missions {[m.name for m in missions]} need different models, run one server per model"
+        )
+    taggers = [
+        UnifiedTaggerVLLM(settings.model_copy(update={"tag_mission": m}))
+        for m in missions
+    ]
+    llm, params, tokenizer = None, None, None
+    for tagger in taggers:
+        if _model_kind(tagger.mission) is not None:
+            llm, params, tokenizer = tagger.get_llm()
+            break
+    return {
+        tagger.tag_mission: tagger.get_process_batch_fn(llm, params, tokenizer)
+        for tagger in taggers
+    }
+
+
+def main():
+    settings = TaggerServerSettings()
+    logger = setup_logger(
+        project_name="tagger_server", console_log_level=settings.log_level
+    )
+    server = TaggerServer(
+        process_batch_fns=build_process_batch_fns(settings),
+        host=settings.host,
+        port=settings.port,
+        max_batch_size=settings.max_batch_size,
+        max_wait_ms=settings.max_wait_ms,
+        request_timeout=settings.request_timeout,
+        metrics_window=settings.metrics_window,
+        logger=logger,
+    )
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
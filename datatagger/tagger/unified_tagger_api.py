@@ -7,7 +7,6 @@ from datatagger.utils.api_utils import (
     get_completion_with_retry,
     get_embedding_with_retry,
 )
-from datatagger.utils.file_utils import load_dataset_from_file
 
 
 class UnifiedTaggerAPI(BaseUnifiedTagger):
@@ -35,22 +34,6 @@ class UnifiedTaggerAPI(BaseUnifiedTagger):
             "Content-Type": "application/json",
         }
 
-        # Dynamically import and initialize milvus_client (if needed)
-        self.faiss_client = getattr(self, "faiss_client", None)
-        self.milvus_client = None
-        if getattr(self, "milvus_store_embeddings", False) or getattr(
-            settings, "milvus_store_embeddings", False
-        ):
-            try:
-                from datatagger.utils.milvus_utils import MilvusClient
-
-                self.milvus_client = MilvusClient()
-            except ImportError:
-                self.logger.error(
-                    "Milvus related dependencies are not installed, please install them or disable milvus_store_embeddings."
-                )
-                raise
-
     def get_api_url(self, endpoint: str) -> str:
         base_url = self.api_base_url.rstrip("/")
         endpoint_map = {
@@ -60,6 +43,39 @@ class UnifiedTaggerAPI(BaseUnifiedTagger):
         endpoint_path = endpoint_map.get(endpoint, f"/v1/{endpoint.lstrip('/')}")
         return f"{base_url}{endpoint_path}"
 
+    def embed_with_api(self, prompt_texts: List[str]) -> List[Optional[List[float]]]:
+        """Embed texts concurrently through the embeddings endpoint, None on failure."""
+        import concurrent.futures
+
+        api_url = self.get_api_url("embeddings")
+        prompt_embeddings = [None] * len(prompt_texts)
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            future_to_idx = {
+                executor.submit(
+                    get_embedding_with_retry,
+                    text,
+                    api_url,
+                    self.api_headers,
+                    self.api_model_name,
+                ): i
+                for i, text in enumerate(prompt_texts)
+            }
+            for future in concurrent.futures.as_completed(future_to_idx):
+                i = future_to_idx[future]
+                try:
+                    embedding = future.result()
+                    if embedding is not None:
+                        prompt_embeddings[i] = embedding
+                    else:
+                        self.logger.error(
+                            f"Invalid embedding response for prompt: {prompt_texts[i]}"
+                        )
+                except Exception as e:
+                    self.logger.error(
+                        f"Exception in prompt embedding for index {i}: {e}"
+                    )
+        return prompt_embeddings
+
     def process_batch_with_api(
         self, batch_indices: List[int], dataset: List[Dict[str, Any]]
     ) -> None:
@@ -67,69 +83,21 @@ class UnifiedTaggerAPI(BaseUnifiedTagger):
             f"Processing batch with API for indices: {batch_indices} for mission: {self.mission}"
         )
         if self.mission == TagMission.EMBEDDING:
-            import concurrent.futures
-
-            prompt_texts = [dataset[idx][self.prompt_field] for idx in batch_indices]
-            api_url = self.get_api_url("embeddings")
-            prompt_embeddings = [None] * len(prompt_texts)
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                future_to_idx = {
-                    executor.submit(
-                        get_embedding_with_retry,
-                        text,
-                        api_url,
-                        self.api_headers,
-                        self.api_model_name,
-                    ): i
-                    for i, text in enumerate(prompt_texts)
-                }
-                for future in concurrent.futures.as_completed(future_to_idx):
-                    i = future_to_idx[future]
-                    try:
-                        embedding = future.result()
-                        if embedding is not None:
-                            prompt_embeddings[i] = embedding
-                        else:
-                            self.logger.error(
-                                f"Invalid embedding response for prompt: {prompt_texts[i]}"
-                            )
-                    except Exception as e:
-                        self.logger.error(
-                            f"Exception in prompt embedding for index {i}: {e}"
-                        )
-            if (self.faiss_store_embeddings and self.faiss_client) or (
-                self.milvus_store_embeddings and self.milvus_client
-            ):
-                prompt_metas = [
-                    str(dataset[idx].get(self.prompt_field, ""))
-                    for idx in batch_indices
-                ]
-                if self.milvus_store_embeddings and self.milvus_client:
-                    self.logger.info(
-                        f"Inserting {len(prompt_embeddings)} prompt embeddings to Milvus..."
-                    )
-                    self.milvus_client.insert_embeddings(
-                        prompt_embeddings, prompt_metas
-                    )
-                if self.faiss_store_embeddings and self.faiss_client:
-                    self.logger.info(
-                        f"Inserting {len(prompt_embeddings)} prompt embeddings to Faiss..."
-                    )
-                    self.faiss_client.insert_embeddings(prompt_embeddings, prompt_metas)
-                return
+            self.embed_and_store(batch_indices, dataset, self.embed_with_api)
+            return
         # Multi-threaded API response acquisition
         import concurrent.futures
 
         with concurrent.futures.ThreadPoolExecutor() as executor:
-            future_to_item = {
+            future_to_idx = {
                 executor.submit(
                     get_completion_with_retry,
                     [
                         {
                             "role": "user",
                             "content": self.mission_processor.get_prompt(
-                                item[self.prompt_field],
-                                item.get(self.output_field)
+                                dataset[idx][self.prompt_field],
+                                dataset[idx].get(self.output_field)
                                 if self.mission == TagMission.QUALITY
                                 else None,
                             ),
@@ -139,20 +107,25 @@ class UnifiedTaggerAPI(BaseUnifiedTagger):
                     self.api_params,
                     self.get_api_url("chat/completions"),
                     self.api_headers,
-                ): (idx, item)
-                for idx, item in enumerate(dataset)
-                if idx in batch_indices
+                ): idx
+                for idx in batch_indices
             }
-            for future in concurrent.futures.as_completed(future_to_item):
-                idx, item = future_to_item[future]
+            for future in concurrent.futures.as_completed(future_to_idx):
+                idx = future_to_idx[future]
                 try:
                     api_response = future.result()
-                    api_response = "{" + api_response + "}"
-                    self.mission_processor.process_response(api_response, dataset[idx])
+                    if api_response is not None:
+                        api_response = "{" + api_response + "}"
+                    error = self.mission_processor.process_response(
+                        api_response, dataset[idx]
+                    )
                 except Exception as e:
+                    error = type(e).__name__
                     self.logger.error(
                         f"Error processing API response for index {idx}: {e}"
                     )
+                if error is not None:
+                    self.record_row_error(idx, error)
 
     def generate_and_update(
         self, dataset: Optional[List[Dict[str, Any]]] = None
@@ -165,7 +138,7 @@ class UnifiedTaggerAPI(BaseUnifiedTagger):
             )
         )
         if dataset is None:
-            dataset = load_dataset_from_file(self.settings.input_file)
+            dataset = self.load_input_dataset()
             if self.debug:
                 self.logger.warning(
                     "Debug mode enabled. Only processing the first 100 samples."
@@ -179,14 +152,15 @@ class UnifiedTaggerAPI(BaseUnifiedTagger):
                     logger=self.logger,
                     dataset=dataset,
                     prompt_field=self.prompt_field,
+                    languages=self.settings.language_detector_languages,
                     batch_indices=batch_indices,
                 )
             else:
                 self.process_batch_with_api(batch_indices, dataset)
 
-        def postprocess_fn(dataset):
+        def postprocess_fn(dataset, checkpoint_manager):
             if self.mission == TagMission.EMBEDDING:
-                self.update_similarity_fields(dataset=dataset, field=self.prompt_field)
+                self.postprocess_embeddings(dataset, checkpoint_manager)
 
         self.generate_and_update_with_checkpoint(
             dataset=dataset,
@@ -205,7 +179,11 @@ class UnifiedTaggerAPI(BaseUnifiedTagger):
         return TaggerSettingsAPI()
 
 
-if __name__ == "__main__":
+def main():
     settings = TaggerSettingsAPI()
     tagger = UnifiedTaggerAPI(settings)
     tagger.generate_and_update()
+
+
+if __name__ == "__main__":
+    main()
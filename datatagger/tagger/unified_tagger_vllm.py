@@ -1,12 +1,12 @@
-from typing import Any, Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
 
 from datatagger.settings.base_tagger_setting import TagMission
 from datatagger.settings.tagger_settings_vllm import TaggerSettingsVLLM
 from datatagger.tagger.base_tagger import BaseUnifiedTagger
-from datatagger.utils.file_utils import load_dataset_from_file
-from lingua import LanguageDetectorBuilder
-from transformers import AutoTokenizer
-from vllm import LLM, PoolingParams, SamplingParams
+
+if TYPE_CHECKING:
+    # vllm and transformers take seconds to import, they are loaded in get_llm
+    from vllm import LLM
 
 
 class UnifiedTaggerVLLM(BaseUnifiedTagger):
@@ -20,43 +20,13 @@ class UnifiedTaggerVLLM(BaseUnifiedTagger):
         self.max_model_len = settings.max_model_len
         self.tensor_parallel_size = settings.tensor_parallel_size
         self.gpu_memory_utilization = settings.gpu_memory_utilization
-        # Initialize language detector if mission is LANGUAGE
-        if self.mission == TagMission.LANGUAGE:
-            self.logger.info("Building language detector from all languages")
-            self.detector = LanguageDetectorBuilder.from_all_languages().build()
-            self.logger.info("Language detector built successfully")
-
-        if settings.input_file:
-            _, self.checkpoint_data_file, self.checkpoint_state_file = (
-                self.get_output_files(
-                    settings=settings,
-                    tag_mission=self.tag_mission,
-                    input_file=settings.input_file,
-                )
-            )
-        else:
-            self.checkpoint_data_file = None
-            self.checkpoint_state_file = None
-
-        # Dynamically import and initialize milvus_client (if needed)
-        self.faiss_client = getattr(self, "faiss_client", None)
-        self.milvus_client = None
-        if getattr(self, "milvus_store_embeddings", False) or getattr(
-            settings, "milvus_store_embeddings", False
-        ):
-            try:
-                from datatagger.utils.milvus_utils import MilvusClient
 
-                self.milvus_client = MilvusClient()
-            except ImportError:
-                self.logger.error(
-                    "Milvus related dependencies are not installed, please install them or disable milvus_store_embeddings."
-                )
-                raise
-
-    def get_llm(self) -> Tuple[Optional[LLM], Optional[Any], Optional[Any]]:
+    def get_llm(self) -> Tuple[Optional["LLM"], Optional[Any], Optional[Any]]:
         if self.mission == TagMission.LANGUAGE:
             return None, None, None
+        from transformers import AutoTokenizer
+        from vllm import LLM, PoolingParams, SamplingParams
+
         if self.mission == TagMission.REWARD:
             self.logger.info(
                 f"Loading reward model from {self.settings.vllm_model_path}"
@@ -167,7 +137,7 @@ class UnifiedTaggerVLLM(BaseUnifiedTagger):
         self,
         batch_indices: List[int],
         dataset: List[Dict[str, Any]],
-        llm: Optional[LLM] = None,
+        llm: Optional["LLM"] = None,
         params: Optional[Any] = None,
         tokenizer: Optional[Any] = None,
     ) -> None:
@@ -176,25 +146,11 @@ class UnifiedTaggerVLLM(BaseUnifiedTagger):
         )
 
         if self.mission == TagMission.EMBEDDING:
-            prompt_texts = [dataset[idx][self.prompt_field] for idx in batch_indices]
-            prompt_embeddings = llm.embed(prompt_texts)
-            prompt_emb_list = []
-            prompt_metas = []
-            for output, idx in zip(prompt_embeddings, batch_indices):
-                embedding = output.outputs.embedding
-                prompt_emb_list.append(embedding)
-                prompt_metas.append(str(dataset[idx].get(self.prompt_field, "")))
-            # Directly insert into faiss or milvus
-            if self.milvus_store_embeddings and self.milvus_client:
-                self.logger.info(
-                    f"Inserting {len(prompt_emb_list)} prompt embeddings to Milvus..."
-                )
-                self.milvus_client.insert_embeddings(prompt_emb_list, prompt_metas)
-            if self.faiss_store_embeddings and self.faiss_client:
-                self.logger.info(
-                    f"Inserting {len(prompt_emb_list)} prompt embeddings to Faiss..."
-                )
-                self.faiss_client.insert_embeddings(prompt_emb_list, prompt_metas)
+
+            def embed_fn(texts):
+                return [output.outputs.embedding for output in llm.embed(texts)]
+
+            self.embed_and_store(batch_indices, dataset, embed_fn)
             return
         prompts = []
         for idx in batch_indices:
@@ -233,7 +189,9 @@ class UnifiedTaggerVLLM(BaseUnifiedTagger):
                 and self.mission != TagMission.EMBEDDING
             ):
                 response = "{" + response
-            self.mission_processor.process_response(response, dataset[idx])
+            error = self.mission_processor.process_response(response, dataset[idx])
+            if error is not None:
+                self.record_row_error(idx, error)
 
     def process_batch_with_reward_model(
         self,
@@ -268,25 +226,19 @@ class UnifiedTaggerVLLM(BaseUnifiedTagger):
                     f"Failed to process item: {dataset[idx]} with error: {str(e)}"
                 )
                 dataset[idx]["instruct_reward"] = None
+                self.record_row_error(idx, type(e).__name__)
 
-    def generate_and_update(
-        self, dataset: Optional[List[Dict[str, Any]]] = None
-    ) -> None:
-        output_file, checkpoint_data_file, checkpoint_state_file = (
-            self.get_output_files(
-                settings=self.settings,
-                tag_mission=self.tag_mission,
-                input_file=self.settings.input_file,
-            )
-        )
-        if dataset is None:
-            dataset = load_dataset_from_file(self.settings.input_file)
-            if self.debug:
-                self.logger.warning(
-                    "Debug mode enabled. Only processing the first 100 samples."
-                )
-                dataset = dataset[:100]
-        llm, params, tokenizer = self.get_llm()
+    def get_process_batch_fn(
+        self,
+        llm: Optional["LLM"] = None,
+        params: Optional[Any] = None,
+        tokenizer: Optional[Any] = None,
+    ) -> Callable[[List[int], List[Dict[str, Any]]], None]:
+        """
+        Bind the loaded model to the batch function of the current mission.
+        The returned process_batch_fn(batch_indices, dataset) is shared by the
+        offline checkpoint loop and the online tagging server.
+        """
 
         def process_batch_fn(batch_indices, dataset):
             if self.mission == TagMission.LANGUAGE:
@@ -296,6 +248,7 @@ class UnifiedTaggerVLLM(BaseUnifiedTagger):
                     batch_indices=batch_indices,
                     dataset=dataset,
                     prompt_field=self.prompt_field,
+                    languages=self.settings.language_detector_languages,
                 )
             elif self.mission == TagMission.REWARD:
                 self.process_batch_with_reward_model(
@@ -313,9 +266,31 @@ class UnifiedTaggerVLLM(BaseUnifiedTagger):
                     tokenizer=tokenizer,
                 )
 
-        def postprocess_fn(dataset):
+        return process_batch_fn
+
+    def generate_and_update(
+        self, dataset: Optional[List[Dict[str, Any]]] = None
+    ) -> None:
+        output_file, checkpoint_data_file, checkpoint_state_file = (
+            self.get_output_files(
+                settings=self.settings,
+                tag_mission=self.tag_mission,
+                input_file=self.settings.input_file,
+            )
+        )
+        if dataset is None:
+            dataset = self.load_input_dataset()
+            if self.debug:
+                self.logger.warning(
+                    "Debug mode enabled. Only processing the first 100 samples."
+                )
+                dataset = dataset[:100]
+        llm, params, tokenizer = self.get_llm()
+        process_batch_fn = self.get_process_batch_fn(llm, params, tokenizer)
+
+        def postprocess_fn(dataset, checkpoint_manager):
             if self.mission == TagMission.EMBEDDING:
-                self.update_similarity_fields(dataset=dataset, field=self.prompt_field)
+                self.postprocess_embeddings(dataset, checkpoint_manager)
 
         self.generate_and_update_with_checkpoint(
             dataset=dataset,
@@ -334,7 +309,11 @@ class UnifiedTaggerVLLM(BaseUnifiedTagger):
         return TaggerSettingsVLLM()
 
 
-if __name__ == "__main__":
+def main():
     settings = TaggerSettingsVLLM()
     tagger = UnifiedTaggerVLLM(settings)
     tagger.generate_and_update()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import os
+import sys
+
+from datatagger.settings.cache_compact_setting import CacheCompactSettings
+from datatagger.utils.embedding_cache import EmbeddingCache
+from datatagger.utils.file_utils import load_dataset_from_file
+
+
+def _cache_size_mb(cache: EmbeddingCache) -> float:
+    return (
+        sum(os.path.getsize(p) for p in (cache.vectors_file, cache.index_file))
+        / 1024
+        / 1024
+    )
+
+
+def main():
+    settings = CacheCompactSettings()
+    cache = EmbeddingCache(settings.embedding_cache_dir, model=settings.model)
+    entries, size_mb = len(cache), _cache_size_mb(cache)
+    keep_texts = None
+    if settings.keep_files:
+        keep_texts = [
+            item[settings.prompt_field]
+            for file in settings.keep_files
+            for item in load_dataset_from_file(file)
+            if isinstance(item.get(settings.prompt_field), str)
+        ]
+        print(
+            f"📄 Keeping prompts of {len(keep_texts)} rows from {len(settings.keep_files)} file(s)"
+        )
+    try:
+        kept = cache.compact(keep_texts=keep_texts, dtype=settings.dtype)
+    except ValueError as e:
+        cache.close()
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(1)
+    print(
+        f"✅ Compacted {settings.embedding_cache_dir} ({cache.dtype.name}): "
+        f"{entries} -> {kept} entries, {size_mb:.1f} MB -> {_cache_size_mb(cache):.1f} MB"
+    )
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
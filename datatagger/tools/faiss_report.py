@@ -0,0 +1,86 @@
+import numpy as np
+
+from datatagger.settings.faiss_report_setting import FaissReportSettings
+from datatagger.utils.faiss_utils import (
+    FaissClient,
+    evaluate_reduction,
+    evaluate_search_params,
+)
+
+
+def main():
+    settings = FaissReportSettings()
+    if not settings.index_factory and not settings.reduce_values:
+        print("❌ Nothing to evaluate, pass --index_factory and/or --reduce_values")
+        return
+    if settings.vectors_file:
+        vectors = np.load(settings.vectors_file, mmap_mode="r")
+        rng = np.random.default_rng(0)
+        ids = rng.choice(
+            len(vectors), min(settings.sample_size, len(vectors)), replace=False
+        )
+        vectors = np.asarray(vectors[np.sort(ids)], dtype="float32")
+    else:
+        client = FaissClient(
+            index_file=settings.faiss_index_file,
+            meta_file=settings.faiss_meta_file,
+            dim=settings.dimension,
+            read_only=True,
+            mmap=True,
+        )
+        vectors = client.sample_vectors(settings.sample_size)
+    if settings.index_factory:
+        print_search_report(settings, vectors)
+    if settings.reduce_values:
+        print_reduction_report(settings, vectors)
+
+
+def print_search_report(settings: FaissReportSettings, vectors: np.ndarray):
+    print(
+        f"📊 Evaluating '{settings.index_factory}' on {len(vectors)} vectors "
+        f"(dim {vectors.shape[1]}, {settings.num_queries} queries, recall@{settings.top_k})"
+    )
+    report = evaluate_search_params(
+        vectors=vectors,
+        index_factory=settings.index_factory,
+        nprobe_values=settings.nprobe_values,
+        ef_search_values=settings.ef_search_values,
+        top_k=settings.top_k,
+        num_queries=settings.num_queries,
+    )
+    print(f"{'index':<24}{'param':<16}{'recall':>8}{'latency(ms)':>14}")
+    for row in report:
+        if "skipped" in row:
+            print(f"{row['index']:<24}{row['param']:<16}  ⚠️ skipped: {row['skipped']}")
+            continue
+        print(
+            f"{row['index']:<24}{row['param'] or '-':<16}"
+            f"{row['recall']:>8.4f}{row['latency_ms']:>14.4f}"
+        )
+    build_s = [row["build_s"] for row in report if "build_s" in row]
+    if build_s:
+        print(f"  - Train + add time: {build_s[0]:.2f}s")
+
+
+def print_reduction_report(settings: FaissReportSettings, vectors: np.ndarray):
+    print(
+        f"📉 Neighbor overlap@{settings.top_k} of reduced vectors against dim {vectors.shape[1]} "
+        f"on {len(vectors)} vectors ({settings.num_queries} queries)"
+    )
+    report = evaluate_reduction(
+        vectors=vectors,
+        reduce_values=settings.reduce_values,
+        top_k=settings.top_k,
+        num_queries=settings.num_queries,
+    )
+    print(f"{'reduce':<16}{'dim':>8}{'bytes':>10}{'overlap':>10}{'train(s)':>10}")
+    for row in report:
+        train_s = f"{row['build_s']:.2f}" if "build_s" in row else "-"
+        print(
+            f"{row['reduce']:<16}{row['dim']:>8}{row['bytes']:>10}"
+            f"{row['overlap']:>10.4f}{train_s:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import time
+from itertools import cycle, islice
+from typing import Any, Callable, Dict, List
+
+from datatagger.settings.json_bench_setting import JsonBenchSettings
+from datatagger.utils.file_utils import (
+    JSON_BACKEND,
+    JSON_BACKENDS,
+    load_dataset_from_file,
+    load_json_codec,
+)
+
+
+def sample_rows() -> Dict[str, List[Dict[str, Any]]]:
+    """Typical row shapes: a raw alpaca row, a row after several tag missions, a multi-turn conversation."""
+    raw = {
+        "instruction": "请解释一下快速排序的时间复杂度，并给出 Python 实现。" * 3,
+        "input": "",
+        "output": "快速排序的平均时间复杂度为 O(n log n)。def quicksort(a): ..." * 10,
+    }
+    tagged = {
+        **raw,
+        "id": "3f2a9c1d",
+        "input_quality": 4,
+        "input_quality_explanation": "The query is clear and specific. " * 4,
+        "difficulty": 2.5,
+        "intent": "The user wants to understand quicksort.",
+        "knowledge": "Sorting algorithms, complexity analysis",
+        "task_category": "Coding & Debugging",
+        "other_task_category": ["Information seeking", "Reasoning"],
+        "language": "zh",
+        "safety": "Safe",
+        "instruct_reward": 3.75,
+        "embedding_id": 123456,
+        "min_neighbor_distance": 0.1834,
+        "repeat_count": 0,
+    }
+    conversation = {
+        "id": "9b1e0f7a",
+        "system": "You are a helpful assistant.",
+        "conversations": [
+            {"from": "human" if i % 2 == 0 else "gpt", "value": f"Turn {i}. " * 60}
+            for i in range(8)
+        ],
+    }
+    return {"raw": [raw], "tagged": [tagged], "conversation": [conversation]}
+
+
+def best_time(fn: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    settings = JsonBenchSettings()
+    if settings.input_file:
+        shapes = {
+            settings.input_file: load_dataset_from_file(settings.input_file)[
+                : settings.rows
+            ]
+        }
+    else:
+        shapes = sample_rows()
+    codecs = {}
+    for backend in settings.backends or JSON_BACKENDS:
+        try:
+            codecs[backend] = load_json_codec(backend)
+        except ImportError:
+            print(f"  - {backend} is not installed, skipped")
+    print(
+        f"📊 JSON backend in use: {JSON_BACKEND}, "
+        f"{settings.rows} rows per round, best of {settings.repeat}"
+    )
+    print(
+        f"{'rows':<16}{'backend':<10}{'bytes/row':>10}{'encode(us)':>12}{'decode(us)':>12}{'speedup':>9}"
+    )
+    for shape, rows in shapes.items():
+        rows = list(islice(cycle(rows), settings.rows))
+        results = {}
+        for backend, (dumps, loads, _) in codecs.items():
+            encoded = [dumps(row) for row in rows]
+            results[backend] = (
+                sum(map(len, encoded)) / len(rows),
+                best_time(
+                    lambda dumps=dumps, rows=rows: [dumps(row) for row in rows],
+                    settings.repeat,
+                ),
+                best_time(
+                    lambda loads=loads, encoded=encoded: [loads(b) for b in encoded],
+                    settings.repeat,
+                ),
+            )
+        baseline = sum(results["json"][1:]) if "json" in results else None
+        for backend, (size, encode, decode) in results.items():
+            speedup = f"{baseline / (encode + decode):.1f}x" if baseline else "-"
+            print(
+                f"{shape[-15:]:<16}{backend:<10}{size:>10.0f}"
+                f"{encode / len(rows) * 1e6:>12.2f}{decode / len(rows) * 1e6:>12.2f}{speedup:>9}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import os
+from itertools import chain
+from typing import Any, Dict, Iterator, List, Optional
+
+from datatagger.settings.sidecar_join_setting import SidecarJoinSettings
+from datatagger.tagger.tag_missions import TagMissionProcessor
+from datatagger.utils.file_utils import (
+    ROW_INDEX_FIELD,
+    dataset_ext,
+    iter_dataset_rows,
+    open_dataset_writer,
+    split_compression,
+)
+from tqdm import tqdm
+
+
+class _Sidecar:
+    """Sidecar rows read alongside the dataset; rows past its end get no tags."""
+
+    def __init__(self, file_path: str, key_field: str):
+        self.file_path = file_path
+        self.key_field = key_field
+        self.joined = 0
+        rows = iter_dataset_rows(file_path)
+        first = next(rows, None)
+        self.fields = [name for name in first or {} if name != key_field]
+        self._rows: Optional[Iterator[Dict[str, Any]]] = (
+            chain([first], rows) if first is not None else None
+        )
+
+    def next_tags(self, key: Any) -> Optional[Dict[str, Any]]:
+        if self._rows is None:
+            return None
+        tags = next(self._rows, None)
+        if tags is None:
+            self._rows = None
+            return None
+        tag_key = tags.pop(self.key_field, None)
+        if tag_key != key:
+            raise ValueError(
+                f"{self.file_path}: found {self.key_field}={tag_key!r} where the input has "
+                f"{key!r}, sidecars must be tagged from the same input in the same order"
+            )
+        self.joined += 1
+        return tags
+
+
+def join_rows(
+    rows: Iterator[Dict[str, Any]],
+    sidecars: List[_Sidecar],
+    row_key_field: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Merge the tags of every sidecar into the dataset rows, one row at a time."""
+    for idx, row in enumerate(rows):
+        key = row.get(row_key_field) if row_key_field else idx
+        for sidecar in sidecars:
+            tags = sidecar.next_tags(key)
+            if tags is not None:
+                row.update(tags)
+        yield row
+
+
+def main():
+    settings = SidecarJoinSettings()
+    key_field = settings.row_key_field or ROW_INDEX_FIELD
+    sidecars = [_Sidecar(file, key_field) for file in settings.sidecar_files]
+    field_types = {
+        field: TagMissionProcessor.OUTPUT_FIELD_TYPES[field]
+        for sidecar in sidecars
+        for field in sidecar.fields
+        if field in TagMissionProcessor.OUTPUT_FIELD_TYPES
+    }
+    output_path = settings.output_file
+    # The joined file only appears under its name once complete
+    temp_path = f"{output_path}.tmp"
+    with (
+        open_dataset_writer(
+            temp_path,
+            dataset_ext(output_path),
+            compact=settings.compact,
+            field_types=field_types,
+            compression=split_compression(output_path)[1],
+        ) as writer,
+        tqdm(desc="Joining rows", unit="rows") as pbar,
+    ):
+        for row in join_rows(
+            iter_dataset_rows(settings.input_file), sidecars, settings.row_key_field
+        ):
+            writer.write(row)
+            pbar.update()
+    os.replace(temp_path, output_path)
+    for sidecar in sidecars:
+        print(
+            f"  - {sidecar.file_path}: {sidecar.joined} rows, fields {sidecar.fields}"
+        )
+    print(f"✅ Joined {writer.count} rows into '{output_path}'")
+
+
+if __name__ == "__main__":
+    main()
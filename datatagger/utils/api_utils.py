@@ -3,6 +3,8 @@ from typing import Any, Dict, List
 
 import requests
 
+from datatagger.utils.file_utils import json_loads
+
 
 # Function to make a single API request with exponential back-off
 def get_completion_with_retry(
@@ -19,7 +21,7 @@ def get_completion_with_retry(
         try:
             response = requests.post(api_endpoint, json=payload, headers=api_headers)
             response.raise_for_status()  # Raises an HTTPError for bad responses
-            return response.json()["choices"][0]["message"]["content"]
+            return json_loads(response.content)["choices"][0]["message"]["content"]
         except requests.RequestException as e:
             print(f"Attempt {attempt + 1} failed: {str(e)}")
             sleep(2**attempt)  # Exponential back-off
@@ -45,7 +47,7 @@ def get_embedding_with_retry(
         try:
             response = requests.post(api_endpoint, json=payload, headers=api_headers)
             response.raise_for_status()
-            data = response.json()
+            data = json_loads(response.content)
             if (
                 "data" in data
                 and len(data["data"]) > 0
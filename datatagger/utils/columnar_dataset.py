@@ -0,0 +1,320 @@
+from array import array
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Union
+
+import numpy as np
+
+from datatagger.utils.file_utils import parse_bool
+
+# Per-row state of a column: field absent from the row, present as null, present with a value
+MISSING, NULL, SET = 0, 1, 2
+_MISSING = object()
+# NumPy dtype of the typed tag columns (see TagMissionProcessor.OUTPUT_FIELD_TYPES),
+# "category" columns hold int32 codes into a dictionary of strings
+_TYPED_DTYPES = {
+    "float": "float64",
+    "int": "int64",
+    "bool": "bool",
+    "category": "int32",
+}
+
+
+class _ObjectColumn:
+    """Any Python values (nested lists/dicts, free text tags), _MISSING where a row lacks the field."""
+
+    def __init__(self, values: List[Any]):
+        self.values = values
+
+    def get(self, idx: int) -> Any:
+        return self.values[idx]
+
+    def set(self, idx: int, value: Any):
+        self.values[idx] = value
+
+    def take(self, rows: slice) -> "_ObjectColumn":
+        return _ObjectColumn(self.values[rows])
+
+
+class _TextColumn:
+    """
+    Read-only strings packed in one UTF-8 buffer with offsets, as in an Arrow string
+    array, so a row costs 9 bytes plus its text instead of a Python str object.
+    """
+
+    def __init__(self, data: bytes, offsets: np.ndarray, state: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+        self.state = state
+
+    def get(self, idx: int) -> Any:
+        state = self.state[idx]
+        if state == SET:
+            return self.data[self.offsets[idx] : self.offsets[idx + 1]].decode("utf-8")
+        return None if state == NULL else _MISSING
+
+    def take(self, rows: slice) -> "_TextColumn":
+        offsets = self.offsets[rows.start : rows.stop + 1]
+        return _TextColumn(
+            self.data[offsets[0] : offsets[-1]],
+            offsets - offsets[0],
+            self.state[rows].copy(),
+        )
+
+    def to_object(self) -> _ObjectColumn:
+        return _ObjectColumn([self.get(idx) for idx in range(len(self.state))])
+
+
+class _TextColumnBuilder:
+    def __init__(self, num_rows: int = 0):
+        self.data = bytearray()
+        self.offsets = array("q", [0] * (num_rows + 1))
+        self.state = bytearray(num_rows)
+
+    def append(self, value: Any):
+        if value is _MISSING or value is None:
+            self.state.append(MISSING if value is _MISSING else NULL)
+        else:
+            self.data += value.encode("utf-8")
+            self.state.append(SET)
+        self.offsets.append(len(self.data))
+
+    def build(self) -> _TextColumn:
+        return _TextColumn(
+            bytes(self.data),
+            np.frombuffer(self.offsets, dtype="int64"),
+            np.frombuffer(self.state, dtype="int8").copy(),
+        )
+
+    def to_values(self) -> List[Any]:
+        return self.build().to_object().values
+
+
+class _TypedColumn:
+    """
+    Preallocated tag column: scores, ids and flags in a NumPy array, categories as
+    int32 codes into a dictionary. Values that do not convert are stored as null.
+    """
+
+    def __init__(self, field_type: str, num_rows: int):
+        self.field_type = field_type
+        self.values = np.zeros(num_rows, dtype=_TYPED_DTYPES[field_type])
+        self.state = np.zeros(num_rows, dtype="int8")
+        self.categories: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def get(self, idx: int) -> Any:
+        state = self.state[idx]
+        if state != SET:
+            return None if state == NULL else _MISSING
+        if self.field_type == "category":
+            return self.categories[self.values[idx]]
+        return self.values[idx].item()
+
+    def set(self, idx: int, value: Any):
+        if value is _MISSING:
+            self.state[idx] = MISSING
+            return
+        try:
+            if value is None:
+                raise TypeError
+            if self.field_type == "category":
+                value = str(value)
+                code = self._codes.get(value)
+                if code is None:
+                    code = self._codes[value] = len(self.categories)
+                    self.categories.append(value)
+                self.values[idx] = code
+            elif self.field_type == "bool":
+                value = parse_bool(value)
+                if value is None:
+                    raise ValueError
+                self.values[idx] = value
+            else:
+                self.values[idx] = value
+        except (TypeError, ValueError, OverflowError):
+            self.state[idx] = NULL
+            return
+        self.state[idx] = SET
+
+    def take(self, rows: slice) -> "_TypedColumn":
+        column = _TypedColumn(self.field_type, 0)
+        column.values = self.values[rows].copy()
+        column.state = self.state[rows].copy()
+        column.categories = list(self.categories)
+        column._codes = dict(self._codes)
+        return column
+
+
+Column = Union[_ObjectColumn, _TextColumn, _TypedColumn]
+
+
+class RowView(MutableMapping):
+    """Dict-like view of one row of a ColumnarDataset, reads and writes go to the columns."""
+
+    __slots__ = ("_dataset", "_idx")
+
+    def __init__(self, dataset: "ColumnarDataset", idx: int):
+        self._dataset = dataset
+        self._idx = idx
+
+    def __getitem__(self, key: str) -> Any:
+        column = self._dataset.columns.get(key)
+        value = column.get(self._idx) if column is not None else _MISSING
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any):
+        self._dataset.set_value(self._idx, key, value)
+
+    def __delitem__(self, key: str):
+        if key not in self:
+            raise KeyError(key)
+        self._dataset.set_value(self._idx, key, _MISSING)
+
+    def __contains__(self, key: object) -> bool:
+        column = self._dataset.columns.get(key)
+        return column is not None and column.get(self._idx) is not _MISSING
+
+    def __iter__(self) -> Iterator[str]:
+        idx = self._idx
+        for name, column in self._dataset.columns.items():
+            if column.get(idx) is not _MISSING:
+                yield name
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        idx, row = self._idx, {}
+        for name, column in self._dataset.columns.items():
+            value = column.get(idx)
+            if value is not _MISSING:
+                row[name] = value
+        return row
+
+    def __repr__(self) -> str:
+        return f"RowView({self.to_dict()!r})"
+
+
+class ColumnarDataset:
+    """
+    Column-oriented dataset for the tagging loop. Text fields are packed read-only
+    buffers, the tag fields of `field_types` preallocated typed columns, other fields
+    plain lists. Indexing returns a RowView, so code written against List[Dict]
+    (process_batch_fn(batch_indices, dataset), process_response) works unchanged.
+    """
+
+    def __init__(
+        self,
+        columns: Dict[str, Column],
+        num_rows: int,
+        field_types: Optional[Dict[str, str]] = None,
+    ):
+        self.columns = columns
+        self.num_rows = num_rows
+        self.field_types = field_types or {}
+
+    @classmethod
+    def from_rows(
+        cls,
+        rows: Iterable[Mapping[str, Any]],
+        field_types: Optional[Dict[str, str]] = None,
+    ) -> "ColumnarDataset":
+        """
+        Build the columns in one pass over rows (e.g. streamed from a file). A field
+        stays a text column while every value is a string or null.
+        """
+        field_types = {
+            name: field_type
+            for name, field_type in (field_types or {}).items()
+            if field_type in _TYPED_DTYPES
+        }
+        builders: Dict[str, Union[_TextColumnBuilder, List[Any]]] = {}
+        typed_values: Dict[str, List[Any]] = {name: [] for name in field_types}
+        num_rows = 0
+        for row in rows:
+            for name, value in row.items():
+                if name in typed_values:
+                    continue
+                builder = builders.get(name)
+                if builder is None:
+                    builder = builders[name] = _TextColumnBuilder(num_rows)
+                if isinstance(builder, _TextColumnBuilder):
+                    if value is None or isinstance(value, str):
+                        continue
+                    builder = builders[name] = builder.to_values()
+            for name, builder in builders.items():
+                builder.append(row.get(name, _MISSING))
+            for name, values in typed_values.items():
+                values.append(row.get(name, _MISSING))
+            num_rows += 1
+        columns: Dict[str, Column] = {}
+        for name, builder in builders.items():
+            if isinstance(builder, _TextColumnBuilder):
+                columns[name] = builder.build()
+            else:
+                columns[name] = _ObjectColumn(builder)
+        for name, values in typed_values.items():
+            column = _TypedColumn(field_types[name], num_rows)
+            for idx, value in enumerate(values):
+                column.set(idx, value)
+            columns[name] = column
+        return cls(columns, num_rows, field_types)
+
+    def set_value(self, idx: int, key: str, value: Any):
+        column = self.columns.get(key)
+        if column is None:
+            if value is _MISSING:
+                return
+            field_type = self.field_types.get(key)
+            if field_type in _TYPED_DTYPES:
+                column = _TypedColumn(field_type, self.num_rows)
+            else:
+                column = _ObjectColumn([_MISSING] * self.num_rows)
+            self.columns[key] = column
+        elif isinstance(column, _TextColumn):
+            # Input text is read-only, a field written to becomes a plain list
+            column = self.columns[key] = column.to_object()
+        column.set(idx, value)
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+    def __getitem__(self, idx: Union[int, slice]) -> Union[RowView, "ColumnarDataset"]:
+        if isinstance(idx, slice):
+            rows = slice(*idx.indices(self.num_rows)[:2])
+            columns = {name: column.take(rows) for name, column in self.columns.items()}
+            return ColumnarDataset(
+                columns, max(0, rows.stop - rows.start), self.field_types
+            )
+        if idx < 0:
+            idx += self.num_rows
+        if not 0 <= idx < self.num_rows:
+            raise IndexError("dataset index out of range")
+        return RowView(self, idx)
+
+    def __setitem__(
+        self,
+        idx: Union[int, slice],
+        rows: Union[Mapping[str, Any], Iterable[Mapping[str, Any]]],
+    ):
+        """Replace whole rows, e.g. dataset[:n] = rows loaded from a checkpoint."""
+        if isinstance(idx, slice):
+            for row_idx, row in zip(range(*idx.indices(self.num_rows)), rows):
+                self[row_idx] = row
+            return
+        row = dict(rows)
+        for name in list(self.columns):
+            self.set_value(idx, name, row.pop(name, _MISSING))
+        for name, value in row.items():
+            self.set_value(idx, name, value)
+
+    def __iter__(self) -> Iterator[RowView]:
+        for idx in range(self.num_rows):
+            yield RowView(self, idx)
+
+    def iter_dicts(self) -> Iterator[Dict[str, Any]]:
+        """Rows as plain dicts, built one at a time."""
+        for idx in range(self.num_rows):
+            yield RowView(self, idx).to_dict()
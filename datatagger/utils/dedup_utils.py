@@ -0,0 +1,99 @@
+from array import array
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+KEEP_POLICIES = ("first", "shortest", "longest", "input_quality")
+
+
+class UnionFind:
+    """Disjoint sets over 0..n-1; the root of every set is its smallest element."""
+
+    def __init__(self, n: int):
+        # array("q") keeps 8 bytes per element and returns plain ints on access
+        self.parent = array("q", range(n))
+
+    def find(self, x: int) -> int:
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union_many(self, a: np.ndarray, b: np.ndarray) -> None:
+        find, parent = self.find, self.parent
+        for x, y in zip(a.tolist(), b.tolist()):
+            rx, ry = find(x), find(y)
+            if rx < ry:
+                parent[ry] = rx
+            elif ry < rx:
+                parent[rx] = ry
+
+    def labels(self) -> np.ndarray:
+        """Root of every element, computed by vectorized pointer jumping."""
+        labels = np.frombuffer(self.parent, dtype="int64").copy()
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                return labels
+            labels = jumped
+
+
+def near_duplicate_pairs(
+    client, queries: np.ndarray, radius: float, max_neighbors: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return (query positions, neighbor vector ids) of all pairs closer than radius.
+    Uses the client's range search when the index supports it, otherwise a kNN
+    search of max_neighbors filtered by the radius.
+    """
+    if hasattr(client, "range_search_batch"):
+        try:
+            lims, _, neighbors = client.range_search_batch(queries, radius)
+            counts = np.diff(lims.astype("int64"))
+            positions = np.repeat(np.arange(len(queries)), counts)
+            return positions, neighbors
+        except RuntimeError:
+            pass
+    distances, neighbors = client.search_batch(queries, max_neighbors)
+    positions, columns = np.nonzero((neighbors >= 0) & (distances < radius))
+    return positions, neighbors[positions, columns]
+
+
+def keep_scores(
+    items: List[Dict[str, Any]], policy: str, prompt_field: str
+) -> np.ndarray:
+    """Score of every item under a keep policy, the highest score of a cluster is kept."""
+    if policy == "first":
+        return np.zeros(len(items))
+    if policy in ("shortest", "longest"):
+        lengths = np.fromiter(
+            (len(str(item.get(prompt_field) or "")) for item in items),
+            dtype="float64",
+            count=len(items),
+        )
+        return -lengths if policy == "shortest" else lengths
+    if policy == "input_quality":
+
+        def quality(item):
+            try:
+                return float(item.get("input_quality"))
+            except (TypeError, ValueError):
+                return -np.inf
+
+        return np.fromiter(
+            (quality(item) for item in items), dtype="float64", count=len(items)
+        )
+    raise ValueError(
+        f"Unsupported dedup keep policy: {policy}, choose from {KEEP_POLICIES}"
+    )
+
+
+def select_representatives(labels: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    """Keep flag per element: the best-scoring element of each cluster, ties go to the first."""
+    order = np.lexsort((np.arange(len(labels)), -scores, labels))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = labels[order[1:]] != labels[order[:-1]]
+    keep = np.zeros(len(labels), dtype=bool)
+    keep[order[first]] = True
+    return keep
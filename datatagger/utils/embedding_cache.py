@@ -0,0 +1,224 @@
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+# One index record per cached vector: key hash and byte offset in vectors.bin
+INDEX_DTYPE = np.dtype([("key", "<i8"), ("offset", "<i8")])
+CACHE_DTYPES = ("float32", "float16")
+
+
+def cache_key(model: str, text: str) -> int:
+    """Signed 64-bit hash of (model, text); vectors of different models never mix."""
+    digest = hashlib.blake2b(f"{model}\0{text}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache keyed by a hash of the model and the text.
+
+    `cache_dir` holds `vectors.bin` (raw float32/float16 rows, memory-mapped for
+    reads), `index.bin` (key, byte offset) records and `cache.json` (dim, dtype).
+    Entries are only appended; open() drops records torn by a crash and
+    compact() rewrites the files without duplicate or unwanted entries.
+    A cache directory is meant to be written by one process at a time.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        dim: Optional[int] = None,
+        model: str = "",
+        dtype: str = "float32",
+    ):
+        """dim may be omitted to open an existing cache with its stored dimension."""
+        if dtype not in CACHE_DTYPES:
+            raise ValueError(
+                f"Unsupported cache dtype: {dtype}, choose from {CACHE_DTYPES}"
+            )
+        self.cache_dir = cache_dir
+        self.model = model
+        self.vectors_file = os.path.join(cache_dir, "vectors.bin")
+        self.index_file = os.path.join(cache_dir, "index.bin")
+        self.info_file = os.path.join(cache_dir, "cache.json")
+        if dim is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+        if os.path.exists(self.info_file):
+            with open(self.info_file, "r", encoding="utf-8") as f:
+                info = json.load(f)
+            if dim is None:
+                dim = info["dim"]
+            if info["dim"] != dim:
+                raise ValueError(
+                    f"Embedding cache {cache_dir} holds dim {info['dim']} vectors, expected {dim}"
+                )
+            dtype = info["dtype"]
+        elif dim is None:
+            raise FileNotFoundError(f"Embedding cache not found: {self.info_file}")
+        else:
+            with open(self.info_file, "w", encoding="utf-8") as f:
+                json.dump({"dim": dim, "dtype": dtype}, f)
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.row_bytes = self.dim * self.dtype.itemsize
+        self._load()
+
+    def _load(self):
+        for path in (self.vectors_file, self.index_file):
+            if not os.path.exists(path):
+                open(path, "wb").close()
+        count = os.path.getsize(self.index_file) // INDEX_DTYPE.itemsize
+        records = np.fromfile(self.index_file, dtype=INDEX_DTYPE, count=count)
+        # Vectors are written before their records, drop records past the vector file
+        records = records[
+            records["offset"] + self.row_bytes <= os.path.getsize(self.vectors_file)
+        ]
+        with open(self.index_file, "r+b") as f:
+            f.truncate(len(records) * INDEX_DTYPE.itemsize)
+        self._vectors_size = (
+            int(records["offset"].max()) + self.row_bytes if len(records) else 0
+        )
+        with open(self.vectors_file, "r+b") as f:
+            f.truncate(self._vectors_size)
+        # Sorted keys for lookups, the last copy of a key wins
+        order = np.argsort(records["key"], kind="stable")[::-1]
+        keys, first = np.unique(records["key"][order], return_index=True)
+        self._keys = keys
+        self._offsets = records["offset"][order][first]
+        self._new: Dict[int, int] = {}
+        self._map = None
+        self._vectors_out = open(self.vectors_file, "ab")
+        self._index_out = open(self.index_file, "ab")
+
+    def __len__(self) -> int:
+        return len(self._keys) + len(self._new)
+
+    def _offset_of(self, key: int) -> Optional[int]:
+        if key in self._new:
+            return self._new[key]
+        pos = np.searchsorted(self._keys, key)
+        if pos < len(self._keys) and self._keys[pos] == key:
+            return int(self._offsets[pos])
+        return None
+
+    def _vectors_view(self) -> np.ndarray:
+        if self._map is None or len(self._map) * self.row_bytes < self._vectors_size:
+            self._vectors_out.flush()
+            self._map = np.memmap(
+                self.vectors_file,
+                dtype=self.dtype,
+                mode="r",
+                shape=(self._vectors_size // self.row_bytes, self.dim),
+            )
+        return self._map
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Cached embedding of every text, None for misses."""
+        offsets = [self._offset_of(cache_key(self.model, text)) for text in texts]
+        if all(offset is None for offset in offsets):
+            return [None] * len(texts)
+        view = self._vectors_view()
+        return [
+            view[offset // self.row_bytes].astype("float32").tolist()
+            if offset is not None
+            else None
+            for offset in offsets
+        ]
+
+    def put_many(
+        self, texts: Sequence[str], embeddings: Sequence[Optional[List[float]]]
+    ):
+        """Append the embeddings of texts that are not cached yet (None is skipped)."""
+        new_keys, rows, seen = [], [], set()
+        for text, embedding in zip(texts, embeddings):
+            if embedding is None:
+                continue
+            key = cache_key(self.model, text)
+            if key in seen or self._offset_of(key) is not None:
+                continue
+            seen.add(key)
+            new_keys.append(key)
+            rows.append(embedding)
+        if not rows:
+            return
+        vectors = np.asarray(rows, dtype=self.dtype).reshape(len(rows), self.dim)
+        records = np.empty(len(rows), dtype=INDEX_DTYPE)
+        records["key"] = new_keys
+        records["offset"] = self._vectors_size + np.arange(len(rows)) * self.row_bytes
+        self._vectors_out.write(vectors.tobytes())
+        self._vectors_out.flush()
+        self._index_out.write(records.tobytes())
+        self._index_out.flush()
+        for key, offset in zip(new_keys, records["offset"].tolist()):
+            self._new[key] = offset
+        self._vectors_size += len(rows) * self.row_bytes
+
+    def close(self):
+        for f in (self._vectors_out, self._index_out):
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+        self._map = None
+
+    def compact(
+        self, keep_texts: Optional[Iterable[str]] = None, dtype: Optional[str] = None
+    ) -> int:
+        """
+        Rewrite the cache with one copy per key.
+        :param keep_texts: only keep the entries of these texts (with this cache's model);
+            raises ValueError when none of the entries match
+        :param dtype: convert the stored vectors (float32/float16)
+        :return: number of entries kept
+        """
+        if dtype is not None and dtype not in CACHE_DTYPES:
+            raise ValueError(
+                f"Unsupported cache dtype: {dtype}, choose from {CACHE_DTYPES}"
+            )
+        keys = np.concatenate(
+            [self._keys, np.fromiter(self._new, dtype="int64", count=len(self._new))]
+        )
+        offsets = np.concatenate(
+            [
+                self._offsets,
+                np.fromiter(self._new.values(), dtype="int64", count=len(self._new)),
+            ]
+        )
+        if keep_texts is not None:
+            wanted = np.unique(
+                np.fromiter(
+                    (cache_key(self.model, text) for text in keep_texts), dtype="int64"
+                )
+            )
+            selected = np.isin(keys, wanted)
+            if len(keys) and not selected.any():
+                raise ValueError(
+                    f"None of the {len(keys)} cache entries match the kept texts with model "
+                    f"'{self.model}', refusing to empty the cache"
+                )
+            keys, offsets = keys[selected], offsets[selected]
+        target_dtype = np.dtype(dtype) if dtype is not None else self.dtype
+        view = self._vectors_view() if self._vectors_size else None
+        self.close()
+        order = np.argsort(offsets)
+        tmp_vectors, tmp_index = self.vectors_file + ".tmp", self.index_file + ".tmp"
+        with open(tmp_vectors, "wb") as f:
+            # Copy in chunks so the cache never has to fit in memory
+            for start in range(0, len(order), 65536):
+                rows = view[offsets[order[start : start + 65536]] // self.row_bytes]
+                f.write(rows.astype(target_dtype).tobytes())
+        records = np.empty(len(order), dtype=INDEX_DTYPE)
+        records["key"] = keys[order]
+        records["offset"] = np.arange(len(order)) * self.dim * target_dtype.itemsize
+        records.tofile(tmp_index)
+        del view
+        os.replace(tmp_vectors, self.vectors_file)
+        os.replace(tmp_index, self.index_file)
+        with open(self.info_file, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "dtype": target_dtype.name}, f)
+        self.dtype = target_dtype
+        self.row_bytes = self.dim * self.dtype.itemsize
+        self._load()
+        return len(order)
@@ -1,64 +1,620 @@
 import os
-import pickle
+import re
+import struct
 from typing import List, Optional, Tuple
 
 import faiss
 import numpy as np
 
+from datatagger.utils.meta_store import MetaStore
+
+# Vector log header: magic, dim, ntotal of the snapshot the log applies to, bytes per value
+_VECTOR_LOG_MAGIC = b"DTVL"
+_VECTOR_LOG_HEADER = struct.Struct("<4siqi")
+
+# storage option -> Faiss scalar quantizer replacing flat (float32) codes
+STORAGE_CODECS = {"float32": None, "float16": "SQfp16", "sq8": "SQ8"}
+
+
+def resolve_index_factory(index_factory: str, storage: str = "float32") -> str:
+    """
+    Apply a compact storage option to a factory string: a trailing "Flat" component
+    becomes SQfp16/SQ8 ("Flat" -> "SQfp16", "IVF4096,Flat" -> "IVF4096,SQ8") and HNSW
+    gets a quantized storage ("HNSW32" -> "HNSW32,SQfp16"). Factories that already
+    encode vectors (PQ, SQ, ...) are returned unchanged.
+    """
+    if storage not in STORAGE_CODECS:
+        raise ValueError(
+            f"Unsupported faiss storage: {storage}, choose from {list(STORAGE_CODECS)}"
+        )
+    codec = STORAGE_CODECS[storage]
+    if codec is None:
+        return index_factory
+    components = index_factory.split(",")
+    if components[-1] == "Flat":
+        components[-1] = codec
+    elif len(components) == 1 and components[0].startswith("HNSW"):
+        components.append(codec)
+    return ",".join(components)
+
+
+_REDUCE_RE = re.compile(r"^(PCA|PCAR|OPQ\d+_|MRL)(\d+)$")
+
+
+def reduced_dim(reduce: str) -> int:
+    """Output dimension of a reduction spec (PCA256, PCAR256, OPQ32_256, MRL256)."""
+    match = _REDUCE_RE.match(reduce)
+    if match is None:
+        raise ValueError(
+            f"Unsupported faiss reduction: {reduce}, use PCA<d>, PCAR<d>, OPQ<m>_<d> or MRL<d>"
+        )
+    return int(match.group(2))
+
+
+def create_index(dim: int, index_factory: str, reduce: Optional[str] = None):
+    """
+    Create an index, optionally behind a dimensionality reduction.
+    PCA<d>/PCAR<d> (PCA, PCA + random rotation) and OPQ<m>_<d> are trained with the
+    index; MRL<d> keeps the first d components and re-normalizes them (Matryoshka
+    embeddings). The transform is stored inside the index file (IndexPreTransform),
+    so searches and reconstructions always go through the same transform.
+    """
+    if not reduce:
+        return faiss.index_factory(dim, index_factory)
+    out_dim = reduced_dim(reduce)
+    if out_dim > dim:
+        raise ValueError(f"Cannot reduce dimension {dim} to {out_dim}")
+    if not reduce.startswith("MRL"):
+        return faiss.index_factory(dim, f"{reduce},{index_factory}")
+    truncate = faiss.LinearTransform(dim, out_dim, False)
+    faiss.copy_array_to_vector(
+        np.eye(out_dim, dim, dtype="float32").ravel(), truncate.A
+    )
+    truncate.is_trained = True
+    truncate.set_is_orthonormal()
+    index = faiss.IndexPreTransform(
+        faiss.NormalizationTransform(out_dim),
+        faiss.index_factory(out_dim, index_factory),
+    )
+    index.prepend_transform(truncate)
+    return index
+
+
+def read_index_mmap(index_file: str):
+    """Open an index read-only with its codes memory-mapped, shared through the page cache."""
+    flags = (
+        getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+    )
+    return faiss.read_index(index_file, flags)
+
+
+def truncate_index(index, count: int):
+    """
+    Drop the vectors with ids >= count from an index. Indexes without removal
+    support (HNSW graphs) are rebuilt from their first `count` stored codes.
+    """
+    if count >= index.ntotal:
+        return
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        ivf = None
+    selector = faiss.IDSelectorRange(count, index.ntotal)
+    if ivf is not None:
+        # The array direct map cannot remove ids, rebuild it afterwards
+        ivf.set_direct_map_type(faiss.DirectMap.NoMap)
+        index.remove_ids(selector)
+        ivf.make_direct_map()
+        return
+    try:
+        index.remove_ids(selector)
+    except RuntimeError:
+        inner = index
+        if isinstance(index, faiss.IndexPreTransform):
+            # Rebuild in the transformed space, the transform itself is kept
+            inner = faiss.downcast_index(index.index)
+        vectors = inner.reconstruct_n(0, count)
+        inner.reset()
+        inner.add(vectors)
+        index.ntotal = count
+
 
 class FaissClient:
+    """
+    Local Faiss store with append-only persistence.
+    Every insert appends its vectors to `{index_file}.log` and its metas to the
+    MetaStore named by `meta_file`, so per-batch I/O is proportional to the batch.
+    The index snapshot is only rewritten every `snapshot_every` inserts and on
+    close(); on startup the log is replayed onto the last snapshot.
+
+    The index type is any Faiss factory string ("Flat", "HNSW32", "IVF4096,PQ64",
+    "IVF1024,SQ8", ...). Indexes that need training buffer their first vectors until
+    `train_size` of them arrived (or ensure_trained() is called), train on a sample
+    of them and then add everything; buffered vectors stay safe in the log meanwhile.
+
+    `storage` ("float32", "float16", "sq8") compacts flat/HNSW codes and the vector
+    log. With `read_only=True` the client never writes; `mmap=True` (read-only) maps
+    the index file instead of loading it, so several processes share one copy.
+    `reduce` (see create_index) stores vectors in fewer dimensions; it only applies
+    when the index is created, an existing index keeps its own transform.
+    """
+
     def __init__(
         self,
         index_file: str = "faiss.index",
-        meta_file: str = "faiss_meta.pkl",
+        meta_file: str = "faiss_meta",
         dim: int = 1024,
+        snapshot_every: int = 100,
+        index_factory: str = "Flat",
+        train_size: int = 100000,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        storage: str = "float32",
+        reduce: Optional[str] = None,
+        read_only: bool = False,
+        mmap: bool = False,
     ):
         self.index_file = index_file
         self.meta_file = meta_file
         self.dim = dim
+        self.snapshot_every = snapshot_every
+        self.index_factory = resolve_index_factory(index_factory, storage)
+        self.reduce = reduce
+        self.log_dtype = np.dtype("float32" if storage == "float32" else "float16")
+        self.read_only = read_only or mmap
+        self.mmap = mmap
+        self.train_size = train_size
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        # Vectors waiting for the index to be trained, already counted in metas
+        self._pending: List[np.ndarray] = []
+        self.vector_log_file = f"{index_file}.log"
+        self._inserts_since_snapshot = 0
+        if self.read_only:
+            self._load_or_create()
+            self._warn_unsnapshotted_logs()
+            return
+        for path in (index_file, meta_file):
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
         self._load_or_create()
+        self._replay_logs()
 
     def _load_or_create(self):
         if os.path.exists(self.index_file):
-            self.index = faiss.read_index(self.index_file)
+            if self.mmap:
+                self.index = read_index_mmap(self.index_file)
+            else:
+                self.index = faiss.read_index(self.index_file)
+        elif self.read_only:
+            raise FileNotFoundError(f"Faiss index not found: {self.index_file}")
         else:
-            self.index = faiss.IndexFlatL2(self.dim)
-        if os.path.exists(self.meta_file):
-            with open(self.meta_file, "rb") as f:
-                self.metas = pickle.load(f)
+            self.index = create_index(self.dim, self.index_factory, self.reduce)
+        self._prepare_index()
+        self.metas = MetaStore(self.meta_file, read_only=self.read_only)
+
+    def _prepare_index(self):
+        """Enable reconstruction by id on IVF indexes and apply search parameters."""
+        try:
+            ivf = faiss.extract_index_ivf(self.index)
+        except RuntimeError:
+            ivf = None
+        if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+            ivf.make_direct_map()
+        self.set_search_params(nprobe=self.nprobe, ef_search=self.ef_search)
+
+    def set_search_params(
+        self, nprobe: Optional[int] = None, ef_search: Optional[int] = None
+    ):
+        """Set nprobe (IVF) and efSearch (HNSW); parameters the index lacks are ignored."""
+        params = faiss.ParameterSpace()
+        for name, value in (("nprobe", nprobe), ("efSearch", ef_search)):
+            if value is None:
+                continue
+            try:
+                params.set_index_parameter(self.index, name, value)
+            except RuntimeError:
+                pass
+
+    @property
+    def ntotal(self) -> int:
+        """Number of stored vectors, including those waiting for training."""
+        return len(self.metas)
+
+    @property
+    def next_id(self) -> int:
+        """Vector id the next insert gets."""
+        return self.ntotal
+
+    def truncate(self, count: int) -> int:
+        """
+        Drop the vectors with ids >= count and their metas, e.g. those a killed run
+        stored after its last dataset checkpoint, and snapshot the result.
+        :return: number of dropped vectors
+        """
+        if self.read_only:
+            raise RuntimeError(f"Faiss index {self.index_file} is opened read-only")
+        dropped = self.ntotal - count
+        if dropped <= 0:
+            return 0
+        if count < self.index.ntotal:
+            truncate_index(self.index, count)
+            self._pending = []
+        elif self._pending:
+            pending = np.concatenate(self._pending)[: count - self.index.ntotal]
+            self._pending = [pending] if len(pending) else []
+        self.metas.truncate(count)
+        if self.index.is_trained:
+            self._save()
         else:
-            self.metas = []
+            # Untrained vectors only live in the log, rewrite it with the kept ones
+            self._vector_log.close()
+            self._reset_logs()
+            for vectors in self._pending:
+                self._append_log(vectors)
+        return dropped
+
+    def _add_vectors(self, vectors: np.ndarray):
+        if self.index.is_trained:
+            self.index.add(vectors)
+            return
+        self._pending.append(vectors)
+        if sum(len(v) for v in self._pending) >= self.train_size:
+            self.ensure_trained()
+
+    def ensure_trained(self):
+        """Train the index on a sample of the buffered vectors, then add all of them."""
+        if self.read_only or self.index.is_trained or not self._pending:
+            return
+        pending = np.concatenate(self._pending)
+        sample = pending
+        if len(pending) > self.train_size:
+            rng = np.random.default_rng(0)
+            sample = pending[rng.choice(len(pending), self.train_size, replace=False)]
+        try:
+            self.index.train(np.ascontiguousarray(sample))
+        except RuntimeError as e:
+            raise ValueError(
+                f"Cannot train Faiss index '{self.index_factory}' on {len(sample)} vectors, "
+                f"use fewer IVF lists or a larger dataset: {e}"
+            ) from e
+        self._prepare_index()
+        self.index.add(pending)
+        self._pending = []
+
+    def prepare_search(self):
+        """Make every stored vector searchable (trains a pending index)."""
+        self.ensure_trained()
+
+    def _warn_unsnapshotted_logs(self):
+        """Readers only see the snapshot, tell them when a writer has not snapshotted yet."""
+        if not os.path.exists(self.vector_log_file):
+            return
+        size = os.path.getsize(self.vector_log_file)
+        if size > _VECTOR_LOG_HEADER.size:
+            import warnings
+
+            warnings.warn(
+                f"{self.vector_log_file} holds inserts that are not in the snapshot yet, "
+                "read-only clients do not see them until the writer snapshots or closes",
+                # Point at the code constructing the client, past __init__
+                stacklevel=3,
+            )
+
+    @property
+    def _record_size(self) -> int:
+        return self.log_dtype.itemsize * self.dim
+
+    def _read_vector_log(self) -> Tuple[int, np.ndarray]:
+        with open(self.vector_log_file, "rb") as f:
+            header = f.read(_VECTOR_LOG_HEADER.size)
+            magic, dim, base, itemsize = _VECTOR_LOG_HEADER.unpack(header)
+            if (
+                magic != _VECTOR_LOG_MAGIC
+                or dim != self.dim
+                or itemsize != self.log_dtype.itemsize
+            ):
+                raise ValueError(
+                    f"Vector log {self.vector_log_file} does not match index "
+                    f"(dim {dim}/{self.dim}, bytes per value {itemsize}/{self.log_dtype.itemsize})"
+                )
+            data = f.read()
+        # A torn last record is ignored
+        rows = len(data) // self._record_size
+        vectors = np.frombuffer(data[: rows * self._record_size], dtype=self.log_dtype)
+        return base, vectors.reshape(rows, self.dim).astype("float32")
+
+    def _replay_logs(self):
+        """Apply log entries that are newer than the loaded snapshot."""
+        if not os.path.exists(self.vector_log_file):
+            self.metas.truncate(self.index.ntotal)
+            self._reset_logs()
+            return
+        base, vectors = self._read_vector_log()
+        # Metas are appended after their vectors, only entries present in both are valid
+        count = min(len(vectors), len(self.metas) - base)
+        start = self.index.ntotal - base
+        if start < count:
+            self._add_vectors(np.ascontiguousarray(vectors[start:count]))
+            # Replayed entries are folded into the next snapshot
+            self._inserts_since_snapshot = 1
+        self.metas.truncate(base + count)
+        stored = self.index.ntotal + sum(len(v) for v in self._pending)
+        if stored != len(self.metas):
+            raise ValueError(
+                f"Faiss index ({stored}) and metas ({len(self.metas)}) are out of sync"
+            )
+        # Drop torn records so that new appends stay aligned
+        with open(self.vector_log_file, "r+b") as f:
+            f.truncate(_VECTOR_LOG_HEADER.size + max(count, 0) * self._record_size)
+        self._open_logs()
+
+    def _open_logs(self):
+        self._vector_log = open(self.vector_log_file, "ab")
+
+    def _reset_logs(self):
+        """Start an empty vector log based on the current snapshot."""
+        tmp_path = self.vector_log_file + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(
+                _VECTOR_LOG_HEADER.pack(
+                    _VECTOR_LOG_MAGIC,
+                    self.dim,
+                    self.index.ntotal,
+                    self.log_dtype.itemsize,
+                )
+            )
+        os.replace(tmp_path, self.vector_log_file)
+        self._open_logs()
+
+    def _append_log(self, vectors: np.ndarray):
+        self._vector_log.write(vectors.astype(self.log_dtype, copy=False).tobytes())
+        self._vector_log.flush()
+        os.fsync(self._vector_log.fileno())
 
     def insert_embeddings(
-        self, embeddings: List[List[float]], metas: Optional[List[str]] = None
-    ):
+        self,
+        embeddings: List[List[float]],
+        metas: Optional[List[str]] = None,
+        row_keys: Optional[List[int]] = None,
+    ) -> List[int]:
+        """
+        Add embeddings and return their vector ids (positions in the index).
+        :param row_keys: dataset rows the embeddings were computed from
+        """
+        if self.read_only:
+            raise RuntimeError(f"Faiss index {self.index_file} is opened read-only")
         n = len(embeddings)
         if metas is None:
             metas = ["" for _ in range(n)]
-        self.index.add(np.array(embeddings, dtype="float32"))
-        self.metas.extend(metas)
-        self._save()
+        vectors = np.array(embeddings, dtype="float32")
+        self._append_log(vectors)
+        ids = self.metas.append(metas, row_keys)
+        self._add_vectors(vectors)
+        self._inserts_since_snapshot += 1
+        if self.snapshot_every and self._inserts_since_snapshot >= self.snapshot_every:
+            self._save()
+        return ids
 
     def _save(self):
-        faiss.write_index(self.index, self.index_file)
-        with open(self.meta_file, "wb") as f:
-            pickle.dump(self.metas, f)
+        """Write a full snapshot atomically, then truncate the logs it covers."""
+        if not self.index.is_trained:
+            # Untrained vectors only live in the log until training happens
+            return
+        self._vector_log.close()
+        tmp_index_file = self.index_file + ".tmp"
+        faiss.write_index(self.index, tmp_index_file)
+        os.replace(tmp_index_file, self.index_file)
+        self._reset_logs()
+        self._inserts_since_snapshot = 0
+
+    def close(self):
+        """Train if needed, snapshot pending inserts and release the log files."""
+        if self.read_only:
+            self.metas.close()
+            return
+        self.ensure_trained()
+        if self._inserts_since_snapshot:
+            self._save()
+        self._vector_log.close()
+        self.metas.close()
 
     def search(self, embedding: List[float], top_k: int = 5) -> List[Tuple[str, float]]:
         distances, indices = self.index.search(
             np.array([embedding], dtype="float32"), top_k
         )
-        results = []
-        for idx, dist in zip(indices[0], distances[0]):
-            if idx < len(self.metas):
-                results.append((self.metas[idx], float(dist)))
-        return results
+        metas = self.metas.get([int(i) for i in indices[0]])
+        return [
+            (meta, float(dist))
+            for meta, dist in zip(metas, distances[0])
+            if meta is not None
+        ]
+
+    def search_batch(
+        self, queries: np.ndarray, top_k: int = 5
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Search many query vectors in one call, returns (distances, ids) of shape (n, top_k)."""
+        return self.index.search(np.ascontiguousarray(queries, dtype="float32"), top_k)
+
+    def range_search_batch(
+        self, queries: np.ndarray, radius: float
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        All stored vectors closer than radius to each query, as (lims, distances, ids);
+        the results of query i are ids[lims[i]:lims[i + 1]].
+        Raises RuntimeError for index types without range search.
+        """
+        return self.index.range_search(
+            np.ascontiguousarray(queries, dtype="float32"), radius
+        )
+
+    def reconstruct_batch(self, ids: List[int]) -> np.ndarray:
+        """Return the stored vectors of the given ids as a (n, dim) float32 array."""
+        return self.index.reconstruct_batch(np.asarray(ids, dtype="int64"))
+
+    def sample_vectors(self, n: int, seed: int = 0) -> np.ndarray:
+        """Reconstruct n randomly chosen stored vectors (decoded, i.e. lossy for PQ/SQ)."""
+        self.ensure_trained()
+        rng = np.random.default_rng(seed)
+        ids = rng.choice(self.index.ntotal, min(n, self.index.ntotal), replace=False)
+        return self.reconstruct_batch(np.sort(ids))
+
+    def get_metas(self, ids: List[int]) -> List[Optional[str]]:
+        return self.metas.get(ids)
+
+    def get_row_keys(self, ids: List[int]) -> np.ndarray:
+        """Dataset row each vector was stored for (-1 when unknown)."""
+        return self.metas.row_keys(ids)
+
+    def get_ids_by_meta(self, meta: str) -> List[int]:
+        """Vector ids of every stored copy of meta, found through the content hash index."""
+        return self.metas.find_ids(meta)
 
     def get_embedding_by_meta(self, meta: str) -> Optional[List[float]]:
         """
         根据 meta 内容返回对应的 embedding（向量），如有多个匹配返回第一个，找不到返回 None。
+        所有匹配的 id 见 get_ids_by_meta。
         """
-        if meta in self.metas:
-            idx = self.metas.index(meta)
-            return self.index.reconstruct(idx).tolist()
+        ids = self.get_ids_by_meta(meta)
+        if ids and ids[0] < self.index.ntotal:
+            return self.index.reconstruct(ids[0]).tolist()
         return None
+
+
+def evaluate_search_params(
+    vectors: np.ndarray,
+    index_factory: str,
+    nprobe_values: Optional[List[int]] = None,
+    ef_search_values: Optional[List[int]] = None,
+    top_k: int = 10,
+    num_queries: int = 1000,
+    seed: int = 0,
+) -> List[dict]:
+    """
+    Recall-vs-latency report of an index type against an exact flat baseline.
+    The candidate index is trained on and filled with `vectors`; `num_queries` of
+    them are searched in both indexes. For every nprobe/efSearch value the report
+    holds recall@top_k (share of exact neighbors found) and the mean per-query
+    latency in ms; values of a parameter the index does not have are reported with
+    the reason under "skipped". Raises ValueError when none of them apply.
+    """
+    import time
+
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    rng = np.random.default_rng(seed)
+    queries = vectors[
+        rng.choice(len(vectors), min(num_queries, len(vectors)), replace=False)
+    ]
+    dim = vectors.shape[1]
+
+    flat = faiss.IndexFlatL2(dim)
+    flat.add(vectors)
+    start = time.perf_counter()
+    _, exact = flat.search(queries, top_k)
+    flat_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    index = faiss.index_factory(dim, index_factory)
+    start = time.perf_counter()
+    index.train(vectors)
+    index.add(vectors)
+    build_s = time.perf_counter() - start
+
+    settings = [("Flat (baseline)", None, None)]
+    settings += [(index_factory, "nprobe", v) for v in nprobe_values or []]
+    settings += [(index_factory, "efSearch", v) for v in ef_search_values or []]
+    if len(settings) == 1:
+        settings.append((index_factory, None, None))
+
+    report = []
+    params = faiss.ParameterSpace()
+    for name, param, value in settings:
+        if name == "Flat (baseline)":
+            report.append(
+                {"index": name, "param": None, "recall": 1.0, "latency_ms": flat_ms}
+            )
+            continue
+        if param is not None:
+            try:
+                params.set_index_parameter(index, param, value)
+            except RuntimeError:
+                report.append(
+                    {
+                        "index": name,
+                        "param": f"{param}={value}",
+                        "recall": None,
+                        "latency_ms": None,
+                        "skipped": f"{index_factory} has no {param} parameter",
+                    }
+                )
+                continue
+        start = time.perf_counter()
+        _, found = index.search(queries, top_k)
+        latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        hits = sum(
+            len(set(row_found) & set(row_exact))
+            for row_found, row_exact in zip(found.tolist(), exact.tolist())
+        )
+        report.append(
+            {
+                "index": name,
+                "param": f"{param}={value}" if param else None,
+                "recall": hits / (len(queries) * top_k),
+                "latency_ms": latency_ms,
+                "build_s": build_s,
+            }
+        )
+    requested = sorted({param for _, param, _ in settings if param is not None})
+    if requested and all("skipped" in row for row in report[1:]):
+        raise ValueError(
+            f"None of the requested search parameters ({', '.join(requested)}) apply to {index_factory}"
+        )
+    return report
+
+
+def evaluate_reduction(
+    vectors: np.ndarray,
+    reduce_values: List[str],
+    top_k: int = 10,
+    num_queries: int = 1000,
+    seed: int = 0,
+) -> List[dict]:
+    """
+    Neighbor overlap of reduced vectors against the full-dimension ones.
+    For every reduction spec a flat index is trained on and filled with `vectors`;
+    overlap is the share of the exact full-dimension top_k neighbors that the
+    reduced search also returns. bytes is the stored size of one flat vector.
+    """
+    import time
+
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    rng = np.random.default_rng(seed)
+    queries = vectors[
+        rng.choice(len(vectors), min(num_queries, len(vectors)), replace=False)
+    ]
+    dim = vectors.shape[1]
+    flat = faiss.IndexFlatL2(dim)
+    flat.add(vectors)
+    _, exact = flat.search(queries, top_k)
+
+    report = [{"reduce": "none", "dim": dim, "bytes": dim * 4, "overlap": 1.0}]
+    for reduce in reduce_values:
+        index = create_index(dim, "Flat", reduce)
+        start = time.perf_counter()
+        index.train(vectors)
+        index.add(vectors)
+        train_s = time.perf_counter() - start
+        _, found = index.search(queries, top_k)
+        hits = sum(
+            len(set(row_found) & set(row_exact))
+            for row_found, row_exact in zip(found.tolist(), exact.tolist())
+        )
+        report.append(
+            {
+                "reduce": reduce,
+                "dim": reduced_dim(reduce),
+                "bytes": reduced_dim(reduce) * 4,
+                "overlap": hits / (len(queries) * top_k),
+                "build_s": train_s,
+            }
+        )
+    return report
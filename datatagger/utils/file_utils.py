@@ -1,22 +1,653 @@
+import codecs
+import gzip
+import io
 import json
 import os
+import queue
 import shutil
+import threading
 import uuid
+from collections import Counter
+from functools import partial
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Union,
+)
+
+# Bytes read per step by the streaming JSON array parser
+JSON_READ_CHUNK = 1 << 20
+_WHITESPACE = " \t\n\r"
+# Buffer of the streaming dataset writers
+WRITE_BUFFER_SIZE = 1 << 20
+# Rows per Parquet row group, and per batch when reading Parquet
+PARQUET_ROW_GROUP_SIZE = 65536
+# Logical types of typed dataset columns (see TagMissionProcessor.OUTPUT_FIELD_TYPES)
+FIELD_TYPES = ("float", "int", "bool", "string", "category", "list<string>")
+DATASET_EXTENSIONS = (".json", ".jsonl", ".parquet")
+# Compression suffixes handled transparently (e.g. data.jsonl.zst)
+COMPRESSIONS = {".gz": "gzip", ".zst": "zstd"}
+# Decompressed bytes per chunk of the background reader, and chunks queued ahead
+DECOMPRESS_CHUNK = 1 << 20
+DECOMPRESS_QUEUE = 8
+# Row key of tag sidecar files written without a row_key_field: the input row index
+ROW_INDEX_FIELD = "_row"
+
+# JSON backends by preference, the first importable one is used unless
+# DATATAGGER_JSON_BACKEND names another
+JSON_BACKENDS = ("orjson", "msgspec", "json")
+# (dumps -> compact UTF-8 bytes, loads from str/bytes, errors to fall back to the stdlib on)
+JsonCodec = Tuple[Callable[[Any], bytes], Callable[[Union[str, bytes]], Any], tuple]
+
+
+def _json_default(obj: Any) -> Any:
+    """Encode other Mappings (e.g. rows of a ColumnarDataset) as JSON objects."""
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _stdlib_dumps(obj: Any, indent: Optional[int] = None) -> bytes:
+    if indent is None:
+        return json.dumps(
+            obj, ensure_ascii=False, separators=(",", ":"), default=_json_default
+        ).encode("utf-8")
+    return json.dumps(
+        obj, ensure_ascii=False, indent=indent, default=_json_default
+    ).encode("utf-8")
+
+
+def _orjson_codec() -> JsonCodec:
+    import orjson
+
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    return (
+        partial(orjson.dumps, default=_json_default, option=option),
+        orjson.loads,
+        (TypeError, ValueError),
+    )
+
+
+def _msgspec_codec() -> JsonCodec:
+    import msgspec
+
+    return (
+        msgspec.json.Encoder(enc_hook=_json_default).encode,
+        msgspec.json.Decoder().decode,
+        (TypeError, ValueError, OverflowError, msgspec.MsgspecError),
+    )
+
+
+def _stdlib_codec() -> JsonCodec:
+    return _stdlib_dumps, json.loads, ()
+
+
+_CODEC_LOADERS: Dict[str, Callable[[], JsonCodec]] = {
+    "orjson": _orjson_codec,
+    "msgspec": _msgspec_codec,
+    "json": _stdlib_codec,
+}
+
+
+def load_json_codec(backend: str) -> JsonCodec:
+    """Codec of a JSON backend, raises ImportError when it is not installed."""
+    if backend not in _CODEC_LOADERS:
+        raise ValueError(
+            f"Unsupported JSON backend: {backend}, choose from {JSON_BACKENDS}"
+        )
+    return _CODEC_LOADERS[backend]()
+
+
+def _select_json_backend() -> Tuple[str, JsonCodec]:
+    preferred = os.environ.get("DATATAGGER_JSON_BACKEND")
+    for backend in (preferred,) if preferred else JSON_BACKENDS:
+        try:
+            return backend, load_json_codec(backend)
+        except ImportError:
+            continue
+    return "json", _stdlib_codec()
+
+
+JSON_BACKEND, (_fast_dumps, _fast_loads, _FAST_ERRORS) = _select_json_backend()
+
+
+def json_dumps(obj: Any, indent: Optional[int] = None) -> bytes:
+    """
+    Encode obj as UTF-8 JSON bytes with the fast backend (compact unless indent is set).
+    Values the backend rejects (e.g. integers beyond 64 bits) go through the stdlib.
+    """
+    if indent is None:
+        try:
+            return _fast_dumps(obj)
+        except _FAST_ERRORS:
+            pass
+    elif indent == 2 and JSON_BACKEND == "orjson":
+        import orjson
+
+        try:
+            return orjson.dumps(
+                obj,
+                default=_json_default,
+                option=orjson.OPT_INDENT_2
+                | orjson.OPT_NON_STR_KEYS
+                | orjson.OPT_SERIALIZE_NUMPY,
+            )
+        except _FAST_ERRORS:
+            pass
+    return _stdlib_dumps(obj, indent)
+
+
+def json_loads(data: Union[str, bytes]) -> Any:
+    """
+    Decode JSON text or bytes with the fast backend. Input it rejects (NaN literals,
+    invalid JSON) is retried with the stdlib, so errors are json.JSONDecodeError.
+    Some orjson versions read integers beyond 64 bits as floats.
+    """
+    try:
+        return _fast_loads(data)
+    except _FAST_ERRORS:
+        return json.loads(data)
+
+
+def split_compression(path: str) -> Tuple[str, Optional[str]]:
+    """Split a compression suffix off a path: "a.jsonl.zst" -> ("a.jsonl", "zstd")."""
+    root, suffix = os.path.splitext(path)
+    compression = COMPRESSIONS.get(suffix.lower())
+    return (root, compression) if compression else (path, None)
+
+
+def compression_suffix(compression: Optional[str]) -> str:
+    """File suffix of a compression ("zstd" -> ".zst"), empty for None."""
+    for suffix, name in COMPRESSIONS.items():
+        if name == compression:
+            return suffix
+    return ""
+
+
+def dataset_ext(path: str) -> str:
+    """Dataset format suffix of a path, ignoring compression: "a.jsonl.gz" -> ".jsonl"."""
+    return os.path.splitext(split_compression(path)[0])[1].lower()
+
+
+def _import_zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError(
+            ".zst files require zstandard, please install it (pip install zstandard)"
+        ) from e
+    return zstandard
+
+
+class _DecompressingRaw(io.RawIOBase):
+    """
+    Raw stream over the chunks a background thread decompresses into a bounded queue
+    (up to DECOMPRESS_QUEUE chunks ahead), so decompression overlaps with parsing.
+    """
+
+    def __init__(self, raw: BinaryIO, stream: BinaryIO):
+        self._raw = raw
+        self._stream = stream
+        self._queue: queue.Queue = queue.Queue(maxsize=DECOMPRESS_QUEUE)
+        self._chunk = memoryview(b"")
+        self._pos = 0
+        self._eof = False
+        self._error: Optional[BaseException] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._decompress, daemon=True)
+        self._thread.start()
+
+    def _decompress(self):
+        try:
+            while not self._stop.is_set():
+                data = self._stream.read(DECOMPRESS_CHUNK)
+                self._put(data)
+                if not data:
+                    return
+        except BaseException as e:  # noqa: BLE001 - re-raised in the reading thread
+            self._error = e
+            self._put(b"")
+
+    def _put(self, data: bytes):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(data, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self._pos >= len(self._chunk):
+            if not self._eof:
+                data = self._queue.get()
+                if data:
+                    self._chunk, self._pos = memoryview(data), 0
+                else:
+                    self._eof = True
+            if self._eof:
+                # A truncated or corrupt stream keeps failing instead of reading as EOF
+                if self._error is not None:
+                    raise self._error
+                return 0
+        size = min(len(buffer), len(self._chunk) - self._pos)
+        buffer[:size] = self._chunk[self._pos : self._pos + size]
+        self._pos += size
+        return size
+
+    def compressed_tell(self) -> int:
+        return self._raw.tell()
+
+    def close(self):
+        if self.closed:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._stream.close()
+        self._raw.close()
+        super().close()
+
+
+class ThreadedReader(io.BufferedReader):
+    """
+    Buffered reader over a stream decompressed in a background thread. Line iteration
+    and reads use the C BufferedReader, tell() reports the position in the compressed
+    file, which makes byte-based progress bars work against the compressed file size.
+    """
+
+    def __init__(self, raw: BinaryIO, stream: BinaryIO):
+        super().__init__(_DecompressingRaw(raw, stream), buffer_size=DECOMPRESS_CHUNK)
+
+    def tell(self) -> int:
+        return self.raw.compressed_tell()
+
+
+def open_binary_read(path: str) -> BinaryIO:
+    """Open a file for binary reading, decompressing .gz/.zst in a background thread."""
+    compression = split_compression(path)[1]
+    if compression is None:
+        return open(path, "rb")
+    raw = open(path, "rb")
+    if compression == "gzip":
+        stream = gzip.GzipFile(fileobj=raw, mode="rb")
+    else:
+        stream = _import_zstandard().ZstdDecompressor().stream_reader(raw)
+    return ThreadedReader(raw, stream)
+
+
+def open_binary_write(path: str, compression: Optional[str] = "auto") -> BinaryIO:
+    """
+    Open a buffered binary file for writing, compressed with gzip or zstd (multi-threaded)
+    when `compression` says so; "auto" picks it from the path suffix.
+    """
+    if compression == "auto":
+        compression = split_compression(path)[1]
+    if compression is None:
+        return open(path, "wb", buffering=WRITE_BUFFER_SIZE)
+    if compression == "gzip":
+        stream = gzip.open(path, "wb", compresslevel=6)
+    elif compression == "zstd":
+        stream = (
+            _import_zstandard()
+            .ZstdCompressor(level=3, threads=-1)
+            .stream_writer(open(path, "wb"), closefd=True)
+        )
+    else:
+        raise ValueError(
+            f"Unsupported compression: {compression}, choose from {list(COMPRESSIONS.values())}"
+        )
+    return io.BufferedWriter(stream, WRITE_BUFFER_SIZE)
+
+
+def encode_jsonl_item(item: Any) -> bytes:
+    """JSON bytes of one JSONL line (without the newline)."""
+    return json_dumps(item)
+
+
+def encode_array_item(item: Any, indent: Optional[int] = None) -> bytes:
+    """JSON bytes of one item of a JSON array, indented to sit one level deep."""
+    if indent is None:
+        return json_dumps(item)
+    # Strings never hold raw newlines in JSON, so every line can be indented
+    pad = b" " * indent
+    return pad + json_dumps(item, indent=indent).replace(b"\n", b"\n" + pad)
+
+
+class JsonlWriter:
+    """
+    Streaming JSONL writer keeping one buffered file handle open.
+    `encoder` is a picklable item -> bytes function, so items can be encoded in worker
+    processes and passed to write_encoded().
+    """
+
+    def __init__(self, file_path: str, compression: Optional[str] = "auto"):
+        self.file_path = file_path
+        self.count = 0
+        self.encoder: Callable[[Any], bytes] = encode_jsonl_item
+        self._file = open_binary_write(file_path, compression)
+
+    def write(self, item: Any):
+        self.write_encoded(self.encoder(item))
+
+    def write_many(self, items: Iterable[Any]):
+        for item in items:
+            self.write(item)
+
+    def write_encoded(self, text: bytes):
+        self._file.write(text + b"\n")
+        self.count += 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class JsonArrayWriter(JsonlWriter):
+    """
+    Streaming JSON array writer: the opening bracket, comma-separated items and the
+    closing bracket on close(), so a .json output never has to be built in memory.
+    indent=None writes a compact array, otherwise the layout of json.dump(indent=indent).
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        indent: Optional[int] = 2,
+        compression: Optional[str] = "auto",
+    ):
+        super().__init__(file_path, compression)
+        self.indent = indent
+        self.encoder = partial(encode_array_item, indent=indent)
+        self._file.write(b"[")
+
+    def write_encoded(self, text: bytes):
+        if self.indent is None:
+            self._file.write(b"," + text if self.count else text)
+        else:
+            self._file.write(b",\n" + text if self.count else b"\n" + text)
+        self.count += 1
+
+    def close(self):
+        if not self._file.closed:
+            self._file.write(b"\n]" if self.indent is not None and self.count else b"]")
+        super().close()
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError(
+            "Parquet files require pyarrow, please install it (pip install pyarrow)"
+        ) from e
+    return pa, pq
+
+
+def _arrow_type(pa, field_type: str):
+    if field_type == "float":
+        return pa.float64()
+    if field_type == "int":
+        return pa.int64()
+    if field_type == "bool":
+        return pa.bool_()
+    if field_type == "string":
+        return pa.string()
+    if field_type == "category":
+        return pa.dictionary(pa.int32(), pa.string())
+    if field_type == "list<string>":
+        return pa.list_(pa.string())
+    raise ValueError(f"Unsupported field type: {field_type}, choose from {FIELD_TYPES}")
+
+
+def parse_bool(value: Any) -> Optional[bool]:
+    """
+    Booleans, 0/1 and the strings "true"/"false"/"1"/"0" (any case); anything else is
+    None. bool() would make "False" and "0" true.
+    """
+    if hasattr(value, "item") and not isinstance(value, str):
+        # NumPy scalar
+        value = value.item()
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if value in ("true", "1"):
+            return True
+        if value in ("false", "0"):
+            return False
+        return None
+    if isinstance(value, (int, float)) and value in (0, 1):
+        return bool(value)
+    return None
+
+
+def _coerce(value: Any, field_type: str) -> Any:
+    """Convert a value to a typed column, values that do not convert become null."""
+    if value is None:
+        return None
+    try:
+        if field_type == "float":
+            return float(value)
+        if field_type == "int":
+            return int(value)
+        if field_type == "bool":
+            return parse_bool(value)
+        if field_type == "list<string>":
+            return [str(v) for v in value] if isinstance(value, (list, tuple)) else None
+        return str(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def encode_parquet_row(item: Any) -> Any:
+    """Rows are converted to columns by ParquetWriter itself."""
+    return item
+
+
+class ParquetWriter:
+    """
+    Streaming Parquet writer with the JsonlWriter interface: rows are buffered and
+    written one row group at a time (zstd-compressed).
+    Columns in `field_types` (name -> one of FIELD_TYPES) are always present with a fixed
+    type, values that do not convert are stored as null. Other columns are inferred from
+    `schema_rows` when given (e.g. the full dataset), else from the first row group;
+    columns holding only nulls there are stored as strings.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        field_types: Optional[Dict[str, str]] = None,
+        row_group_size: int = PARQUET_ROW_GROUP_SIZE,
+        schema_rows: Optional[List[Dict[str, Any]]] = None,
+    ):
+        self.pa, self.pq = _import_pyarrow()
+        self.file_path = file_path
+        self.field_types = field_types or {}
+        self.row_group_size = row_group_size
+        self.count = 0
+        self.encoder: Callable[[Any], Any] = encode_parquet_row
+        self._rows: List[Dict[str, Any]] = []
+        self._writer = None
+        self._schema = (
+            self._infer_schema(schema_rows) if schema_rows is not None else None
+        )
+
+    def _infer_schema(self, rows: List[Dict[str, Any]]):
+        pa = self.pa
+        names = dict.fromkeys(name for row in rows for name in row)
+        names.update(dict.fromkeys(self.field_types))
+        fields = []
+        for name in names:
+            if name in self.field_types:
+                arrow_type = _arrow_type(pa, self.field_types[name])
+            else:
+                try:
+                    arrow_type = pa.array([row.get(name) for row in rows]).type
+                except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                    raise ValueError(
+                        f"Column {name} mixes value types, which Parquet cannot store: {e}"
+                    ) from e
+                if pa.types.is_null(arrow_type):
+                    arrow_type = pa.string()
+            fields.append(pa.field(name, arrow_type))
+        return pa.schema(fields)
+
+    def write(self, item: Any):
+        self.write_encoded(item)
+
+    def write_many(self, items: Iterable[Any]):
+        for item in items:
+            self.write(item)
+
+    def write_encoded(self, row: Dict[str, Any]):
+        self._rows.append(row)
+        self.count += 1
+        if len(self._rows) >= self.row_group_size:
+            self._write_row_group()
+
+    def _write_row_group(self):
+        pa, rows = self.pa, self._rows
+        if self._schema is None:
+            self._schema = self._infer_schema(rows)
+        unknown = set().union(*rows).difference(self._schema.names)
+        if unknown:
+            raise ValueError(
+                f"Columns {sorted(unknown)} first appear after the row group the Parquet "
+                f"schema was inferred from, pass field_types or save the dataset at once"
+            )
+        columns = []
+        for field in self._schema:
+            values = [row.get(field.name) for row in rows]
+            field_type = self.field_types.get(field.name)
+            if field_type is not None:
+                values = [_coerce(value, field_type) for value in values]
+            columns.append(pa.array(values, type=field.type))
+        table = pa.Table.from_arrays(columns, schema=self._schema)
+        if self._writer is None:
+            self._writer = self.pq.ParquetWriter(
+                self.file_path, self._schema, compression="zstd"
+            )
+        self._writer.write_table(table, row_group_size=self.row_group_size)
+        self._rows = []
+
+    def close(self):
+        # An empty dataset still gets a valid file
+        if self._rows or self._writer is None:
+            self._write_row_group()
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _check_parquet_uncompressed(file_path: str, compression: Optional[str] = "auto"):
+    if compression == "auto":
+        compression = split_compression(file_path)[1]
+    if compression is not None:
+        raise ValueError(
+            f"{file_path}: Parquet files are compressed internally, drop the .gz/.zst suffix"
+        )
+
+
+def iter_parquet_rows(
+    file: Union[str, BinaryIO],
+    columns: Optional[List[str]] = None,
+    batch_size: int = PARQUET_ROW_GROUP_SIZE,
+) -> Iterator[Dict[str, Any]]:
+    """Yield the rows of a Parquet file (path or binary file), reading batch_size rows at a time."""
+    if isinstance(file, str):
+        _check_parquet_uncompressed(file)
+    _, pq = _import_pyarrow()
+    parquet_file = pq.ParquetFile(file)
+    for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+        yield from batch.to_pylist()
+
+
+def parquet_num_rows(file: Union[str, BinaryIO]) -> int:
+    """Row count of a Parquet file, read from its footer."""
+    if isinstance(file, str):
+        _check_parquet_uncompressed(file)
+    _, pq = _import_pyarrow()
+    return pq.ParquetFile(file).metadata.num_rows
+
+
+def open_dataset_writer(
+    file_path: str,
+    ext: str = ".jsonl",
+    compact: bool = False,
+    indent: int = 2,
+    field_types: Optional[Dict[str, str]] = None,
+    compression: Optional[str] = "auto",
+) -> Union[JsonlWriter, ParquetWriter]:
+    """
+    Streaming writer for a .jsonl, .json or .parquet dataset file (compact drops the
+    .json indentation, field_types types the Parquet columns). JSON outputs are
+    compressed per `compression`, "auto" detects .gz/.zst from the path.
+    """
+    if ext == ".jsonl":
+        return JsonlWriter(file_path, compression=compression)
+    if ext == ".json":
+        return JsonArrayWriter(
+            file_path, indent=None if compact else indent, compression=compression
+        )
+    if ext == ".parquet":
+        _check_parquet_uncompressed(file_path, compression)
+        return ParquetWriter(file_path, field_types=field_types)
+    raise ValueError(
+        "Invalid file format. Please provide a .json, .jsonl or .parquet file."
+    )
 
 
 class CheckpointManager:
-    def __init__(self, data_file: str, state_file: str):
+    def __init__(
+        self, data_file: str, state_file: str, fields: Optional[List[str]] = None
+    ):
         self.data_file = data_file
         self.state_file = state_file
+        # Only these fields of the processed rows are saved (e.g. the tags), when given
+        self.fields = fields
+        # Progress of later stages (e.g. similarity_index), kept across saves
+        self.extra_state = {}
 
-    def save(self, dataset: list, current_index: int):
+    def save(self, dataset: list, current_index: int, **extra_state):
+        self.extra_state.update(extra_state)
         tmp_data_file = self.data_file + ".tmp"
         tmp_state_file = self.state_file + ".tmp"
-        # 只保存已处理部分
-        with open(tmp_data_file, "w", encoding="utf-8") as f:
-            json.dump(dataset[:current_index], f, ensure_ascii=False, indent=2)
+        # 只保存已处理部分，流式写入紧凑数组，不复制 dataset；压缩方式取自 data_file 后缀
+        with JsonArrayWriter(
+            tmp_data_file,
+            indent=None,
+            compression=split_compression(self.data_file)[1],
+        ) as writer:
+            for idx in range(current_index):
+                item = dataset[idx]
+                if self.fields is not None:
+                    item = {
+                        field: item[field] for field in self.fields if field in item
+                    }
+                writer.write(item)
         with open(tmp_state_file, "w", encoding="utf-8") as f:
-            json.dump({"current_index": current_index}, f)
+            json.dump({"current_index": current_index, **self.extra_state}, f)
         shutil.move(tmp_data_file, self.data_file)
         shutil.move(tmp_state_file, self.state_file)
 
@@ -25,9 +656,10 @@ class CheckpointManager:
             return None
         with open(self.state_file, "r", encoding="utf-8") as f:
             state = json.load(f)
-        current_index = state.get("current_index", 0)
-        with open(self.data_file, "r", encoding="utf-8") as f:
-            processed_data = json.load(f)
+        current_index = state.pop("current_index", 0)
+        self.extra_state = state
+        with open_binary_read(self.data_file) as f:
+            processed_data = json_loads(f.read())
         return processed_data, current_index
 
     def cleanup(self):
@@ -36,39 +668,202 @@ class CheckpointManager:
                 os.remove(f)
 
 
+class FailureLedger:
+    """
+    Rows whose tagging failed, as row index -> {"error": error class, "attempts": count},
+    saved as JSON next to the checkpoint. It outlives the checkpoint, so a later
+    --retry_failed run can re-process exactly these rows.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.failures: Dict[int, Dict[str, Any]] = {}
+
+    def load(self) -> "FailureLedger":
+        if os.path.exists(self.file_path):
+            with open(self.file_path, "r", encoding="utf-8") as f:
+                self.failures = {
+                    entry["row"]: {
+                        "error": entry["error"],
+                        "attempts": entry["attempts"],
+                    }
+                    for entry in json.load(f)
+                }
+        return self
+
+    def record(self, row: int, error: str):
+        entry = self.failures.setdefault(row, {"error": error, "attempts": 0})
+        entry["error"] = error
+        entry["attempts"] += 1
+
+    def resolve(self, row: int):
+        self.failures.pop(row, None)
+
+    def rows(self) -> List[int]:
+        return sorted(self.failures)
+
+    def reasons(self) -> Counter:
+        """Number of failed rows per error class."""
+        return Counter(entry["error"] for entry in self.failures.values())
+
+    def save(self):
+        """Write the ledger, or remove its file once no failure is left."""
+        if not self.failures:
+            if os.path.exists(self.file_path):
+                os.remove(self.file_path)
+            return
+        tmp_file = self.file_path + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(
+                [{"row": row, **self.failures[row]} for row in self.rows()],
+                f,
+                ensure_ascii=False,
+            )
+        shutil.move(tmp_file, self.file_path)
+
+    def __len__(self) -> int:
+        return len(self.failures)
+
+
 # File I/O utilities
 def load_jsonl_to_list(jsonl_file_path):
     data_list = []
-    with open(jsonl_file_path, "r") as file:
+    with open_binary_read(jsonl_file_path) as file:
         for line in file:
-            json_obj = json.loads(line)
-            data_list.append(json_obj)
+            if line.strip():
+                data_list.append(json_loads(line))
     return data_list
 
 
+def iter_json_array(file: BinaryIO, chunk_size: int = JSON_READ_CHUNK) -> Iterator[Any]:
+    """
+    Yield the items of a top-level JSON array read from a binary file, holding only
+    the current item (plus one read chunk) in memory. file.tell() reports how far
+    the input was consumed, e.g. for byte-based progress bars.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buf, pos, eof = "", 0, False
+
+    def fill(min_size: int) -> bool:
+        nonlocal buf, pos, eof
+        if eof:
+            return False
+        data = file.read(min_size)
+        eof = not data
+        buf = buf[pos:] + text_decoder.decode(data, final=eof)
+        pos = 0
+        return not eof
+
+    def next_token() -> str:
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            if not fill(chunk_size):
+                raise json.JSONDecodeError("Unexpected end of JSON array", buf, pos)
+
+    if next_token() != "[":
+        raise json.JSONDecodeError("Expecting a JSON array", buf, pos)
+    pos += 1
+    if next_token() == "]":
+        return
+    while True:
+        next_token()
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+            # A value ending at the buffer end may be cut (e.g. a number), read on
+            complete = end < len(buf) or eof
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            complete = False
+        if not complete:
+            # Double the pending text, so re-parsing a huge item stays linear overall
+            fill(max(chunk_size, len(buf) - pos))
+            continue
+        pos = end
+        yield item
+        token = next_token()
+        pos += 1
+        if token == "]":
+            return
+        if token != ",":
+            raise json.JSONDecodeError("Expecting ',' delimiter", buf, pos - 1)
+
+
+def iter_dataset_rows(
+    filename: str, columns: Optional[List[str]] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the rows of a .json, .jsonl or .parquet file (JSON optionally .gz/.zst
+    compressed). With `columns`, rows keep only those fields; Parquet then reads no
+    other column at all.
+    """
+    ext = dataset_ext(filename)
+    if ext == ".parquet":
+        if columns is not None:
+            _check_parquet_uncompressed(filename)
+            _, pq = _import_pyarrow()
+            names = set(pq.ParquetFile(filename).schema_arrow.names)
+            columns = [column for column in columns if column in names]
+        yield from iter_parquet_rows(filename, columns=columns)
+        return
+    if ext not in (".json", ".jsonl"):
+        raise ValueError(
+            "Invalid file format. Please provide a .json, .jsonl or .parquet file."
+        )
+    with open_binary_read(filename) as file:
+        if ext == ".json":
+            rows = iter_json_array(file)
+        else:
+            rows = (json_loads(line) for line in file if line.strip())
+        for row in rows:
+            if columns is not None:
+                row = {column: row[column] for column in columns if column in row}
+            yield row
+
+
 # Load dataset
 def load_dataset_from_file(filename):
-    # if the file is json
-    if filename.endswith(".json"):
-        with open(filename, "r") as file:
-            return json.load(file)
-    elif filename.endswith(".jsonl"):
+    ext = dataset_ext(filename)
+    # if the file is json (optionally .gz/.zst compressed)
+    if ext == ".json":
+        with open_binary_read(filename) as file:
+            return json_loads(file.read())
+    elif ext == ".jsonl":
         return load_jsonl_to_list(filename)
+    elif ext == ".parquet":
+        return list(iter_parquet_rows(filename))
     else:
-        raise ValueError("Invalid file format. Please provide a .json or .jsonl file.")
+        raise ValueError(
+            "Invalid file format. Please provide a .json, .jsonl or .parquet file."
+        )
 
 
 # Save dataset
-def save_dataset(data: list, file_path: str, ext: str = ".jsonl"):
-    if ext == ".jsonl":
-        with open(file_path, "w", encoding="utf-8") as file:
-            for obj in data:
-                file.write(json.dumps(obj, ensure_ascii=False) + "\n")
-    elif ext == ".json":
-        with open(file_path, "w", encoding="utf-8") as file:
-            json.dump(data, file, ensure_ascii=False, indent=2)
+def save_dataset(
+    data: list,
+    file_path: str,
+    ext: str = ".jsonl",
+    compact: bool = False,
+    field_types: Optional[Dict[str, str]] = None,
+):
+    """
+    Stream the dataset to a .jsonl, .json or .parquet file (compact drops the .json
+    indentation; Parquet columns are typed by field_types, the rest inferred from all rows).
+    JSON outputs ending in .gz/.zst are compressed. Rows may be any Mapping, e.g. the
+    RowViews of a ColumnarDataset.
+    """
+    if ext == ".parquet":
+        _check_parquet_uncompressed(file_path)
+        writer = ParquetWriter(file_path, field_types=field_types, schema_rows=data)
     else:
-        raise ValueError("Invalid file format. Please provide a .json or .jsonl file.")
+        writer = open_dataset_writer(file_path, ext, compact=compact)
+    with writer:
+        writer.write_many(data)
 
 
 # UUID
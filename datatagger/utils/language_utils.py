@@ -0,0 +1,191 @@
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Detectors shared by every tagger of the process, keyed by their build options
+_DETECTOR_CACHE: Dict[Tuple, Any] = {}
+_DETECTOR_LOCK = threading.Lock()
+
+_LATIN = "A-Za-z\u00c0-\u00d6\u00d8-\u00f6\u00f8-\u024f\u1e00-\u1eff"
+_HAN = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+_KANA = "\u3040-\u30ff\u31f0-\u31ff\uff66-\uff9f"
+_HANGUL = "\u1100-\u11ff\u3130-\u318f\uac00-\ud7af"
+
+# (letters allowed in the text, letters the text must contain, lingua languages using the script)
+# Checked in order, the first script whose ranges cover every letter of the text wins.
+_SCRIPTS = [
+    (_HAN, None, ("ZH",)),
+    (_HAN + _KANA, _KANA, ("JA",)),
+    (_HAN + _HANGUL, _HANGUL, ("KO",)),
+    ("\u0e00-\u0e7f", None, ("TH",)),
+    ("\u0370-\u03ff\u1f00-\u1fff", None, ("EL",)),
+    ("\u0590-\u05ff", None, ("HE",)),
+    ("\u0530-\u058f", None, ("HY",)),
+    ("\u10a0-\u10ff", None, ("KA",)),
+    ("\u0980-\u09ff", None, ("BN",)),
+    ("\u0a80-\u0aff", None, ("GU",)),
+    ("\u0a00-\u0a7f", None, ("PA",)),
+    ("\u0b80-\u0bff", None, ("TA",)),
+    ("\u0c00-\u0c7f", None, ("TE",)),
+    ("\u0900-\u097f", None, ("HI", "MR")),
+    ("\u0600-\u06ff\u0750-\u077f", None, ("AR", "FA", "UR")),
+    ("\u0400-\u04ff", None, ("BE", "BG", "KK", "MK", "MN", "RU", "SR", "UK")),
+    (
+        _LATIN,
+        None,
+        tuple(
+            "AF AZ BS CA CS CY DA DE EN EO ES ET EU FI FR GA HR HU ID IS IT LA LG LT "
+            "LV MI MS NB NL NN PL PT RO SK SL SN SO SQ ST SV SW TL TN TR TS VI XH YO "
+            "ZU".split()
+        ),
+    ),
+]
+_NON_LETTER_RE = re.compile(r"[\W\d_]+")
+
+
+def _current_rss_mb() -> Optional[float]:
+    """Resident set size of the current process in MB, None if unavailable."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def get_language_detector(
+    languages: Optional[Sequence[str]] = None,
+    low_accuracy: bool = False,
+    preload: bool = False,
+    logger=None,
+):
+    """
+    Build (once per process) a lingua detector.
+    :param languages: ISO 639-1 codes of the candidate languages, None for all 75 languages
+    :param low_accuracy: use lingua's low accuracy mode (trigram models only, much less memory)
+    :param preload: load all language models eagerly instead of on first detection
+    :param logger: logger reporting build time and memory
+    """
+    codes = (
+        tuple(sorted({code.strip().upper() for code in languages}))
+        if languages
+        else None
+    )
+    key = (codes, low_accuracy, preload)
+    with _DETECTOR_LOCK:
+        detector = _DETECTOR_CACHE.get(key)
+        if detector is not None:
+            if logger:
+                logger.info("Reusing cached language detector")
+            return detector
+
+        from lingua import IsoCode639_1, LanguageDetectorBuilder
+
+        start = time.perf_counter()
+        rss_before = _current_rss_mb()
+        if codes:
+            try:
+                iso_codes = [getattr(IsoCode639_1, code) for code in codes]
+            except AttributeError as e:
+                raise ValueError(f"Unsupported ISO 639-1 language code: {e}") from e
+            if len(iso_codes) < 2:
+                raise ValueError(
+                    f"lingua needs at least two candidate languages, got: {list(codes)}"
+                )
+            builder = LanguageDetectorBuilder.from_iso_codes_639_1(*iso_codes)
+        else:
+            builder = LanguageDetectorBuilder.from_all_languages()
+        if low_accuracy:
+            builder = builder.with_low_accuracy_mode()
+        if preload:
+            builder = builder.with_preloaded_language_models()
+        detector = builder.build()
+        elapsed = time.perf_counter() - start
+        rss_after = _current_rss_mb()
+
+        if logger:
+            memory = (
+                f"{rss_after - rss_before:.1f} MB"
+                if rss_before is not None and rss_after is not None
+                else "unknown"
+            )
+            logger.info(
+                f"Language detector built in {elapsed:.2f}s, RSS delta {memory} "
+                f"(languages: {list(codes) if codes else 'all'}, "
+                f"low_accuracy: {low_accuracy}, preload: {preload})"
+            )
+            if not preload:
+                logger.info(
+                    "Language models load lazily, the first batches include model loading time"
+                )
+        _DETECTOR_CACHE[key] = detector
+        return detector
+
+
+class ScriptClassifier:
+    """
+    Settle unambiguous texts by Unicode script without running the model.
+    A text whose letters all belong to one script is assigned directly when exactly
+    one candidate language uses that script (pure Han -> ZH, Hangul -> KO, Latin
+    -> EN when EN is the only Latin candidate, ...). Mixed or ambiguous texts
+    return None and go to lingua.
+    """
+
+    def __init__(self, languages: Optional[Sequence[str]] = None):
+        candidates = {code.strip().upper() for code in languages} if languages else None
+        self._rules = []
+        for allowed, required, codes in _SCRIPTS:
+            matching = [c for c in codes if candidates is None or c in candidates]
+            self._rules.append(
+                (
+                    re.compile(f"[{allowed}]+"),
+                    re.compile(f"[{required}]") if required else None,
+                    matching[0] if len(matching) == 1 else None,
+                )
+            )
+
+    def classify(self, text: str) -> Optional[str]:
+        letters = _NON_LETTER_RE.sub("", text)
+        if not letters:
+            return None
+        for allowed_re, required_re, code in self._rules:
+            if allowed_re.fullmatch(letters) and (
+                required_re is None or required_re.search(letters)
+            ):
+                return code
+        return None
+
+
+def detect_languages(
+    detector,
+    texts: Sequence[Any],
+    languages: Optional[Sequence[str]] = None,
+) -> Tuple[List[Optional[str]], int]:
+    """
+    Detect the ISO 639-1 code of every text.
+    Unambiguous scripts are settled by ScriptClassifier, the rest is sent to lingua
+    in one multi-threaded detect_languages_in_parallel_of call.
+    :param languages: candidate languages the detector was built with, None for all
+    :return: (codes, number of texts settled by script)
+    """
+    classifier = ScriptClassifier(languages)
+    results: List[Optional[str]] = [None] * len(texts)
+    model_positions, model_texts = [], []
+    by_script = 0
+    for i, text in enumerate(texts):
+        if not isinstance(text, str) or not text:
+            continue
+        code = classifier.classify(text)
+        if code is not None:
+            results[i] = code
+            by_script += 1
+        else:
+            model_positions.append(i)
+            model_texts.append(text)
+    if model_texts:
+        detected = detector.detect_languages_in_parallel_of(model_texts)
+        for i, language in zip(model_positions, detected):
+            results[i] = language.iso_code_639_1.name if language is not None else None
+    return results, by_script
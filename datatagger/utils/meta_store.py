@@ -0,0 +1,257 @@
+import hashlib
+import json
+import mmap
+import os
+import pickle
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+
+# Fields shared by every embedding store: `id` is the vector id (the position in the
+# store), `row_key` the dataset row the vector was computed from, `content_hash` the
+# 64-bit hash of `meta` (the embedded prompt).
+META_FIELDS = ("id", "row_key", "content_hash", "meta")
+# Longest meta Milvus accepts in a VARCHAR field
+MAX_META_LENGTH = 65535
+
+# Fixed-size record of a meta: where its UTF-8 bytes live in the string table
+RECORD_DTYPE = np.dtype(
+    [
+        ("offset", "<i8"),
+        ("length", "<i4"),
+        ("row_key", "<i8"),
+        ("content_hash", "<i8"),
+    ]
+)
+
+
+def _hash_bytes(data: bytes) -> int:
+    digest = hashlib.blake2b(data, digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+def content_hash(text: str) -> int:
+    """Stable signed 64-bit hash of a meta (Milvus has no unsigned integers)."""
+    return _hash_bytes(text.encode("utf-8"))
+
+
+def _encode(
+    metas: Sequence[Optional[str]],
+    row_keys: Optional[Iterable[int]],
+    start_offset: int,
+):
+    """Return the string table bytes and the records of metas stored from start_offset."""
+    encoded = [(m or "").encode("utf-8") for m in metas]
+    lengths = np.fromiter((len(b) for b in encoded), dtype="int64", count=len(encoded))
+    records = np.empty(len(encoded), dtype=RECORD_DTYPE)
+    records["length"] = lengths
+    records["offset"] = start_offset + np.cumsum(lengths) - lengths
+    records["row_key"] = (
+        np.fromiter(row_keys, dtype="int64", count=len(encoded))
+        if row_keys is not None
+        else -1
+    )
+    records["content_hash"] = [_hash_bytes(b) for b in encoded]
+    return b"".join(encoded), records
+
+
+def store_prefix(meta_file: str) -> str:
+    """Meta store files are named after meta_file without its legacy .pkl suffix."""
+    return meta_file[: -len(".pkl")] if meta_file.endswith(".pkl") else meta_file
+
+
+class MetaStore:
+    """
+    Append-only store of the metas of an embedding index, addressed by vector id.
+
+    Strings live back to back in `<prefix>.strings`, `<prefix>.records` holds one
+    fixed-size record (offset, length, row_key, content_hash) per id. Opening the store
+    reads the records only (memory-mapped when read-only), strings are sliced from a
+    memory map on demand. Lookups by content go through a sorted hash index built on
+    first use. A legacy `<prefix>.pkl` list of metas (plus its `.pkl.log` insert log)
+    is migrated on first open.
+    """
+
+    def __init__(self, meta_file: str, read_only: bool = False):
+        prefix = store_prefix(meta_file)
+        self.strings_file = f"{prefix}.strings"
+        self.records_file = f"{prefix}.records"
+        self.legacy_file = f"{prefix}.pkl"
+        self.read_only = read_only
+        self._tail: List[np.ndarray] = []
+        self._map: Optional[mmap.mmap] = None
+        self._hash_index = None
+        if not os.path.exists(self.records_file):
+            if read_only:
+                raise FileNotFoundError(
+                    f"Meta store not found: {self.records_file}"
+                    + (
+                        f", open it once for writing to migrate {self.legacy_file}"
+                        if os.path.exists(self.legacy_file)
+                        else ""
+                    )
+                )
+            self._create()
+        if read_only:
+            count = os.path.getsize(self.records_file) // RECORD_DTYPE.itemsize
+            self._records = (
+                np.memmap(self.records_file, dtype=RECORD_DTYPE, mode="r", shape=count)
+                if count
+                else np.empty(0, dtype=RECORD_DTYPE)
+            )
+            self._strings_size = os.path.getsize(self.strings_file)
+        else:
+            self._load_for_append()
+
+    def _create(self):
+        if os.path.dirname(self.records_file):
+            os.makedirs(os.path.dirname(self.records_file), exist_ok=True)
+        metas = []
+        if os.path.exists(self.legacy_file):
+            with open(self.legacy_file, "rb") as f:
+                metas = pickle.load(f)
+            metas.extend(self._read_legacy_log(len(metas)))
+        strings, records = _encode(metas, None, 0)
+        # Written under temporary names so an interrupted migration starts over
+        for path, data in [
+            (self.strings_file, strings),
+            (self.records_file, records.tobytes()),
+        ]:
+            with open(path + ".tmp", "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(self.strings_file + ".tmp", self.strings_file)
+        os.replace(self.records_file + ".tmp", self.records_file)
+
+    def _read_legacy_log(self, start: int) -> List[str]:
+        """Metas of the legacy JSONL insert log that are newer than the pickle."""
+        log_file = f"{self.legacy_file}.log"
+        if not os.path.exists(log_file):
+            return []
+        metas = []
+        with open(log_file, "rb") as f:
+            base = json.loads(f.readline())["base"]
+            for position, line in enumerate(f, base):
+                if not line.endswith(b"\n"):
+                    break
+                if position >= start:
+                    metas.append(json.loads(line))
+        return metas
+
+    def _load_for_append(self):
+        """Load the records and drop a record or string torn by a crash."""
+        count = os.path.getsize(self.records_file) // RECORD_DTYPE.itemsize
+        records = np.fromfile(self.records_file, dtype=RECORD_DTYPE, count=count)
+        strings_size = os.path.getsize(self.strings_file)
+        ends = records["offset"] + records["length"]
+        # Strings are written before their records, a record past the end is torn
+        while count and ends[count - 1] > strings_size:
+            count -= 1
+        self._records = records[:count]
+        self._strings_size = int(ends[count - 1]) if count else 0
+        self._truncate_files()
+        self._strings = open(self.strings_file, "ab")
+        self._records_out = open(self.records_file, "ab")
+
+    def _truncate_files(self):
+        with open(self.strings_file, "r+b") as f:
+            f.truncate(self._strings_size)
+        with open(self.records_file, "r+b") as f:
+            f.truncate(len(self._records) * RECORD_DTYPE.itemsize)
+
+    @property
+    def records(self) -> np.ndarray:
+        if self._tail:
+            self._records = np.concatenate([self._records, *self._tail])
+            self._tail = []
+        return self._records
+
+    def __len__(self) -> int:
+        return len(self._records) + sum(len(t) for t in self._tail)
+
+    def append(
+        self, metas: Sequence[Optional[str]], row_keys: Optional[Iterable[int]] = None
+    ) -> List[int]:
+        """Append metas (and the dataset rows they come from), return their ids."""
+        if self.read_only:
+            raise RuntimeError(f"Meta store {self.records_file} is opened read-only")
+        strings, records = _encode(metas, row_keys, self._strings_size)
+        self._strings.write(strings)
+        self._strings.flush()
+        os.fsync(self._strings.fileno())
+        self._records_out.write(records.tobytes())
+        self._records_out.flush()
+        os.fsync(self._records_out.fileno())
+        start_id = len(self)
+        self._tail.append(records)
+        self._strings_size += len(strings)
+        self._hash_index = None
+        return list(range(start_id, start_id + len(records)))
+
+    def truncate(self, count: int):
+        """Drop every meta from id `count` on (used to realign with the vector log)."""
+        if count >= len(self):
+            return
+        records = self.records[:count]
+        self._records = records
+        self._strings_size = (
+            int(records["offset"][-1] + records["length"][-1]) if count else 0
+        )
+        self._hash_index = None
+        self._close_map()
+        for f in (self._strings, self._records_out):
+            f.close()
+        self._truncate_files()
+        self._strings = open(self.strings_file, "ab")
+        self._records_out = open(self.records_file, "ab")
+
+    def _strings_view(self):
+        if self._map is None or len(self._map) < self._strings_size:
+            self._close_map()
+            if self._strings_size == 0:
+                return b""
+            with open(self.strings_file, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def _close_map(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def get(self, ids: Sequence[int]) -> List[Optional[str]]:
+        """Metas of the given ids, None for ids outside the store."""
+        records = self.records
+        view = self._strings_view()
+        results = []
+        for i in ids:
+            if 0 <= i < len(records):
+                offset, length = int(records["offset"][i]), int(records["length"][i])
+                results.append(view[offset : offset + length].decode("utf-8"))
+            else:
+                results.append(None)
+        return results
+
+    def row_keys(self, ids: Sequence[int]) -> np.ndarray:
+        return self.records["row_key"][np.asarray(ids, dtype="int64")]
+
+    def find_ids(self, meta: str) -> List[int]:
+        """Ids of every stored copy of `meta`, in insertion order."""
+        if self._hash_index is None:
+            hashes = self.records["content_hash"]
+            order = np.argsort(hashes, kind="stable")
+            self._hash_index = (hashes[order], order)
+        sorted_hashes, order = self._hash_index
+        target = content_hash(meta)
+        lo = np.searchsorted(sorted_hashes, target, side="left")
+        hi = np.searchsorted(sorted_hashes, target, side="right")
+        candidates = [int(i) for i in order[lo:hi]]
+        # Confirm the content, 64-bit hashes can collide
+        return [i for i, m in zip(candidates, self.get(candidates)) if m == meta]
+
+    def close(self):
+        self._close_map()
+        if not self.read_only:
+            for f in (self._strings, self._records_out):
+                f.close()
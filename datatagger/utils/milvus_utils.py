@@ -1,58 +1,306 @@
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
-from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, connections
+import numpy as np
+from pymilvus import (
+    Collection,
+    CollectionSchema,
+    DataType,
+    FieldSchema,
+    connections,
+    utility,
+)
+
+from datatagger.utils.meta_store import MAX_META_LENGTH, content_hash
+
+# Largest number of ids Milvus accepts in one query expression
+_QUERY_BATCH = 16384
 
 
 class MilvusClient:
+    """
+    Milvus embedding store.
+
+    Inserts are buffered and sent in chunks of `insert_batch_size` rows; the segment
+    flush only happens in flush() (called at checkpoints) and close(). Ids are assigned
+    by the client, so they are known before the rows reach the server. The vector
+    index (`index_type`: HNSW, IVF_FLAT, IVF_SQ8, FLAT, AUTOINDEX, ...) is built and the
+    collection loaded by prepare_search() before the first search.
+
+    Connects to `uri` when given (a local file such as "data/milvus.db" uses
+    milvus-lite, which supports FLAT, IVF_FLAT and AUTOINDEX), else to host:port.
+    Without an `index_type`, HNSW is built on a server and AUTOINDEX on milvus-lite.
+    """
+
     def __init__(
         self,
         host: str = "localhost",
         port: str = "19530",
         collection_name: str = "embeddings",
         dim: int = 768,
+        uri: Optional[str] = None,
+        index_type: Optional[str] = None,
+        index_params: Optional[Dict] = None,
+        ef_search: int = 64,
+        nprobe: int = 16,
+        insert_batch_size: int = 10000,
     ):
         self.host = host
         self.port = port
+        self.uri = uri
         self.collection_name = collection_name
         self.dim = dim
+        if index_type is None:
+            index_type = "AUTOINDEX" if self.is_local_uri(uri) else "HNSW"
+        self.index_type = index_type
+        self.index_params = (
+            index_params
+            if index_params is not None
+            else self.default_index_params(index_type)
+        )
+        if index_type == "HNSW":
+            self.search_params = {"ef": ef_search}
+        elif index_type.startswith("IVF"):
+            self.search_params = {"nprobe": nprobe}
+        else:
+            self.search_params = {}
+        self.insert_batch_size = insert_batch_size
+        self._buffer: List[Tuple] = []
+        self._buffered_rows = 0
         self._connect()
         self._create_collection_if_not_exists()
 
+    @staticmethod
+    def is_local_uri(uri: Optional[str]) -> bool:
+        """Whether uri is a local milvus-lite file rather than a server address."""
+        return bool(uri) and "://" not in uri
+
+    @staticmethod
+    def default_index_params(index_type: str) -> Dict:
+        if index_type == "HNSW":
+            return {"M": 16, "efConstruction": 200}
+        if index_type.startswith("IVF"):
+            return {"nlist": 1024}
+        return {}
+
     def _connect(self):
-        connections.connect(alias="default", host=self.host, port=self.port)
+        if self.uri:
+            connections.connect(alias="default", uri=self.uri)
+        else:
+            connections.connect(alias="default", host=self.host, port=self.port)
 
     def _create_collection_if_not_exists(self):
-        if self.collection_name in [col for col in Collection.list()]:
+        if utility.has_collection(self.collection_name):
             self.collection = Collection(self.collection_name)
-            return
-        fields = [
-            FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
-            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=self.dim),
-            FieldSchema(
-                name="meta", dtype=DataType.VARCHAR, max_length=512, is_primary=False
-            ),
-        ]
-        schema = CollectionSchema(fields, description="Embedding collection")
-        self.collection = Collection(self.collection_name, schema)
-        self.collection.load()
+        else:
+            # Same meta schema as the local Faiss MetaStore (id, row_key, content_hash, meta)
+            fields = [
+                FieldSchema(
+                    name="id", dtype=DataType.INT64, is_primary=True, auto_id=False
+                ),
+                FieldSchema(
+                    name="embedding", dtype=DataType.FLOAT_VECTOR, dim=self.dim
+                ),
+                FieldSchema(name="row_key", dtype=DataType.INT64),
+                FieldSchema(name="content_hash", dtype=DataType.INT64),
+                FieldSchema(
+                    name="meta",
+                    dtype=DataType.VARCHAR,
+                    max_length=MAX_META_LENGTH,
+                    is_primary=False,
+                ),
+            ]
+            schema = CollectionSchema(fields, description="Embedding collection")
+            self.collection = Collection(self.collection_name, schema)
+        self._set_meta_length()
+        self._loaded = False
+        if not self.auto_id:
+            # Seal rows a previous run inserted without flushing, then continue after them
+            self.collection.flush()
+            self._next_id = self.collection.num_entities
+
+    def _set_meta_length(self):
+        """Read the meta length limit and layout of the collection (older ones lack row_key/content_hash)."""
+        fields = {field.name: field for field in self.collection.schema.fields}
+        self.legacy_schema = "content_hash" not in fields
+        self.auto_id = fields["id"].auto_id
+        self.max_meta_length = fields["meta"].params.get("max_length", MAX_META_LENGTH)
 
     def insert_embeddings(
-        self, embeddings: List[List[float]], metas: Optional[List[str]] = None
-    ):
+        self,
+        embeddings: List[List[float]],
+        metas: Optional[List[str]] = None,
+        row_keys: Optional[List[int]] = None,
+    ) -> List[int]:
+        """
+        Buffer embeddings for insertion and return their primary keys.
+        Rows are searchable after flush(); collections created with auto_id (older
+        versions of this client) are inserted immediately to learn their keys.
+        """
         n = len(embeddings)
         if metas is None:
             metas = [""] * n
-        # None 对应 id
-        self.collection.insert([None, embeddings, metas])
+        # VARCHAR max_length counts UTF-8 bytes, hashes cover the full meta
+        stored_metas = [
+            m.encode("utf-8")[: self.max_meta_length].decode("utf-8", "ignore")
+            for m in metas
+        ]
+        if self.auto_id:
+            columns = [embeddings, stored_metas]
+            if not self.legacy_schema:
+                columns[1:1] = [
+                    row_keys if row_keys is not None else [-1] * n,
+                    [content_hash(m) for m in metas],
+                ]
+            result = self.collection.insert(columns)
+            self._loaded = False
+            return list(result.primary_keys)
+        ids = list(range(self._next_id, self._next_id + n))
+        self._next_id += n
+        self._buffer.append(
+            (
+                ids,
+                embeddings,
+                row_keys if row_keys is not None else [-1] * n,
+                [content_hash(m) for m in metas],
+                stored_metas,
+            )
+        )
+        self._buffered_rows += n
+        if self._buffered_rows >= self.insert_batch_size:
+            self._send_buffer()
+        return ids
+
+    def _send_buffer(self):
+        if not self._buffer:
+            return
+        columns = [
+            [value for chunk in self._buffer for value in chunk[i]]
+            for i in range(len(self._buffer[0]))
+        ]
+        self.collection.insert(columns)
+        self._buffer = []
+        self._buffered_rows = 0
+        self._loaded = False
+
+    @property
+    def next_id(self) -> int:
+        """Primary key the next insert gets (collections with auto_id have none)."""
+        if self.auto_id:
+            raise RuntimeError(f"Collection {self.collection_name} assigns ids itself")
+        return self._next_id
+
+    def truncate(self, count: int) -> int:
+        """
+        Delete the rows with ids >= count, e.g. those a killed run sent after its last
+        dataset checkpoint, so ids continue from count.
+        :return: number of dropped ids
+        """
+        if self.auto_id:
+            raise RuntimeError(f"Collection {self.collection_name} assigns ids itself")
+        dropped = self._next_id - count
+        if dropped <= 0:
+            return 0
+        self._buffer = []
+        self._buffered_rows = 0
+        self.collection.delete(expr=f"id >= {count}")
         self.collection.flush()
+        self._next_id = count
+        self._loaded = False
+        return dropped
+
+    def flush(self):
+        """Send buffered rows and seal them into persisted segments."""
+        self._send_buffer()
+        self.collection.flush()
+
+    def close(self):
+        self.flush()
+        connections.disconnect("default")
+
+    def prepare_search(self):
+        """Flush, build the vector index if the collection has none, and load it."""
+        if self._loaded:
+            return
+        self.flush()
+        if not self.collection.has_index():
+            self.collection.create_index(
+                field_name="embedding",
+                index_params={
+                    "index_type": self.index_type,
+                    "metric_type": "L2",
+                    "params": self.index_params,
+                },
+            )
+        self.collection.load()
+        self._loaded = True
+
+    def _search_param(self) -> Dict:
+        return {"metric_type": "L2", "params": self.search_params}
 
     def search(self, embedding: List[float], top_k: int = 5):
-        search_params = {"metric_type": "L2", "params": {"nprobe": 10}}
+        self.prepare_search()
         results = self.collection.search(
             data=[embedding],
             anns_field="embedding",
-            param=search_params,
+            param=self._search_param(),
             limit=top_k,
             output_fields=["meta"],
         )
         return results
+
+    def search_batch(
+        self, queries: np.ndarray, top_k: int = 5
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search many query vectors in one request, returns (distances, ids) of shape
+        (n, top_k), padded with inf and -1 like Faiss.
+        """
+        self.prepare_search()
+        results = self.collection.search(
+            data=np.asarray(queries, dtype="float32").tolist(),
+            anns_field="embedding",
+            param=self._search_param(),
+            limit=top_k,
+        )
+        distances = np.full((len(queries), top_k), np.inf, dtype="float32")
+        ids = np.full((len(queries), top_k), -1, dtype="int64")
+        for i, hits in enumerate(results):
+            hit_ids = list(hits.ids)
+            ids[i, : len(hit_ids)] = hit_ids
+            distances[i, : len(hit_ids)] = list(hits.distances)
+        return distances, ids
+
+    def _query_by_ids(self, ids: List[int], field: str) -> Dict[int, object]:
+        values = {}
+        unique_ids = sorted({int(i) for i in ids if i >= 0})
+        for start in range(0, len(unique_ids), _QUERY_BATCH):
+            chunk = unique_ids[start : start + _QUERY_BATCH]
+            for row in self.collection.query(
+                expr=f"id in {chunk}",
+                output_fields=[field],
+                consistency_level="Strong",
+            ):
+                values[row["id"]] = row[field]
+        return values
+
+    def reconstruct_batch(self, ids: List[int]) -> np.ndarray:
+        """Return the stored vectors of the given ids as a (n, dim) float32 array."""
+        self.prepare_search()
+        vectors = self._query_by_ids(list(ids), "embedding")
+        return np.array([vectors[int(i)] for i in ids], dtype="float32").reshape(
+            len(ids), self.dim
+        )
+
+    def get_row_keys(self, ids: List[int]) -> np.ndarray:
+        """Dataset row each vector was stored for (-1 when unknown)."""
+        if self.legacy_schema:
+            return np.full(len(ids), -1, dtype="int64")
+        self.prepare_search()
+        row_keys = self._query_by_ids(list(ids), "row_key")
+        return np.array([row_keys.get(int(i), -1) for i in ids], dtype="int64")
+
+    def get_metas(self, ids: List[int]) -> List[Optional[str]]:
+        """Stored metas of the given ids (truncated to the VARCHAR limit), None if missing."""
+        self.prepare_search()
+        metas = self._query_by_ids(list(ids), "meta")
+        return [metas.get(int(i)) for i in ids]
@@ -0,0 +1,195 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+
+from datatagger.utils.dedup_utils import UnionFind
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_NON_WORD_RE = re.compile(r"[\W_]+")
+# Chunk of texts hashed by one worker task
+_CHUNK_SIZE = 2000
+# LSH buckets up to this size are verified pairwise, larger ones as a chain of
+# consecutive members (identical texts form huge buckets, all pairs would not fit)
+_MAX_PAIRWISE_BUCKET = 32
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and drop punctuation/whitespace runs, so trivial variations shingle alike."""
+    return _NON_WORD_RE.sub(" ", text.lower()).strip()
+
+
+def _shingle_hashes(text: str, ngram: int) -> np.ndarray:
+    """32-bit hashes of the character n-grams of a normalized text (vectorized rolling hash)."""
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype="<u4").astype("uint64")
+    if len(codes) < ngram:
+        ngram = len(codes)
+    hashes = np.zeros(len(codes) - ngram + 1, dtype="uint64")
+    for offset in range(ngram):
+        hashes = (
+            hashes * np.uint64(1000003) + codes[offset : offset + len(hashes)]
+        ) & _MAX_HASH
+    return np.unique(hashes)
+
+
+def _permutations(num_perm: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 1 << 31, size=num_perm, dtype="uint64")
+    b = rng.integers(0, 1 << 31, size=num_perm, dtype="uint64")
+    return a, b
+
+
+def _signature_chunk(args) -> np.ndarray:
+    texts, num_perm, ngram, seed = args
+    a, b = _permutations(num_perm, seed)
+    signatures = np.full((len(texts), num_perm), _MAX_HASH, dtype="uint64")
+    for i, text in enumerate(texts):
+        if not text:
+            continue
+        hashes = _shingle_hashes(text, ngram)
+        # a < 2^31 and hashes < 2^32, so a * h + b fits in uint64
+        permuted = (hashes[None, :] * a[:, None] + b[:, None]) % _MERSENNE_PRIME
+        signatures[i] = (permuted & _MAX_HASH).min(axis=1)
+    return signatures.astype("uint32")
+
+
+def iter_signature_chunks(
+    texts: Sequence[str],
+    num_perm: int = 128,
+    ngram: int = 5,
+    seed: int = 1,
+    workers: int = 1,
+) -> Iterator[np.ndarray]:
+    """uint32 MinHash signatures of consecutive chunks of _CHUNK_SIZE texts, in order."""
+    normalized = [normalize_text(t) if isinstance(t, str) else "" for t in texts]
+    chunks = [
+        (normalized[start : start + _CHUNK_SIZE], num_perm, ngram, seed)
+        for start in range(0, len(normalized), _CHUNK_SIZE)
+    ]
+    if workers <= 1 or len(chunks) <= 1:
+        yield from map(_signature_chunk, chunks)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(_signature_chunk, chunks)
+
+
+def minhash_signatures(
+    texts: Sequence[str],
+    num_perm: int = 128,
+    ngram: int = 5,
+    seed: int = 1,
+    workers: int = 1,
+) -> np.ndarray:
+    """(n, num_perm) uint32 MinHash signatures of the normalized texts, hashed in `workers` processes."""
+    parts = list(iter_signature_chunks(texts, num_perm, ngram, seed, workers))
+    if not parts:
+        return np.zeros((0, num_perm), dtype="uint32")
+    return np.concatenate(parts)
+
+
+def _band_keys(signatures: np.ndarray, bands: int) -> np.ndarray:
+    """(n, bands) uint64 hash of each band of the signatures (wrapping polynomial hash)."""
+    rows_per_band = signatures.shape[1] // bands
+    banded = signatures.reshape(len(signatures), bands, rows_per_band).astype("uint64")
+    keys = np.zeros((len(signatures), bands), dtype="uint64")
+    for row in range(rows_per_band):
+        keys = keys * np.uint64(0x9E3779B97F4A7C15) + banded[:, :, row]
+    return keys
+
+
+def _bucket_pairs(keys: np.ndarray, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Candidate pairs of rows sharing a band key: every pair of a bucket of up to
+    _MAX_PAIRWISE_BUCKET rows, consecutive members of larger buckets.
+    """
+    order = np.argsort(keys, kind="stable")
+    keys, rows = keys[order], rows[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    sizes = np.diff(np.r_[starts, len(keys)])
+    small = np.repeat(sizes <= _MAX_PAIRWISE_BUCKET, sizes)
+    firsts, seconds = [], []
+    for distance in range(1, min(_MAX_PAIRWISE_BUCKET, len(keys))):
+        same = keys[distance:] == keys[:-distance]
+        if distance > 1:
+            same &= small[distance:]
+        if not same.any():
+            break
+        firsts.append(rows[:-distance][same])
+        seconds.append(rows[distance:][same])
+    if not firsts:
+        return np.zeros(0, dtype="int64"), np.zeros(0, dtype="int64")
+    return np.concatenate(firsts), np.concatenate(seconds)
+
+
+def lexical_clusters(
+    texts: Sequence[str],
+    threshold: float = 0.8,
+    num_perm: int = 128,
+    bands: int = 16,
+    ngram: int = 5,
+    workers: Optional[int] = None,
+) -> Tuple[np.ndarray, Dict[str, int]]:
+    """
+    Cluster near-duplicate texts with MinHash + LSH.
+    Texts sharing an LSH bucket (one of `bands` bands of num_perm // bands rows) are
+    candidate pairs, linked when their signatures agree on at least `threshold` of
+    the permutations (the estimated Jaccard similarity); clusters are the connected
+    components. Only band keys are kept for all texts, the signatures of texts that
+    land in a shared bucket are recomputed for the verification. Empty texts stay alone.
+    :return: (cluster id of every text = index of its first member, stats)
+    """
+    if num_perm % bands:
+        raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    n = len(texts)
+    keys = np.zeros((n, bands), dtype="uint64")
+    present = np.zeros(n, dtype=bool)
+    start = 0
+    for signatures in iter_signature_chunks(texts, num_perm, ngram, workers=workers):
+        end = start + len(signatures)
+        keys[start:end] = _band_keys(signatures, bands)
+        # Empty texts keep the all-max signature and are never bucketed
+        present[start:end] = (signatures != np.uint32(_MAX_HASH)).any(axis=1)
+        start = end
+    rows = np.flatnonzero(present)
+    band_pairs = [_bucket_pairs(keys[rows, band], rows) for band in range(bands)]
+    del keys
+
+    # Signatures of the texts in a shared bucket, indexed through position
+    candidates = np.unique(
+        np.concatenate([rows[:0], *(side for pair in band_pairs for side in pair)])
+    )
+    position = np.full(n, -1, dtype="int64")
+    position[candidates] = np.arange(len(candidates))
+    signatures = minhash_signatures(
+        [texts[i] for i in candidates], num_perm, ngram, workers=workers
+    )
+
+    union_find = UnionFind(n)
+    checked = linked = 0
+    for firsts, seconds in band_pairs:
+        # Pairs already connected through earlier bands need no check
+        labels = union_find.labels()
+        open_pairs = labels[firsts] != labels[seconds]
+        firsts, seconds = firsts[open_pairs], seconds[open_pairs]
+        similarity = (
+            signatures[position[firsts]] == signatures[position[seconds]]
+        ).mean(axis=1)
+        similar = similarity >= threshold
+        checked += len(firsts)
+        linked += int(similar.sum())
+        union_find.union_many(firsts[similar], seconds[similar])
+    labels = union_find.labels()
+    num_clusters = int((labels == np.arange(n)).sum())
+    stats = {
+        "rows": n,
+        "clusters": num_clusters,
+        "duplicates": n - num_clusters,
+        "candidate_pairs": checked,
+        "linked_pairs": linked,
+    }
+    return labels, stats
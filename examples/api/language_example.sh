@@ -4,4 +4,6 @@ python -m datatagger.tagger.unified_tagger_api \
   --mission LANGUAGE \
   --input_file data/alpaca_zh_demo.json \
   --output_file data/tagged/alpaca_zh_demo_language.jsonl \
-  --batch_size 8 
\ No newline at end of file
+  --batch_size 8 \
+  --language_detector_languages zh,en,ja,ko \
+  --language_detector_preload True 
\ No newline at end of file
@@ -0,0 +1,77 @@
+import sys
+
+import pytest
+from pydantic import ValidationError
+
+from datatagger.tools import cache_compact
+from datatagger.utils.embedding_cache import EmbeddingCache
+from datatagger.utils.file_utils import save_dataset
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache"), dim=4, model="bge")
+    cache.put_many(["a", "b", "c"], [[1.0, 0, 0, 0], [0, 1.0, 0, 0], [0, 0, 1.0, 0]])
+    cache.close()
+    save_dataset(
+        [{"instruction": "a"}, {"instruction": "c"}],
+        str(tmp_path / "keep.jsonl"),
+        ext=".jsonl",
+    )
+    return str(tmp_path / "cache")
+
+
+def run_tool(monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["datatagger cache-compact", *args])
+    cache_compact.main()
+
+
+def cache_entries(cache_dir):
+    cache = EmbeddingCache(cache_dir, model="bge")
+    try:
+        return len(cache)
+    finally:
+        cache.close()
+
+
+def test_keep_files_requires_model(cache_dir, tmp_path, monkeypatch):
+    with pytest.raises(ValidationError, match="--model is required"):
+        run_tool(
+            monkeypatch,
+            "--embedding_cache_dir",
+            cache_dir,
+            "--keep_files",
+            f'["{tmp_path / "keep.jsonl"}"]',
+        )
+    assert cache_entries(cache_dir) == 3
+
+
+def test_no_matching_entry_refuses_to_compact(cache_dir, tmp_path, monkeypatch):
+    with pytest.raises(SystemExit) as excinfo:
+        run_tool(
+            monkeypatch,
+            "--embedding_cache_dir",
+            cache_dir,
+            "--model",
+            "other-model",
+            "--keep_files",
+            f'["{tmp_path / "keep.jsonl"}"]',
+        )
+    assert excinfo.value.code == 1
+    assert cache_entries(cache_dir) == 3
+
+
+def test_keep_files_keeps_matching_entries(cache_dir, tmp_path, monkeypatch):
+    run_tool(
+        monkeypatch,
+        "--embedding_cache_dir",
+        cache_dir,
+        "--model",
+        "bge",
+        "--keep_files",
+        f'["{tmp_path / "keep.jsonl"}"]',
+    )
+    cache = EmbeddingCache(cache_dir, model="bge")
+    assert len(cache) == 2
+    assert cache.get_many(["a", "b"])[1] is None
+    cache.close()
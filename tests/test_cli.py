@@ -0,0 +1,56 @@
+import json
+import subprocess
+import sys
+import tomllib
+from pathlib import Path
+
+import pytest
+
+from datatagger import cli
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ["vllm", "faiss", "lingua", "transformers", "torch", "openai"]
+
+
+def run_python(code: str) -> str:
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout
+
+
+def test_console_script_points_at_cli_main():
+    with open(ROOT / "pyproject.toml", "rb") as f:
+        scripts = tomllib.load(f)["project"]["scripts"]
+    assert scripts["datatagger"] == "datatagger.cli:main"
+
+
+def test_cli_import_and_help_skip_heavy_dependencies():
+    code = (
+        "import contextlib, io, json, sys\n"
+        "from datatagger import cli\n"
+        "with contextlib.suppress(SystemExit), contextlib.redirect_stdout(io.StringIO()):\n"
+        "    cli.main(['--help'])\n"
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))\n"
+    )
+    assert json.loads(run_python(code)) == []
+
+
+def test_tagger_import_skips_heavy_dependencies():
+    code = (
+        "import json, sys\n"
+        "import datatagger.tagger.unified_tagger_vllm\n"
+        "import datatagger.tagger.unified_tagger_api\n"
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))\n"
+    )
+    assert json.loads(run_python(code)) == []
+
+
+def test_unknown_command_exits_with_usage_error():
+    with pytest.raises(SystemExit) as excinfo:
+        cli.main(["no-such-command"])
+    assert excinfo.value.code == 2
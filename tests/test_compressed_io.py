@@ -0,0 +1,89 @@
+import gzip
+import threading
+
+import pytest
+
+from datatagger.utils.file_utils import (
+    json_loads,
+    load_dataset_from_file,
+    load_jsonl_to_list,
+    open_binary_read,
+    save_dataset,
+)
+
+ROWS = [
+    {"instruction": "x" * 180, "output": f"answer {i}", "id": i} for i in range(50000)
+]
+
+
+@pytest.mark.parametrize(
+    "filename", ["data.jsonl.gz", "data.json.gz", "data.jsonl.zst"]
+)
+def test_compressed_round_trip(tmp_path, filename):
+    if filename.endswith(".zst"):
+        pytest.importorskip("zstandard")
+    path = str(tmp_path / filename)
+    save_dataset(ROWS, path, ext=".jsonl" if ".jsonl" in filename else ".json")
+    assert load_dataset_from_file(path) == ROWS
+
+
+def test_threaded_reader_reads_and_reports_compressed_position(tmp_path):
+    path = tmp_path / "data.jsonl.gz"
+    save_dataset(ROWS, str(path), ext=".jsonl")
+    with gzip.open(path, "rb") as f:
+        expected = f.read()
+    with open_binary_read(str(path)) as f:
+        first = f.readline()
+        head = f.read(5)
+        rest = f.read()
+        assert f.read() == b""
+        assert 0 < f.tell() <= path.stat().st_size
+    assert first + head + rest == expected
+
+
+def test_threaded_reader_rows_match_gzip(tmp_path):
+    path = str(tmp_path / "data.jsonl.gz")
+    save_dataset(ROWS, path, ext=".jsonl")
+    with gzip.open(path, "rb") as f:
+        expected = [json_loads(line) for line in f if line.strip()]
+    assert load_jsonl_to_list(path) == expected
+    with gzip.open(path, "rb") as f, open_binary_read(path) as threaded:
+        assert list(threaded) == list(f)
+
+
+def test_threaded_reader_raises_on_truncated_stream(tmp_path):
+    path = tmp_path / "data.jsonl.gz"
+    save_dataset(ROWS, str(path), ext=".jsonl")
+    data = path.read_bytes()
+    path.write_bytes(data[: len(data) // 2])
+    with pytest.raises(EOFError):
+        load_jsonl_to_list(str(path))
+    with open_binary_read(str(path)) as f:
+        with pytest.raises(EOFError):
+            f.read()
+        # Later reads fail again rather than blocking or reporting a clean end of file
+        errors = []
+
+        def read_again():
+            try:
+                f.read()
+            except EOFError as e:
+                errors.append(e)
+
+        reader = threading.Thread(target=read_again, daemon=True)
+        reader.start()
+        reader.join(timeout=5)
+        assert not reader.is_alive() and len(errors) == 1
+
+
+@pytest.mark.parametrize("lines_read", [0, 1, len(ROWS)])
+def test_threaded_reader_close_stops_thread(tmp_path, lines_read):
+    path = str(tmp_path / "data.jsonl.gz")
+    save_dataset(ROWS, path, ext=".jsonl")
+    f = open_binary_read(path)
+    for _ in range(lines_read):
+        f.readline()
+    thread = f.raw._thread
+    f.close()
+    assert not thread.is_alive()
+    assert f.closed and f.raw.closed
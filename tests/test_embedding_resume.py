@@ -0,0 +1,165 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+from datatagger.settings.base_tagger_setting import (  # noqa: E402
+    BaseTaggerSettings,
+    TagMission,
+)
+from datatagger.tagger.base_tagger import BaseUnifiedTagger  # noqa: E402
+from datatagger.utils.file_utils import load_dataset_from_file, save_dataset  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent.parent
+NUM_ROWS = 20
+KILLED = 17
+
+
+def embed(texts):
+    """Fixed random vector per prompt, far apart from the others."""
+    return [
+        np.random.default_rng(int(text[1:])).random(8).astype("float32").tolist()
+        for text in texts
+    ]
+
+
+def run_embedding(workdir: str, kill_at: int = -1, milvus: bool = False) -> str:
+    """
+    EMBEDDING run over NUM_ROWS rows into Faiss (or a milvus-lite file); os._exit
+    (no cleanup) when reaching row kill_at.
+    """
+    os.chdir(workdir)
+    if milvus:
+        stores = {
+            "milvus_store_embeddings": True,
+            "milvus_uri": os.path.join(workdir, "milvus.db"),
+            "milvus_insert_batch_size": 2,
+        }
+    else:
+        stores = {
+            "faiss_store_embeddings": True,
+            "faiss_index_file": os.path.join(workdir, "faiss.index"),
+            "faiss_meta_file": os.path.join(workdir, "faiss_meta"),
+        }
+    settings = BaseTaggerSettings(
+        _cli_parse_args=False,
+        tag_mission=TagMission.EMBEDDING,
+        input_file=os.path.join(workdir, "data.jsonl"),
+        batch_size=2,
+        checkpoint_every=3,
+        dimension=8,
+        **stores,
+    )
+    tagger = BaseUnifiedTagger(settings)
+
+    def process_batch_fn(batch_indices, dataset):
+        if kill_at in batch_indices:
+            os._exit(KILLED)
+        tagger.embed_and_store(batch_indices, dataset, embed)
+
+    output_file = tagger.get_output_files(
+        settings, tagger.tag_mission, settings.input_file
+    )[0]
+    tagger.generate_and_update_with_checkpoint(
+        dataset=tagger.load_input_dataset(),
+        output_file=output_file,
+        checkpoint_data_file=tagger.checkpoint_data_file,
+        checkpoint_state_file=tagger.checkpoint_state_file,
+        process_batch_fn=process_batch_fn,
+        postprocess_fn=tagger.postprocess_embeddings,
+    )
+    return output_file
+
+
+def kill_run(workdir: str, kill_at: int, milvus: bool = False):
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys; from tests.test_embedding_resume import run_embedding; "
+            "run_embedding(sys.argv[1], int(sys.argv[2]), sys.argv[3] == 'milvus')",
+            workdir,
+            str(kill_at),
+            "milvus" if milvus else "faiss",
+        ],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == KILLED, result.stderr
+
+
+def assert_no_self_matches(output_file: str, dense_ids: bool = True):
+    rows = load_dataset_from_file(output_file)
+    if dense_ids:
+        assert [row["embedding_id"] for row in rows] == list(range(NUM_ROWS))
+    for row in rows:
+        assert row["min_similar_instruction"] != row["instruction"]
+        assert row["min_neighbor_distance"] > 0
+        assert row["repeat_count"] == 0
+
+
+@pytest.fixture
+def workdir(tmp_path):
+    save_dataset(
+        [{"instruction": f"q{i}"} for i in range(NUM_ROWS)],
+        str(tmp_path / "data.jsonl"),
+        ext=".jsonl",
+    )
+    return str(tmp_path)
+
+
+def index_size(workdir: str) -> int:
+    from datatagger.utils.faiss_utils import FaissClient
+
+    client = FaissClient(
+        index_file=os.path.join(workdir, "faiss.index"),
+        meta_file=os.path.join(workdir, "faiss_meta"),
+        dim=8,
+    )
+    size = client.ntotal
+    client.close()
+    return size
+
+
+def test_resume_drops_vectors_stored_after_the_checkpoint(workdir, monkeypatch):
+    monkeypatch.chdir(workdir)
+    # Checkpoints after rows 6 and 12: killed at row 10, rows 6-9 are stored but
+    # not checkpointed
+    kill_run(workdir, kill_at=10)
+    assert index_size(workdir) == 10
+
+    output_file = run_embedding(workdir)
+    assert index_size(workdir) == NUM_ROWS
+    assert_no_self_matches(output_file)
+
+
+def test_resume_after_kill_before_first_checkpoint(workdir, monkeypatch):
+    monkeypatch.chdir(workdir)
+    kill_run(workdir, kill_at=4)
+    output_file = run_embedding(workdir)
+    assert index_size(workdir) == NUM_ROWS
+    assert_no_self_matches(output_file)
+
+
+def test_stale_copies_of_a_row_are_not_its_neighbors(workdir, monkeypatch):
+    monkeypatch.chdir(workdir)
+    kill_run(workdir, kill_at=10)
+    # A checkpoint without embedding_start_ids cannot be reconciled, the copies
+    # of rows 6-9 stay in the index next to their re-inserted vectors
+    state_file = os.path.join(workdir, "data_embedding_checkpoint_state.json")
+    with open(state_file, encoding="utf-8") as f:
+        state = json.load(f)
+    del state["embedding_start_ids"]
+    with open(state_file, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+
+    output_file = run_embedding(workdir)
+    assert index_size(workdir) == NUM_ROWS + 4
+    assert_no_self_matches(output_file, dense_ids=False)
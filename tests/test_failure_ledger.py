@@ -0,0 +1,127 @@
+import os
+
+import pytest
+
+from datatagger.settings.base_tagger_setting import BaseTaggerSettings, TagMission
+from datatagger.tagger.base_tagger import BaseUnifiedTagger
+from datatagger.utils.file_utils import (
+    FailureLedger,
+    load_dataset_from_file,
+    save_dataset,
+)
+
+
+class EngineDown(RuntimeError):
+    pass
+
+
+def make_tagger(input_file, **kwargs):
+    settings = BaseTaggerSettings(
+        _cli_parse_args=False,
+        tag_mission=TagMission.DIFFICULTY,
+        input_file=input_file,
+        batch_size=2,
+        checkpoint_every=1,
+        **kwargs,
+    )
+    return BaseUnifiedTagger(settings)
+
+
+def tag_batch(failing_rows=()):
+    def process_batch_fn(batch_indices, dataset):
+        for idx in batch_indices:
+            if idx in failing_rows:
+                raise EngineDown(f"engine down at row {idx}")
+            dataset[idx].update(intent="ask", knowledge="math", difficulty="easy")
+
+    return process_batch_fn
+
+
+def run(tagger, process_batch_fn):
+    output_file = tagger.get_output_files(
+        tagger.settings, tagger.tag_mission, tagger.settings.input_file
+    )[0]
+    tagger.generate_and_update_with_checkpoint(
+        dataset=tagger.load_input_dataset(),
+        output_file=output_file,
+        checkpoint_data_file=tagger.checkpoint_data_file,
+        checkpoint_state_file=tagger.checkpoint_state_file,
+        process_batch_fn=process_batch_fn,
+    )
+    return output_file
+
+
+def test_failed_batch_is_ledgered_and_retried(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    input_file = str(tmp_path / "data.jsonl")
+    save_dataset(
+        [{"instruction": f"q{i}"} for i in range(10)], input_file, ext=".jsonl"
+    )
+
+    # The engine fails on the third batch: the checkpoint moves past it, so its
+    # rows must be in the ledger
+    tagger = make_tagger(input_file)
+    with pytest.raises(EngineDown):
+        run(tagger, tag_batch(failing_rows={4}))
+    ledger_file = BaseUnifiedTagger.get_failure_ledger_file(
+        str(tmp_path / "data_difficulty.jsonl")
+    )
+    ledger = FailureLedger(ledger_file).load()
+    assert ledger.rows() == [4, 5]
+    assert ledger.reasons() == {"EngineDown": 2}
+
+    # Resuming finishes the remaining rows and keeps the failed ones ledgered
+    output_file = run(make_tagger(input_file), tag_batch())
+    output = load_dataset_from_file(output_file)
+    assert [idx for idx, row in enumerate(output) if row.get("difficulty") is None] == [
+        4,
+        5,
+    ]
+    assert FailureLedger(ledger_file).load().rows() == [4, 5]
+
+    # retry_failed re-processes only the ledgered rows and patches the output
+    processed = []
+
+    def record_batch(batch_indices, dataset):
+        processed.extend(batch_indices)
+        tag_batch()(batch_indices, dataset)
+
+    run(make_tagger(input_file, retry_failed=True), record_batch)
+    assert processed == [4, 5]
+    output = load_dataset_from_file(output_file)
+    assert all(row["difficulty"] == "easy" for row in output)
+    assert [row["instruction"] for row in output] == [f"q{i}" for i in range(10)]
+    assert not os.path.exists(ledger_file)
+
+
+def test_only_rows_failed_at_the_model_are_ledgered(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    input_file = str(tmp_path / "data.jsonl")
+    save_dataset(
+        [{"instruction": f"q{i}" if i % 3 else ""} for i in range(6)],
+        input_file,
+        ext=".jsonl",
+    )
+    tagger = make_tagger(input_file)
+
+    # Empty prompts are never sent; row 4 gets an answer without its fields
+    def process_batch_fn(batch_indices, dataset):
+        for idx in batch_indices:
+            if not dataset[idx]["instruction"]:
+                continue
+            response = '{"intent": "ask"}' if idx == 4 else None
+            if response is None:
+                dataset[idx].update(intent="ask", knowledge="math", difficulty="easy")
+                continue
+            error = tagger.mission_processor.process_response(response, dataset[idx])
+            if error is not None:
+                tagger.record_row_error(idx, error)
+
+    run(tagger, process_batch_fn)
+    ledger = FailureLedger(
+        BaseUnifiedTagger.get_failure_ledger_file(
+            str(tmp_path / "data_difficulty.jsonl")
+        )
+    ).load()
+    assert ledger.rows() == [4]
+    assert ledger.reasons() == {"MissingFields": 1}
@@ -0,0 +1,72 @@
+import warnings
+
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+from datatagger.utils.faiss_utils import FaissClient  # noqa: E402
+
+
+def test_read_only_client_warns_about_unsnapshotted_inserts(tmp_path):
+    index_file = str(tmp_path / "faiss.index")
+    meta_file = str(tmp_path / "faiss_meta")
+    writer = FaissClient(index_file=index_file, meta_file=meta_file, dim=4)
+    writer.insert_embeddings(np.zeros((1, 4), dtype="float32").tolist(), ["first"])
+    writer.close()
+    writer = FaissClient(index_file=index_file, meta_file=meta_file, dim=4)
+    writer.insert_embeddings(np.ones((3, 4), dtype="float32").tolist(), ["a", "b", "c"])
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        FaissClient(index_file=index_file, meta_file=meta_file, dim=4, read_only=True)
+    messages = [w for w in caught if "not in the snapshot" in str(w.message)]
+    assert len(messages) == 1
+    # Reported at the caller, not inside faiss_utils
+    assert messages[0].filename == __file__
+    writer.close()
+
+
+@pytest.mark.parametrize(
+    ("index_factory", "train_size"),
+    [("Flat", 100), ("HNSW8", 100), ("IVF4,Flat", 50), ("IVF4,Flat", 1000)],
+)
+def test_truncate_drops_vectors_and_metas_past_count(
+    tmp_path, index_factory, train_size
+):
+    index_file = str(tmp_path / "faiss.index")
+    meta_file = str(tmp_path / "faiss_meta")
+    vectors = np.random.default_rng(0).random((200, 8), dtype="float32")
+    client = FaissClient(
+        index_file=index_file,
+        meta_file=meta_file,
+        dim=8,
+        index_factory=index_factory,
+        train_size=train_size,
+        snapshot_every=3,
+    )
+    for start in range(0, 160, 10):
+        rows = list(range(start, start + 10))
+        client.insert_embeddings(
+            vectors[start : start + 10].tolist(), [f"row {i}" for i in rows], rows
+        )
+    assert client.truncate(100) == 60
+    assert client.truncate(100) == 0
+    # Ids continue after the kept vectors, also across a restart
+    assert client.insert_embeddings(vectors[100:110].tolist())[0] == 100
+    client.close()
+
+    client = FaissClient(
+        index_file=index_file,
+        meta_file=meta_file,
+        dim=8,
+        index_factory=index_factory,
+        train_size=train_size,
+    )
+    client.prepare_search()
+    assert client.ntotal == client.index.ntotal == 110
+    _, found = client.search_batch(vectors[[5, 150]], 1)
+    assert found[0, 0] == 5
+    assert client.get_metas([5, 99]) == ["row 5", "row 99"]
+    assert client.get_row_keys([5, 99]).tolist() == [5, 99]
+    client.close()
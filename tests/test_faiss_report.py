@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+from datatagger.utils.faiss_utils import evaluate_search_params  # noqa: E402
+
+VECTORS = np.random.default_rng(0).random((2000, 16), dtype="float32")
+
+
+def test_parameters_the_index_lacks_are_reported_as_skipped():
+    report = evaluate_search_params(
+        VECTORS, "IVF16,Flat", nprobe_values=[4], ef_search_values=[32], num_queries=50
+    )
+    rows = {row["param"]: row for row in report}
+    assert rows["nprobe=4"]["recall"] > 0
+    assert rows["efSearch=32"]["recall"] is None
+    assert "no efSearch parameter" in rows["efSearch=32"]["skipped"]
+
+
+def test_no_applicable_parameter_raises():
+    with pytest.raises(ValueError, match="efSearch"):
+        evaluate_search_params(
+            VECTORS, "IVF16,Flat", ef_search_values=[32], num_queries=50
+        )
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("pymilvus")
+pytest.importorskip("milvus_lite")
+
+from datatagger.utils.file_utils import save_dataset  # noqa: E402
+from datatagger.utils.milvus_utils import MilvusClient  # noqa: E402
+from tests.test_embedding_resume import (  # noqa: E402
+    NUM_ROWS,
+    assert_no_self_matches,
+    kill_run,
+    run_embedding,
+)
+
+
+def test_milvus_lite_insert_flush_search(tmp_path):
+    client = MilvusClient(
+        collection_name="embeddings",
+        dim=8,
+        uri=str(tmp_path / "milvus.db"),
+        insert_batch_size=4,
+    )
+    assert client.index_type == "AUTOINDEX"
+    vectors = np.random.default_rng(0).random((10, 8), dtype="float32")
+    ids = client.insert_embeddings(
+        vectors.tolist(),
+        metas=[f"row {i}" for i in range(10)],
+        row_keys=list(range(10)),
+    )
+    assert ids == list(range(10))
+    client.flush()
+
+    distances, found = client.search_batch(vectors[:3], top_k=2)
+    assert found[:, 0].tolist() == ids[:3]
+    assert np.allclose(distances[:, 0], 0, atol=1e-5)
+    assert client.get_metas([2, 7]) == ["row 2", "row 7"]
+    client.close()
+
+    # Reopening finds the existing collection and continues after its rows
+    client = MilvusClient(
+        collection_name="embeddings", dim=8, uri=str(tmp_path / "milvus.db")
+    )
+    assert client.insert_embeddings(vectors[:1].tolist()) == [10]
+    client.close()
+
+
+def test_truncate_deletes_ids_past_count(tmp_path):
+    client = MilvusClient(dim=8, uri=str(tmp_path / "milvus.db"))
+    vectors = np.random.default_rng(0).random((10, 8), dtype="float32")
+    client.insert_embeddings(vectors.tolist(), row_keys=list(range(10)))
+    client.flush()
+    assert client.truncate(6) == 4
+    assert client.insert_embeddings(vectors[8:].tolist(), row_keys=[8, 9]) == [6, 7]
+    client.flush()
+    assert client.get_row_keys([5, 6, 7, 9]).tolist() == [5, 8, 9, -1]
+    _, found = client.search_batch(vectors[[9]], top_k=1)
+    assert found[0, 0] == 7
+    client.close()
+
+
+def test_resume_drops_rows_sent_after_the_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    save_dataset(
+        [{"instruction": f"q{i}"} for i in range(NUM_ROWS)],
+        str(tmp_path / "data.jsonl"),
+        ext=".jsonl",
+    )
+    # Inserts are sent every 2 rows, rows 6-9 reach Milvus before the kill at row 10
+    kill_run(str(tmp_path), kill_at=10, milvus=True)
+    output_file = run_embedding(str(tmp_path), milvus=True)
+    assert_no_self_matches(output_file)
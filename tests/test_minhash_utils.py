@@ -0,0 +1,38 @@
+import random
+
+from datatagger.utils.minhash_utils import lexical_clusters
+
+WORDS = [f"word{i}" for i in range(5000)]
+
+
+def edited_chain(seed: int):
+    """a, b = a with its head replaced, c = b with its tail replaced: a~b, b~c, a!~c."""
+    rng = random.Random(seed)
+    a = rng.choices(WORDS, k=60)
+    b = list(a)
+    for i in range(6):
+        b[i] = rng.choice(WORDS)
+    c = list(b)
+    for i in range(54, 60):
+        c[i] = rng.choice(WORDS)
+    return [" ".join(words) for words in (a, b, c)]
+
+
+def test_bucket_members_are_linked_transitively():
+    # c only reaches the threshold against b, not against the first row a
+    labels, stats = lexical_clusters(edited_chain(37), threshold=0.75, workers=1)
+    assert labels.tolist() == [0, 0, 0]
+    assert stats["clusters"] == 1
+    assert stats["linked_pairs"] == 2
+
+
+def test_candidates_are_verified_against_the_threshold():
+    rng = random.Random(0)
+    unrelated = [" ".join(rng.choices(WORDS, k=60)) for _ in range(20)]
+    texts = unrelated + [unrelated[3], "", None, unrelated[3] + " extra"]
+    labels, stats = lexical_clusters(texts, threshold=0.8, workers=1)
+    assert labels[20] == 3 and labels[23] == 3
+    assert labels[21] == 21 and labels[22] == 22
+    assert stats["duplicates"] == 2
+    # The three copies share buckets, their pairs are checked once, not per band
+    assert stats["candidate_pairs"] == stats["linked_pairs"] == 3
@@ -0,0 +1,159 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from datatagger.settings.base_tagger_setting import TagMission
+from datatagger.settings.tagger_settings_server import TaggerServerSettings
+from datatagger.tagger.tagger_server import (
+    MicroBatcher,
+    TaggerServer,
+    build_process_batch_fns,
+    resolve_serve_missions,
+)
+
+
+class FakeEngine:
+    """process_batch_fn tagging each item with its text reversed, recording batch sizes."""
+
+    def __init__(self, fail_on=None):
+        self.batches = []
+        self.fail_on = fail_on
+
+    def __call__(self, batch_indices, dataset):
+        self.batches.append(len(batch_indices))
+        for idx in batch_indices:
+            if dataset[idx]["text"] == self.fail_on:
+                raise RuntimeError("engine crashed")
+            dataset[idx]["tag"] = dataset[idx]["text"][::-1]
+
+
+def submit_concurrently(batcher, requests, timeout=5):
+    barrier = threading.Barrier(len(requests))
+
+    def submit(items):
+        barrier.wait()
+        try:
+            return batcher.submit(items, timeout=timeout)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(len(requests)) as pool:
+        return list(pool.map(submit, requests))
+
+
+def test_concurrent_requests_are_coalesced_and_routed_back():
+    engine = FakeEngine()
+    requests = [[{"text": f"req{r}-item{i}"} for i in range(r + 1)] for r in range(4)]
+    batcher = MicroBatcher(engine, max_batch_size=10, max_wait_ms=500).start()
+    try:
+        results = submit_concurrently(batcher, requests)
+    finally:
+        batcher.stop()
+
+    # 10 items from 4 requests fill exactly one batch
+    assert engine.batches == [10]
+    for request, result in zip(requests, results):
+        assert [item["text"] for item in result] == [item["text"] for item in request]
+        assert [item["tag"] for item in result] == [
+            item["text"][::-1] for item in request
+        ]
+    snapshot = batcher.metrics.snapshot(batcher.queue_depth())
+    assert snapshot["requests_total"] == 4
+    assert snapshot["batches_total"] == 1
+
+
+def test_batches_are_split_at_max_batch_size():
+    engine = FakeEngine()
+    batcher = MicroBatcher(engine, max_batch_size=3, max_wait_ms=200).start()
+    try:
+        result = batcher.submit([{"text": str(i)} for i in range(7)], timeout=5)
+    finally:
+        batcher.stop()
+    assert engine.batches == [3, 3, 1]
+    assert [item["tag"] for item in result] == [str(i) for i in range(7)]
+
+
+def test_engine_error_reaches_every_waiting_request():
+    engine = FakeEngine(fail_on="bad")
+    requests = [[{"text": "good"}], [{"text": "bad"}], [{"text": "also good"}]]
+    batcher = MicroBatcher(engine, max_batch_size=3, max_wait_ms=500).start()
+    try:
+        results = submit_concurrently(batcher, requests)
+        # The batcher keeps serving after a failed batch
+        assert batcher.submit([{"text": "ok"}], timeout=5)[0]["tag"] == "ko"
+    finally:
+        batcher.stop()
+
+    assert engine.batches[0] == 3
+    for result in results:
+        assert isinstance(result, RuntimeError)
+        assert str(result) == "engine crashed"
+    assert batcher.metrics.snapshot(0)["errors_total"] == 3
+
+
+def test_submit_times_out_when_the_engine_never_answers():
+    release = threading.Event()
+    batcher = MicroBatcher(
+        lambda batch_indices, dataset: release.wait(), max_wait_ms=1
+    ).start()
+    try:
+        with pytest.raises(TimeoutError):
+            batcher.submit([{"text": "slow"}], timeout=0.2)
+    finally:
+        release.set()
+        batcher.stop()
+
+
+def request_json(url, payload=None):
+    data = None if payload is None else json.dumps(payload).encode()
+    try:
+        with urllib.request.urlopen(url, data=data, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_server_tags_a_posted_batch():
+    engine = FakeEngine()
+    server = TaggerServer(
+        {"quality": engine}, host="127.0.0.1", port=0, max_wait_ms=1
+    ).start()
+    host, port = server.address[:2]
+    base = f"http://{host}:{port}"
+    try:
+        status, body = request_json(
+            f"{base}/tag/quality?x=1", {"items": [{"text": "ab"}, {"text": "cd"}]}
+        )
+        assert status == 200
+        assert body == {
+            "mission": "quality",
+            "items": [{"text": "ab", "tag": "ba"}, {"text": "cd", "tag": "dc"}],
+        }
+        status, body = request_json(f"{base}/tag/quality", {"text": "xyz"})
+        assert (status, body["item"]["tag"]) == (200, "zyx")
+        assert request_json(f"{base}/tag/safety?x=1", {"text": "x"})[0] == 404
+        status, body = request_json(f"{base}/health?verbose=1")
+        assert (status, body["missions"]) == (200, ["quality"])
+        status, body = request_json(f"{base}/metrics")
+        assert body["quality"]["items_total"] == 3
+    finally:
+        server.shutdown()
+
+
+def test_unknown_serve_mission_is_rejected():
+    settings = TaggerServerSettings(
+        _cli_parse_args=False, serve_missions=["quality", "difficulty"]
+    )
+    assert resolve_serve_missions(settings) == [
+        TagMission.QUALITY,
+        TagMission.DIFFICULTY,
+    ]
+    settings = TaggerServerSettings(
+        _cli_parse_args=False, serve_missions=["quality", "sentiment"]
+    )
+    with pytest.raises(ValueError, match=r"Unknown serve_missions \['sentiment'\]"):
+        build_process_batch_fns(settings)
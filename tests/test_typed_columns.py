@@ -0,0 +1,43 @@
+import pytest
+
+from datatagger.utils.columnar_dataset import ColumnarDataset
+from datatagger.utils.file_utils import parse_bool, save_dataset
+
+BOOL_CASES = [
+    (True, True),
+    (False, False),
+    ("True", True),
+    ("false", False),
+    ("1", True),
+    ("0", False),
+    ("no", None),
+    ("", None),
+    (1, True),
+    (0, False),
+    (2, None),
+    (None, None),
+]
+
+
+@pytest.mark.parametrize(("value", "expected"), BOOL_CASES)
+def test_parse_bool(value, expected):
+    assert parse_bool(value) is expected
+
+
+def test_columnar_bool_column_parses_strings():
+    dataset = ColumnarDataset.from_rows(
+        [{"keep": value} for value, _ in BOOL_CASES], field_types={"keep": "bool"}
+    )
+    assert [row["keep"] for row in dataset] == [expected for _, expected in BOOL_CASES]
+    dataset[0]["keep"] = "False"
+    assert dataset[0]["keep"] is False
+
+
+def test_parquet_bool_column_parses_strings(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = str(tmp_path / "tags.parquet")
+    rows = [{"keep": value} for value, _ in BOOL_CASES]
+    save_dataset(rows, path, ext=".parquet", field_types={"keep": "bool"})
+    assert pq.read_table(path).column("keep").to_pylist() == [
+        expected for _, expected in BOOL_CASES
+    ]